@@ -0,0 +1,346 @@
+#! /usr/bin/env python3
+
+"""
+Changed files impact query: which targets (transitively) depend on the given
+files, eg: for deciding what a CI job has to rebuild and retest.
+It's answered from the reverse-dependency index, i.e. the reversed graph of
+all the targets under TOP_DIRECTORY_LIST (See compact_graph.py), stored in
+CACHE_DIRECTORY along with the fingerprints of the source files of its
+targets. The index is built by the first query (or `--rebuild`). A later
+query checks these files and patches the index if any of them has changed
+or is deleted, or if a C++ target of the index has a new file: the targets
+of these files are rebuilt, along with the new targets they now depend on.
+Any other new file doesn't matter, nothing depends on it (unless a changed
+file does).
+The check stats the files in bulk on a thread pool, hashing only the ones
+whose stat changed, and lists each directory of the C++ targets once for
+the new files. With `--trust_paths`, the query paths are taken as the list
+of every changed file, and only these are checked.
+See example_affected_main.py for the usage.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import os
+from concurrent import futures
+
+from . import cache
+from . import common
+from . import compact_graph
+from . import target_graph_builder
+from .depg_lib_main import preprocessConfig
+from .targets import TargetType
+
+
+def getReverseIndexFile(cache_directory):
+    return os.path.join(cache_directory, "reverse_index.bin")
+
+
+def getReverseIndexKey(configs):
+    # The graph depends on same code and configs as the built targets.
+    return target_graph_builder.getCacheSectionKeys(configs)[
+        target_graph_builder.TARGETS_CACHE_SECTION]
+
+
+def getSourceFingerprints(builder, target_map):
+    """
+    Return the map from each source file of the targets of @target_map to
+    its [stat key, checksum] (See cache.FingerprintPolicy). The fingerprints
+    computed by the build are reused, so that the files are not read again.
+    """
+    includes_cache = builder.source_deps_cache.section(
+        target_graph_builder.INCLUDES_CACHE_SECTION)
+    output = {}
+    for target in target_map.values():
+        for file in builder.getTargetSourceFiles(target) or []:
+            fingerprint = includes_cache.getCurrentFingerprint(file)
+            output[file] = [fingerprint['stat'], fingerprint['checksum']]
+    return output
+
+
+# Files per task of the thread pool checking the files.
+CHECK_CHUNK_SIZE = 256
+
+def getCheckWorkers(configs):
+    """
+    Threads checking the files: IO_MAX_IN_FLIGHT if set, so that it bounds
+    these too, otherwise CACHE_VALIDATION_WORKERS.
+    """
+    return configs.IO_MAX_IN_FLIGHT or configs.CACHE_VALIDATION_WORKERS or 1
+
+
+def mapChunks(executor, func, items):
+    """Same as `map(func, items)`, run by chunks on @executor."""
+    chunks = [items[i:i + CHECK_CHUNK_SIZE]
+              for i in range(0, len(items), CHECK_CHUNK_SIZE)]
+    for output in executor.map(lambda x: [func(y) for y in x], chunks):
+        yield from output
+
+
+def listFiles(directory):
+    """Return the set of the names of the files in @directory."""
+    try:
+        with os.scandir(directory or ".") as it:
+            return set(x.name for x in it if x.is_file())
+    except (FileNotFoundError, NotADirectoryError):
+        return set()
+
+
+def getModifiedFiles(fingerprints, files, configs, executor):
+    """
+    Return those of @files having fingerprints (See getSourceFingerprints)
+    which are deleted or have a different content. The files are stat-ed on
+    @executor, and only the ones whose stat key differs are read.
+    """
+    policy = cache.getFingerprintPolicy(configs.FILE_FINGERPRINT)
+    files = [x for x in files if x in fingerprints]
+    output = []
+    mismatches = []
+    for file, stat_result in zip(files, mapChunks(executor, cache.statOrNone,
+                                                  files)):
+        if stat_result is None:
+            output.append(file)
+        elif policy.getStatKey(stat_result) != fingerprints[file][0]:
+            mismatches.append(file)
+    def getChecksum(file):
+        try:
+            return policy.getFileChecksum(file)
+        except FileNotFoundError:
+            return None
+    output.extend(file for file, checksum in zip(
+        mismatches, mapChunks(executor, getChecksum, mismatches))
+                  if checksum != fingerprints[file][1])
+    return output
+
+
+def getNewFiles(reverse_index, fingerprints, configs, executor):
+    """
+    Return the files of the C++ targets of @reverse_index absent in
+    @fingerprints. Each directory of these targets is listed once, on
+    @executor.
+    """
+    cpp_types = set(int(x) for x in common.CPP_TARGETS)
+    stems = {}
+    for node, name in enumerate(reverse_index.names):
+        if reverse_index.types[node] in cpp_types:
+            directory, _, stem = name.rpartition("/")
+            stems.setdefault(directory, []).append(stem)
+    directories = list(stems)
+    output = []
+    for directory, names in zip(directories,
+                                executor.map(listFiles, directories)):
+        prefix = directory + "/" if directory else ""
+        for stem in stems[directory]:
+            for extension in configs.CPP_EXTENSIONS:
+                file = prefix + stem + extension
+                if stem + extension in names and file not in fingerprints:
+                    output.append(file)
+    return output
+
+
+def getChangedFiles(reverse_index, fingerprints, configs):
+    """
+    Return the files of @fingerprints (See getSourceFingerprints) deleted or
+    having a different content, and the new files of the C++ targets of
+    @reverse_index.
+    """
+    with futures.ThreadPoolExecutor(getCheckWorkers(configs)) as executor:
+        return getModifiedFiles(fingerprints, list(fingerprints), configs,
+                                executor) + \
+            getNewFiles(reverse_index, fingerprints, configs, executor)
+
+
+def getChangedFilesIn(reverse_index, fingerprints, paths, configs):
+    """
+    Same as getChangedFiles, trusting that @paths (files or directories)
+    list every changed file, i.e. only the files under @paths are checked.
+    """
+    files = set()
+    for path in common.toRelativePaths(paths):
+        if os.path.isdir(path):
+            prefix = "" if path == "." else path + "/"
+            files.update(x for x in fingerprints if x.startswith(prefix))
+            files.update(target_graph_builder.listDirectoryRecursive(
+                path, configs.FORBIDDEN_PATHS, configs.IGNORED_PATHS,
+                configs.WALK_WORKERS))
+        else:
+            files.add(path)
+    files = sorted(files)
+    cpp_types = set(int(x) for x in common.CPP_TARGETS)
+    new_files = []
+    for file in files:
+        if file in fingerprints or not os.path.isfile(file):
+            continue
+        name = target_graph_builder.fileToTarget(file, configs)
+        node = reverse_index.ids.get(name)
+        if node is not None and reverse_index.types[node] in cpp_types:
+            new_files.append(file)
+    with futures.ThreadPoolExecutor(getCheckWorkers(configs)) as executor:
+        return getModifiedFiles(fingerprints, files, configs, executor) + \
+            new_files
+
+
+def isTargetPresent(name, configs):
+    if name.endswith(configs.PROTO_EXTENSION):
+        return os.path.isfile(name)
+    return any(os.path.isfile(name + x) for x in configs.CPP_EXTENSIONS)
+
+
+def storeReverseIndex(configs, reverse_index, fingerprints):
+    file = getReverseIndexFile(configs.CACHE_DIRECTORY)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    common.writeFileAtomic(file, reverse_index.toBytes(dict(
+        key=getReverseIndexKey(configs), files=fingerprints)))
+
+
+def buildReverseIndex(configs):
+    """Build the graph of the whole tree, store its reverse and return it."""
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_map = builder.depsCover(
+        target_graph_builder.changedPathsToTargetNames(
+            configs.TOP_DIRECTORY_LIST, configs))
+    reverse_index = compact_graph.fromTargetMap(target_map).getReversed()
+    storeReverseIndex(configs, reverse_index,
+                      getSourceFingerprints(builder, target_map))
+    return reverse_index
+
+
+def patchReverseIndex(configs, reverse_index, fingerprints, changed_files):
+    """
+    Rebuild the targets of @changed_files, and the targets absent in
+    @reverse_index which they now depend on, in the graph of @reverse_index.
+    Store its reverse and return it.
+    """
+    target_map = reverse_index.getReversed().toTargetMap()
+    names = set(target_graph_builder.fileToTarget(x, configs)
+                for x in changed_files)
+    names.discard(None)
+    for name in names:
+        target_map.pop(name, None)
+    for file in changed_files:
+        fingerprints.pop(file, None)
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    rebuilt = {}
+    queue = sorted(x for x in names if isTargetPresent(x, configs))
+    while len(queue) > 0:
+        built = builder.getDeps(queue)
+        rebuilt.update((x, built[x]) for x in queue)
+        queue = sorted(set(
+            dep for x in queue for dep in built[x].get('public_deps', []) +
+            built[x].get('private_deps', [])
+            if dep not in target_map and dep not in rebuilt))
+    target_map.update(rebuilt)
+    fingerprints.update(getSourceFingerprints(builder, rebuilt))
+    reverse_index = compact_graph.fromTargetMap(target_map).getReversed()
+    storeReverseIndex(configs, reverse_index, fingerprints)
+    return reverse_index
+
+
+def loadReverseIndex(configs):
+    """
+    Return the tuple (stored reverse index, fingerprints of its source files),
+    None if absent or invalidated, i.e. built by a different code or configs.
+    """
+    try:
+        with open(getReverseIndexFile(configs.CACHE_DIRECTORY), "rb") as fd:
+            data = fd.read()
+    except FileNotFoundError:
+        return None
+    try:
+        reverse_index, metadata = compact_graph.fromBytes(data)
+    except (ValueError, AssertionError):
+        return None  # Corrupted.
+    if metadata['key'] != getReverseIndexKey(configs):
+        return None
+    return reverse_index, metadata['files']
+
+
+def getReverseIndex(configs, changed_paths=None):
+    """
+    Return the reverse index matching with the current tree: the stored one,
+    patched if some of its files have changed (See patchReverseIndex), or a
+    new one. If @changed_paths is given, these are trusted to list every
+    changed file (See getChangedFilesIn).
+    """
+    stored = loadReverseIndex(configs)
+    if stored is None:
+        return buildReverseIndex(configs)
+    reverse_index, fingerprints = stored
+    if changed_paths is None:
+        changed_files = getChangedFiles(reverse_index, fingerprints, configs)
+    else:
+        changed_files = getChangedFilesIn(reverse_index, fingerprints,
+                                          changed_paths, configs)
+    if len(changed_files) == 0:
+        return reverse_index
+    return patchReverseIndex(configs, reverse_index, fingerprints,
+                             changed_files)
+
+
+def pathsToTargetNames(paths, configs):
+    """
+    Same as changedPathsToTargetNames, except that a file may not exist (eg:
+    deleted), its dependents are affected all the same.
+    """
+    output = []
+    for path in common.toRelativePaths(paths):
+        if os.path.isdir(path):
+            output.extend(target_graph_builder.changedPathsToTargetNames(
+                [path], configs))
+        elif path not in configs.FORBIDDEN_PATHS:
+            target = target_graph_builder.fileToTarget(path, configs)
+            if target is not None:
+                output.append(target)
+    return output
+
+
+def affectedTargets(configs, paths, test_only=False, reverse_index=None,
+                    trust_paths=False):
+    """
+    Return the sorted names of the targets depending, directly or not, on any
+    of the files under @paths, including their own targets. If @test_only,
+    only the CPP_TEST targets are returned. If @trust_paths, @paths list
+    every file changed since the index was stored, so only these are checked.
+    @configs must be preprocessed (See depg_lib_main.preprocessConfig).
+    """
+    if reverse_index is None:
+        reverse_index = getReverseIndex(configs,
+                                        paths if trust_paths else None)
+    # Targets not in the index are new, nothing depends on them yet.
+    names = [x for x in pathsToTargetNames(paths, configs)
+             if x in reverse_index.ids]
+    output = reverse_index.depsCover(names)
+    if test_only:
+        output = [x for x in output if reverse_index.types[
+            reverse_index.ids[x]] == TargetType.CPP_TEST]
+    return sorted(output)
+
+
+def getArgs(argv=None):
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("paths", nargs="*",
+                        help="Changed files or directories.")
+    parser.add_argument("--test_only", action='store_true', default=False,
+                        help="Output only the CPP_TEST targets.")
+    parser.add_argument("--rebuild", action='store_true', default=False,
+                        help="Rebuild the reverse-dependency index first.")
+    parser.add_argument("--trust_paths", action='store_true', default=False,
+                        help="The paths list every file changed since the "
+                             "last query: only these are checked.")
+    return parser.parse_args(argv)
+
+
+def main(configs, argv=None):
+    """
+    Print the targets affected by the paths given in @argv (default: command
+    line arguments), one per line. Return the exit code.
+    """
+    args = getArgs(argv)
+    configs = preprocessConfig(configs)
+    assert configs.CACHE_DIRECTORY, "CACHE_DIRECTORY is not set."
+    reverse_index = buildReverseIndex(configs) if args.rebuild else None
+    for name in affectedTargets(configs, args.paths, args.test_only,
+                                reverse_index, args.trust_paths):
+        print(name)
+    return 0
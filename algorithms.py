@@ -3,8 +3,86 @@
 # pylint: disable=missing-module-docstring,missing-function-docstring
 # pylint: disable=invalid-name
 
+import array
 import collections
 
+def stronglyConnectedComponents(nodes, edges_func, adjacency=None):
+    """
+    Find the strongly connected components of the graph reachable from
+    @nodes, where @edges_func(x) returns the adjacent nodes of x. Return the
+    list of components (each one a list of nodes, in DFS post-order) in
+    topological order of the condensation, dependencies first: a component
+    comes after all the components it has edges to.
+    Iterative Tarjan's algorithm, linear in the size of the graph and not
+    limited by the recursion depth. @edges_func is called once per node. If
+    @adjacency (dict) is given, the adjacent nodes are recorded in it.
+    """
+    if adjacency is None:
+        adjacency = {}
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+    def visit(node):
+        index[node] = low[node] = len(index)
+        stack.append(node)
+        on_stack.add(node)
+        adjacency[node] = list(edges_func(node))
+        return node, iter(adjacency[node])
+    for root in nodes:
+        if root in index:
+            continue
+        work = [visit(root)]
+        while len(work) > 0:
+            node, adjacent = work[-1]
+            for n in adjacent:
+                if n not in index:
+                    work.append(visit(n))
+                    break
+                if n in on_stack and index[n] < low[node]:
+                    low[node] = index[n]
+            else:
+                work.pop()
+                if len(work) > 0 and low[node] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[node]
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        n = stack.pop()
+                        on_stack.remove(n)
+                        component.append(n)
+                        if n == node:
+                            break
+                    components.append(component)
+    return components
+
+def findCycle(component, adjacency):
+    """
+    Return a cycle [x, .., x] through the nodes of the strongly connected
+    @component (See stronglyConnectedComponents), None if it has none (i.e.
+    a single node without self edge). The cycle starts at the first node
+    discovered by the DFS, same as a back edge would report it.
+    """
+    start = component[-1]
+    members = set(component)
+    parents = {start: None}
+    q = collections.deque([start])
+    while len(q) > 0:
+        node = q.popleft()
+        for n in adjacency[node]:
+            if n == start:
+                path = [start]
+                while node is not None:
+                    path.append(node)
+                    node = parents[node]
+                path.reverse()
+                return path
+            if n in members and n not in parents:
+                parents[n] = node
+                q.append(n)
+    return None
+
 def topologicalSortedDepsCoverAndCycles(nodes, edges_func):
     """
     Given a directed graph, find the topologically sorted nodes and if graph
@@ -13,30 +91,17 @@ def topologicalSortedDepsCoverAndCycles(nodes, edges_func):
         hashable.
     @edges_func(x) return the adjacent list of node x. i.e. return the
         list of nodes y s.t. there is an edge from x -> y.
+    A cycle is reported for each strongly connected component having one,
+    as the path [x, .., x].
     """
-    visited = set()
-    ancestors = set()
-    ancestors_stack = []  # To store the exact cycle path.
+    adjacency = {}
+    components = stronglyConnectedComponents(nodes, edges_func, adjacency)
     topological_sorting = []
     cycles = []
-    def runDFS(node):
-        ancestors.add(node)
-        ancestors_stack.append(node)
-        for n in edges_func(node):
-            if n not in visited:
-                if n in ancestors:  # Cycle found.
-                    cycle_path = ancestors_stack[ancestors_stack.index(n):]
-                    cycle_path.append(n)
-                    cycles.append(cycle_path)
-                else:
-                    runDFS(n)
-        ancestors.remove(node)
-        ancestors_stack.pop()
-        visited.add(node)
-        topological_sorting.append(node)
-    for node in nodes:
-        if node not in visited:
-            runDFS(node)
+    for component in components:
+        topological_sorting.extend(component)
+        if len(component) > 1 or component[0] in adjacency[component[0]]:
+            cycles.append(findCycle(component, adjacency))
     return topological_sorting, cycles
 
 def topologicalSortedDepsCover(nodes, edges_func):
@@ -59,3 +124,107 @@ def depsCover(nodes, edge_func):
                 visited.add(i)
     return visited
 
+
+def batchedDepsCover(nodes, batch_edge_func):
+    """
+    Level synchronous version of depsCover. Instead of expanding one node at a
+    time, the whole BFS frontier is expanded in one call of @batch_edge_func,
+    which takes a list of nodes and returns the list of their adjacent nodes
+    (in same order). It allows the client to compute the edges of a frontier
+    in bulk.
+    The nodes are expanded in exactly same order as depsCover expands them,
+    hence the output of both is identical (even the order of side effects of
+    the edge functions).
+    """
+    visited = set(nodes)
+    frontier = list(collections.OrderedDict.fromkeys(reversed(list(nodes))))
+    while len(frontier) > 0:
+        next_frontier = []
+        for adjacent in batch_edge_func(frontier):
+            for i in adjacent:
+                if i not in visited:
+                    next_frontier.append(i)
+                    visited.add(i)
+        frontier = next_frontier
+    return visited
+
+
+def csrDepsCover(offsets, edges, nodes):
+    """
+    depsCover of a graph of int nodes in CSR form: the adjacent nodes of x are
+    `edges[offsets[x]:offsets[x + 1]]`. Return the list of the nodes reachable
+    from @nodes, in the order of discovery.
+    """
+    visited = bytearray(len(offsets) - 1)
+    output = []
+    for x in nodes:
+        if not visited[x]:
+            visited[x] = 1
+            output.append(x)
+    stack = output[:]
+    while len(stack) > 0:
+        x = stack.pop()
+        for y in edges[offsets[x]:offsets[x + 1]]:
+            if not visited[y]:
+                visited[y] = 1
+                output.append(y)
+                stack.append(y)
+    return output
+
+
+def csrStronglyConnectedComponents(offsets, edges, nodes):
+    """
+    stronglyConnectedComponents of a graph of int nodes in CSR form (See
+    csrDepsCover). Output is identical.
+    """
+    num_nodes = len(offsets) - 1
+    index = array.array('i', [-1]) * num_nodes
+    low = array.array('i', [0]) * num_nodes
+    on_stack = bytearray(num_nodes)
+    stack = []
+    components = []
+    counter = 0
+    for root in nodes:
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        # DFS path, along with the position of the next edge to explore.
+        work_nodes, work_positions = [root], [offsets[root]]
+        while len(work_nodes) > 0:
+            node = work_nodes[-1]
+            position, end = work_positions[-1], offsets[node + 1]
+            child = -1
+            while position < end:
+                y = edges[position]
+                position += 1
+                if index[y] == -1:
+                    child = y
+                    break
+                if on_stack[y] and index[y] < low[node]:
+                    low[node] = index[y]
+            if child != -1:
+                work_positions[-1] = position
+                index[child] = low[child] = counter
+                counter += 1
+                stack.append(child)
+                on_stack[child] = 1
+                work_nodes.append(child)
+                work_positions.append(offsets[child])
+                continue
+            work_nodes.pop()
+            work_positions.pop()
+            if len(work_nodes) > 0 and low[node] < low[work_nodes[-1]]:
+                low[work_nodes[-1]] = low[node]
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    y = stack.pop()
+                    on_stack[y] = 0
+                    component.append(y)
+                    if y == node:
+                        break
+                components.append(component)
+    return components
@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+
+"""
+Concurrent file reads, for the network filesystems (NFS, FUSE) where each
+call is bound by the latency of the server, not by the CPU.
+The calls are issued from an asyncio loop to a dedicated thread pool, at most
+`max_in_flight` at a time, so that the latency is overlapped without flooding
+a shared filer. Callers either await the coroutine (readFiles) or use the
+blocking wrapper (readMany) which runs a loop for the batch.
+The other background I/O of a run (the shared cache reads, the read-ahead,
+the cache validation stats) is submitted to the same thread pool (See
+getExecutor), so that `max_in_flight` bounds it all. Only the checks done
+one at a time by the main thread (eg: the header lookups missing in the
+FileIndex) come on top.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import asyncio
+import os
+import time
+from concurrent import futures
+
+
+def readFile(file):
+    """
+    Return the tuple (stat result, content bytes) of @file, both taken from
+    the same open file. None if @file doesn't exist.
+    """
+    try:
+        with open(file, "rb") as fd:
+            return os.fstat(fd.fileno()), fd.read()
+    except FileNotFoundError:
+        return None
+
+
+class ConcurrentFileIO:
+    def __init__(self, max_in_flight):
+        assert max_in_flight >= 1, "max_in_flight must be at least 1"
+        self.max_in_flight = max_in_flight
+        # Started on the first call, and again after close.
+        self.executor = None
+        self.in_flight = 0
+        self.stats = dict(reads=0, bytes=0, max_in_flight=0, seconds=0.0)
+
+    async def call(self, semaphore, func, file):
+        async with semaphore:
+            self.in_flight += 1
+            self.stats['max_in_flight'] = max(self.stats['max_in_flight'],
+                                              self.in_flight)
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.getExecutor(), func, file)
+            finally:
+                self.in_flight -= 1
+
+    def getExecutor(self):
+        """
+        The thread pool of the reads, of `max_in_flight` threads. The other
+        background I/O is submitted to it directly.
+        """
+        if self.executor is None:
+            self.executor = futures.ThreadPoolExecutor(
+                self.max_in_flight, thread_name_prefix="depg-io")
+        return self.executor
+
+    async def gather(self, func, files):
+        # The semaphore is bound to the running loop, hence one per batch.
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        start_time = time.monotonic()
+        results = await asyncio.gather(*(self.call(semaphore, func, x)
+                                         for x in files))
+        self.stats['seconds'] += time.monotonic() - start_time
+        return dict(zip(files, results))
+
+    async def readFiles(self, files):
+        """
+        Return the map from each of @files to readFile of it, i.e.
+        (stat result, content) or None if absent.
+        """
+        output = await self.gather(readFile, files)
+        self.stats['reads'] += len(output)
+        self.stats['bytes'] += sum(len(x[1]) for x in output.values()
+                                   if x is not None)
+        return output
+
+    def readMany(self, files):
+        """Blocking version of readFiles. Must not be called from a loop."""
+        return asyncio.run(self.readFiles(list(files)))
+
+    def getSummary(self):
+        stats = self.stats
+        return ("ConcurrentFileIO: %d reads (%.1f MB) in %.2f s, up to %d in "
+                "flight" % (stats['reads'], stats['bytes'] / 1e6,
+                            stats['seconds'], stats['max_in_flight']))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,173 @@
+#! /usr/bin/env python3
+
+"""
+Changed files impact query benchmark. A reverse-dependency index is built
+from a generated graph (See bench_compact_graph.py), stored and loaded back,
+then queried for the targets affected by a few targets. Then the source
+files of the generated targets are created, and checked for changes at the
+scale of the index: one `os.stat` and `os.path.isfile` per file serially
+(the former check), in bulk with one listing per directory, and for a few
+paths trusted to be the changed ones (`--trust_paths`). A network
+filesystem is simulated by adding `--latency_ms` to every `os.stat`, file
+open and directory listing. Last, the index of a synthetic project is
+built, loaded back (which checks the source files for changes), and
+patched after a file changed.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+import bench_common
+from bench_cache_validation import addLatency
+from bench_compact_graph import makeTargetMap
+from depg import affected_targets
+from depg import cache
+from depg import common
+from depg import compact_graph
+
+
+def load(file):
+    with open(file, "rb") as fd:
+        return compact_graph.fromBytes(fd.read())[0]
+
+
+@contextlib.contextmanager
+def addListingLatency(seconds):
+    old_scandir = os.scandir
+    def scandir(*args, **kwargs):
+        time.sleep(seconds)
+        return old_scandir(*args, **kwargs)
+    os.scandir = scandir
+    try:
+        with addLatency(seconds):
+            yield
+    finally:
+        os.scandir = old_scandir
+
+
+def getChangedFilesSerially(reverse_index, fingerprints, configs):
+    """The former check: a stat per file, an isfile per C++ extension."""
+    policy = cache.getFingerprintPolicy(configs.FILE_FINGERPRINT)
+    output = []
+    for file, (stat_key, checksum) in fingerprints.items():
+        stat_result = cache.statOrNone(file)
+        if stat_result is None or (
+                policy.getStatKey(stat_result) != stat_key and
+                policy.getFileChecksum(file) != checksum):
+            output.append(file)
+    cpp_types = set(int(x) for x in common.CPP_TARGETS)
+    for node, name in enumerate(reverse_index.names):
+        if reverse_index.types[node] not in cpp_types:
+            continue
+        for extension in configs.CPP_EXTENSIONS:
+            file = name + extension
+            if file not in fingerprints and os.path.isfile(file):
+                output.append(file)
+    return output
+
+
+def makeIndexFiles(target_map, num_changed, configs):
+    """
+    Create the files of @target_map, and return their fingerprints: the
+    first @num_changed ones have a changed content, the last @num_changed
+    ones are new (not fingerprinted).
+    """
+    policy = cache.getFingerprintPolicy(configs.FILE_FINGERPRINT)
+    files = [x for target in target_map.values()
+             for x in target.hdrs + target.srcs]
+    for directory in set(os.path.dirname(x) for x in files):
+        os.makedirs(directory)
+    fingerprints = {}
+    for file in files:
+        with open(file, "w"):
+            pass
+        fingerprints[file] = [policy.getStatKey(os.stat(file)), None]
+    checksum = policy.getFileChecksum(files[0])
+    for fingerprint in fingerprints.values():
+        fingerprint[1] = checksum
+    for file in files[:num_changed]:
+        fingerprints[file] = [None, "changed"]
+    for file in files[-num_changed:]:
+        del fingerprints[file]
+    return fingerprints
+
+
+def checkIndexFiles(args, target_map, reverse_index):
+    with tempfile.TemporaryDirectory() as root, bench_common.chdir(root):
+        configs = bench_common.getConfigs(sorted(set(
+            x.split("/")[0] for x in target_map)))
+        fingerprints, seconds = bench_common.timeIt(
+            makeIndexFiles, target_map, args.num_changed, configs)
+        bench_common.report("create index files", seconds,
+                            "files=%d" % (len(fingerprints) + args.num_changed))
+        paths = list(fingerprints)[:10] + [list(target_map)[-1] + ".cpp"]
+        checks = [
+            ("serial", getChangedFilesSerially, ()),
+            ("bulk", affected_targets.getChangedFiles, ()),
+            ("trusted paths", affected_targets.getChangedFilesIn, (paths,))]
+        with addListingLatency(args.latency_ms / 1000):
+            for name, func, extra in checks:
+                if name == "serial" and args.skip_serial:
+                    continue
+                output, seconds = bench_common.timeIt(
+                    func, reverse_index, fingerprints, *extra, configs)
+                bench_common.report("check index files, " + name, seconds,
+                                    "changed=%d latency=%.1fms" % (
+                                        len(output), args.latency_ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_targets", type=int, default=300000)
+    parser.add_argument("--num_deps", type=int, default=10)
+    parser.add_argument("--num_dirs", type=int, default=40)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    parser.add_argument("--num_changed", type=int, default=1000)
+    parser.add_argument("--latency_ms", type=float, default=0)
+    parser.add_argument("--skip_serial", action='store_true', default=False,
+                        help="Skip the serial check (slow with latency).")
+    args = parser.parse_args()
+    target_map = makeTargetMap(args.num_targets, args.num_deps)
+    graph = compact_graph.fromTargetMap(target_map)
+    reverse_index, seconds = bench_common.timeIt(graph.getReversed)
+    bench_common.report("build reverse index", seconds)
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, "reverse_index.bin")
+        common.writeFileAtomic(file, reverse_index.toBytes())
+        reverse_index, seconds = bench_common.timeIt(load, file)
+        bench_common.report("load reverse index", seconds, "size=%.1fMB" % (
+            os.path.getsize(file) / 1e6))
+    names = list(target_map)
+    for changed in [names[-10:], names[len(names) // 2:][:10], names[:10]]:
+        output, seconds = bench_common.timeIt(reverse_index.depsCover, changed)
+        bench_common.report("query", seconds, "affected=%d" % len(output))
+    checkIndexFiles(args, target_map, reverse_index)
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            configs = bench_common.getConfigs(top_dirs)
+            _, seconds = bench_common.timeIt(
+                affected_targets.buildReverseIndex, configs)
+            bench_common.report("build project index", seconds)
+            _, seconds = bench_common.timeIt(
+                affected_targets.getReverseIndex, configs)
+            bench_common.report("load and check project index", seconds,
+                                "files=%d" % (2 * len(top_dirs) *
+                                              args.files_per_dir))
+            changed = os.path.join(top_dirs[0], "f0.hpp")
+            with open(changed, "a") as fd:
+                fd.write('#include "%s/f1.hpp"\n' % top_dirs[-1])
+            output, seconds = bench_common.timeIt(
+                affected_targets.affectedTargets, configs, [changed])
+            bench_common.report("query after a change (patch)", seconds,
+                                "affected=%d" % len(output))
+
+
+if __name__ == "__main__":
+    main()
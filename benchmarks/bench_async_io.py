@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+"""
+Cold bulk scanning benchmark on a simulated network filesystem, i.e.
+`--latency_ms` added to every file open (See bench_cache_validation.py).
+Scans every C++ file of a synthetic project via SourceDepsParser.scanMany,
+in-process, with a thread pool and through ConcurrentFileIO.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import glob
+import os
+import tempfile
+
+import bench_common
+from bench_cache_validation import addLatency
+from depg.async_io import ConcurrentFileIO
+from depg.source_deps_parser import SourceDepsParser
+
+
+def scan(configs, files):
+    file_io = None
+    if configs.IO_MAX_IN_FLIGHT is not None:
+        file_io = ConcurrentFileIO(configs.IO_MAX_IN_FLIGHT)
+    parser = SourceDepsParser(
+        configs.SYS_STD_HEADERS, configs.HEADER_PREFIXES_MAP,
+        configs.CUSTOM_HEADER_IDENTIFICATION_HANDLER, None, configs,
+        file_io=file_io)
+    output = parser.scanMany(files)
+    parser.close()
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=20)
+    parser.add_argument("--files_per_dir", type=int, default=100)
+    parser.add_argument("--latency_ms", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max_in_flight", type=int, default=64)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root), addLatency(args.latency_ms / 1000):
+            files = sorted(glob.glob("*/*.?pp"))
+            configs = bench_common.getConfigs(top_dirs, cache_directory=None)
+            outputs = []
+            for name, workers, max_in_flight in [
+                    ("in-process", 1, None),
+                    ("%d scan threads" % args.workers, args.workers, None),
+                    ("ConcurrentFileIO, %d in flight" % args.max_in_flight,
+                     1, args.max_in_flight)]:
+                configs.SCAN_EXECUTOR = "thread"
+                configs.SCAN_WORKERS = workers
+                configs.IO_MAX_IN_FLIGHT = max_in_flight
+                output, seconds = bench_common.timeIt(scan, configs, files)
+                bench_common.report(name, seconds, "files=%d" % len(files))
+                outputs.append(output)
+    assert outputs[0] == outputs[1] == outputs[2]
+
+
+if __name__ == "__main__":
+    main()
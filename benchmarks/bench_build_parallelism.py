@@ -0,0 +1,33 @@
+#! /usr/bin/env python3
+
+"""
+Build parallelism analysis benchmark on a generated graph (See
+bench_compact_graph.py), with random weights.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import random
+
+import bench_common
+from bench_compact_graph import makeTargetMap
+from depg import build_parallelism
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_targets", type=int, default=100000)
+    parser.add_argument("--num_deps", type=int, default=10)
+    args = parser.parse_args()
+    target_map = makeTargetMap(args.num_targets, args.num_deps)
+    rng = random.Random(0)
+    weights = dict((x, rng.randrange(1000, 100000)) for x in target_map)
+    report, seconds = bench_common.timeIt(
+        build_parallelism.analyzeParallelism, target_map, weights)
+    bench_common.report("analyzeParallelism", seconds, "%d levels, %.1fx" % (
+        len(report.level_widths), report.getSpeedupLimit()))
+
+
+if __name__ == "__main__":
+    main()
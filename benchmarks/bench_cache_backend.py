@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+
+"""
+JSON vs SQLite cache backend benchmark. The whole graph of a synthetic
+project is built once to fill the cache, then a small query (targets of a
+single directory) is timed on the warm cache with both the backends. The
+JSON backend parses and rewrites the entire cache, the SQLite one touches
+only the entries of the queried files.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import os
+import tempfile
+
+import bench_common
+from depg import target_graph_builder
+
+
+def build(configs, paths):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(paths, configs)
+    return builder.depsCover(target_names)
+
+
+def run(top_dirs, backend, paths, name):
+    configs = bench_common.getConfigs(top_dirs)
+    configs.CACHE_BACKEND = backend
+    targets, seconds = bench_common.timeIt(build, configs, paths)
+    cache_directory = configs.CACHE_DIRECTORY
+    size = sum(os.path.getsize(os.path.join(cache_directory, x))
+               for x in os.listdir(cache_directory))
+    bench_common.report(name, seconds, "targets=%d cache size=%.1fMB" % (
+        len(targets), size / 1e6))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=40)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        query = [top_dirs[0]]
+        with bench_common.chdir(root):
+            run(top_dirs, "json", ["."], "json, full build (cold)")
+            run(top_dirs, "json", ["."], "json, full build (warm)")
+            json_small = run(top_dirs, "json", query, "json, small query")
+            run(top_dirs, "sqlite", query, "sqlite, small query (migration)")
+            sqlite_small = run(top_dirs, "sqlite", query, "sqlite, small query")
+            run(top_dirs, "sqlite", ["."], "sqlite, full build (warm)")
+    assert json_small == sqlite_small
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+
+"""
+Bulk cache validation benchmark. The whole graph of a synthetic project is
+built once to fill the cache, then rebuilt on the warm cache with the cache
+validated lazily (CACHE_VALIDATION_WORKERS = 0) and in bulk, both with the
+files untouched and with all of them touched (eg: after a fresh checkout,
+every stat differs and every file is hashed). A network filesystem is
+simulated by adding `--latency_ms` to every `os.stat` and file open.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import builtins
+import contextlib
+import os
+import tempfile
+import time
+
+import bench_common
+from depg import target_graph_builder
+
+
+@contextlib.contextmanager
+def addLatency(seconds):
+    old_stat, old_open = os.stat, builtins.open
+    def stat(*args, **kwargs):
+        time.sleep(seconds)
+        return old_stat(*args, **kwargs)
+    def open_(*args, **kwargs):
+        time.sleep(seconds)
+        return old_open(*args, **kwargs)
+    os.stat, builtins.open = stat, open_
+    try:
+        yield
+    finally:
+        os.stat, builtins.open = old_stat, old_open
+
+
+def build(configs):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(["."], configs)
+    output = builder.depsCover(target_names)
+    return output, builder.cache_validation
+
+
+def touchAll(top_dirs):
+    for directory in top_dirs:
+        for name in os.listdir(directory):
+            os.utime(os.path.join(directory, name))
+
+
+def run(top_dirs, workers, latency, name):
+    configs = bench_common.getConfigs(top_dirs)
+    configs.CACHE_VALIDATION_WORKERS = workers
+    with addLatency(latency):
+        (targets, validation), seconds = bench_common.timeIt(build, configs)
+    bench_common.report(name, seconds, "targets=%d validation=%s" % (
+        len(targets), validation))
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=20)
+    parser.add_argument("--files_per_dir", type=int, default=100)
+    parser.add_argument("--latency_ms", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            expected = run(top_dirs, 0, 0, "cold")
+            outputs = []
+            for workers in [0, args.workers]:
+                mode = "bulk" if workers else "lazy"
+                outputs.append(run(top_dirs, workers, latency,
+                                   "%s, warm" % mode))
+                touchAll(top_dirs)
+                outputs.append(run(top_dirs, workers, latency,
+                                   "%s, warm, all files touched" % mode))
+    assert all(x == expected for x in outputs)
+
+
+if __name__ == "__main__":
+    main()
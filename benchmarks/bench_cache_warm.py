@@ -0,0 +1,61 @@
+#! /usr/bin/env python3
+
+"""
+Warm vs cold cache benchmark. Builds the whole graph of a synthetic project
+three times with the same cache directory:
+1. cold : Empty cache.
+2. warm : Nothing changed. No file should be scanned.
+3. config change : INCLUDE_PATHS changed. Only the `deps` cache section is
+   invalidated, the raw includes are reused, hence still no file is scanned.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import tempfile
+
+import bench_common
+from depg import cache
+from depg import target_graph_builder
+from depg import source_deps_parser
+
+
+def buildAll(configs):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(["."], configs)
+    return builder.depsCover(target_names)
+
+
+def run(configs, name):
+    counter = {}
+    with bench_common.countCalls(source_deps_parser, "getCppHeader", counter), \
+            bench_common.countCalls(cache.FingerprintPolicy,
+                                    "getFileChecksum", counter):
+        targets, seconds = bench_common.timeIt(buildAll, configs)
+    bench_common.report(name, seconds, "targets=%d getCppHeader calls=%d "
+                        "getFileChecksum calls=%d" % (
+                            len(targets), counter["getCppHeader"],
+                            counter["getFileChecksum"]))
+    return targets, counter["getCppHeader"]
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=20)
+    parser.add_argument("--files_per_dir", type=int, default=100)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            cold, _ = run(bench_common.getConfigs(top_dirs), "cold")
+            warm, warm_scans = run(bench_common.getConfigs(top_dirs), "warm")
+            configs = bench_common.getConfigs(top_dirs)
+            configs.INCLUDE_PATHS = configs.INCLUDE_PATHS + top_dirs[:1]
+            changed, changed_scans = run(configs, "warm, INCLUDE_PATHS changed")
+    assert cold == warm == changed
+    assert warm_scans == 0 and changed_scans == 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+
+"""
+Helpers shared by the DepG benchmarks. Benchmarks are standalone scripts,
+run as `./benchmarks/bench_xyz.py`. They import DepG as the `depg` package,
+exactly like `tests/test_project*/tools/depg_main.py` do.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import os
+import sys
+import time
+import random
+import contextlib
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg  # pylint: disable=wrong-import-position
+
+
+def makeSyntheticProject(root, num_dirs=20, files_per_dir=50,
+                         includes_per_file=8, seed=0):
+    """
+    Create a synthetic C++ project in @root having @num_dirs top directories,
+    each having @files_per_dir pairs of (.hpp, .cpp). Each file includes
+    @includes_per_file headers picked from the files created before it (so
+    the graph is acyclic) along with a couple of std headers.
+    Return the list of top directories.
+    """
+    rng = random.Random(seed)
+    top_dirs = []
+    created = []
+    for d in range(num_dirs):
+        directory = f"d{d}"
+        top_dirs.append(directory)
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+        for f in range(files_per_dir):
+            stem = f"{directory}/f{f}"
+            includes = rng.sample(created, min(len(created), includes_per_file))
+            lines = ["#pragma once", "#include <vector>", "#include <string>"]
+            lines += [f'#include "{x}.hpp"' for x in includes]
+            body = "\n".join(lines) + f"\nint {directory}_f{f}();\n"
+            with open(os.path.join(root, stem + ".hpp"), "w") as fd:
+                fd.write(body)
+            with open(os.path.join(root, stem + ".cpp"), "w") as fd:
+                fd.write(f'#include "{stem}.hpp"\n' + body)
+            created.append(stem)
+    return top_dirs
+
+
+def getConfigs(top_dirs, cache_directory="build/.depg/cache"):
+    configs = depg.getDefaultConfigs()
+    configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+    configs.TOP_DIRECTORY_LIST = top_dirs
+    configs.CACHE_DIRECTORY = cache_directory
+    return depg.preprocessConfig(configs)
+
+
+@contextlib.contextmanager
+def chdir(directory):
+    old = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(old)
+
+
+@contextlib.contextmanager
+def countCalls(module, func_name, counter):
+    """Count the calls to `module.func_name` in counter[func_name]."""
+    old_func = getattr(module, func_name)
+    counter[func_name] = 0
+    def wrapper(*args, **kwargs):
+        counter[func_name] += 1
+        return old_func(*args, **kwargs)
+    setattr(module, func_name, wrapper)
+    try:
+        yield counter
+    finally:
+        setattr(module, func_name, old_func)
+
+
+def timeIt(func, *args, **kwargs):
+    start = time.perf_counter()
+    output = func(*args, **kwargs)
+    return output, time.perf_counter() - start
+
+
+def report(name, seconds, extra=""):
+    print(f"{name:<40} {seconds*1000:10.1f} ms  {extra}")
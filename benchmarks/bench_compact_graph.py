@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+
+"""
+Compact graph benchmark: memory of a generated target_map against its
+CompactGraph (measured with tracemalloc), and depsCover / strongly connected
+components on both.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import random
+import tracemalloc
+
+import bench_common
+from depg import algorithms
+from depg import compact_graph
+from depg.targets import TargetType, DepgTarget
+
+
+def makeTargetMap(num_targets, num_deps, seed=0):
+    """Acyclic: a target depends only on the targets created before it."""
+    rng = random.Random(seed)
+    names = ["dir%d/sub%d/target_%d" % (i % 100, i % 7, i)
+             for i in range(num_targets)]
+    target_map = {}
+    for i, name in enumerate(names):
+        deps = list(dict.fromkeys(names[rng.randrange(i)]
+                                  for _ in range(num_deps if i else 0)))
+        target = DepgTarget(name=name, type=TargetType.CPP_SOURCE,
+                            hdrs=[name + ".hpp"], srcs=[name + ".cpp"])
+        if len(deps) > 0:
+            target.public_deps = deps[:len(deps) // 2]
+            target.private_deps = deps[len(deps) // 2:]
+        target_map[name] = target
+    return target_map
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    output = func(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return output, size
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_targets", type=int, default=300000)
+    parser.add_argument("--num_deps", type=int, default=10)
+    args = parser.parse_args()
+    target_map, map_size = measure(makeTargetMap, args.num_targets,
+                                   args.num_deps)
+    graph, graph_size = measure(compact_graph.fromTargetMap, target_map)
+    print("target_map: %.1f MB, CompactGraph: %.1f MB (name strings shared)"
+          % (map_size / 1e6, graph_size / 1e6))
+    roots = list(target_map)[-100:]
+    edge_func = lambda x: (target_map[x].get('public_deps', []) +
+                           target_map[x].get('private_deps', []))
+    expected, seconds = bench_common.timeIt(algorithms.depsCover, roots,
+                                            edge_func)
+    bench_common.report("depsCover, target_map", seconds,
+                        "nodes=%d" % len(expected))
+    output, seconds = bench_common.timeIt(graph.depsCover, roots)
+    bench_common.report("depsCover, CompactGraph", seconds,
+                        "nodes=%d" % len(output))
+    assert output == expected
+    roots = list(target_map)
+    expected, seconds = bench_common.timeIt(
+        algorithms.stronglyConnectedComponents, roots, edge_func)
+    bench_common.report("SCC, target_map", seconds,
+                        "components=%d" % len(expected))
+    output, seconds = bench_common.timeIt(graph.stronglyConnectedComponents,
+                                          roots)
+    bench_common.report("SCC, CompactGraph", seconds,
+                        "components=%d" % len(output))
+    assert output == expected
+
+
+if __name__ == "__main__":
+    main()
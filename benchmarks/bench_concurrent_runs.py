@@ -0,0 +1,59 @@
+#! /usr/bin/env python3
+
+"""
+Concurrent runs benchmark. N processes build the graphs of disjoint
+directories of a synthetic project at the same time, sharing one cache
+directory. Every run's scans must survive in the cache (merged, not
+overwritten), so that a following run of the whole project scans nothing.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import multiprocessing
+import tempfile
+
+import bench_common
+from depg import source_deps_parser
+from depg import target_graph_builder
+
+
+def build(args):
+    top_dirs, paths, backend = args
+    configs = bench_common.getConfigs(top_dirs)
+    configs.CACHE_BACKEND = backend
+    configs.SCAN_WORKERS = 1
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(paths, configs)
+    return len(builder.depsCover(target_names))
+
+
+def run(top_dirs, num_runs, backend):
+    jobs = [(top_dirs, top_dirs[i::num_runs], backend) for i in range(num_runs)]
+    with multiprocessing.Pool(num_runs) as pool:
+        _, seconds = bench_common.timeIt(pool.map, build, jobs)
+    bench_common.report("%s, %d concurrent runs" % (backend, num_runs), seconds)
+    counter = {}
+    with bench_common.countCalls(source_deps_parser, "getCppHeader", counter):
+        _, seconds = bench_common.timeIt(build, (top_dirs, ["."], backend))
+    bench_common.report("%s, following full run" % backend, seconds,
+                        "getCppHeader calls=%d" % counter["getCppHeader"])
+    assert counter["getCppHeader"] == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=16)
+    parser.add_argument("--files_per_dir", type=int, default=100)
+    parser.add_argument("--num_runs", type=int, default=4)
+    args = parser.parse_args()
+    for backend in target_graph_builder.CACHE_BACKENDS:
+        with tempfile.TemporaryDirectory() as root:
+            top_dirs = bench_common.makeSyntheticProject(
+                root, args.num_dirs, args.files_per_dir, includes_per_file=0)
+            with bench_common.chdir(root):
+                run(top_dirs, args.num_runs, backend)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#! /usr/bin/env python3
+
+"""
+Transitive reduction benchmark on a generated graph (See
+bench_compact_graph.py): time of deps_reduction.reduceDeps and the number of
+deps removed.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+
+import bench_common
+from bench_compact_graph import makeTargetMap
+from depg import deps_reduction
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_targets", type=int, default=20000)
+    parser.add_argument("--num_deps", type=int, default=8)
+    args = parser.parse_args()
+    target_map = makeTargetMap(args.num_targets, args.num_deps)
+    num_deps = sum(len(x.get('public_deps', [])) +
+                   len(x.get('private_deps', [])) for x in target_map.values())
+    (_, num_removed), seconds = bench_common.timeIt(
+        deps_reduction.reduceDeps, target_map)
+    bench_common.report("reduceDeps", seconds, "%d of %d deps removed" % (
+        num_removed, num_deps))
+
+
+if __name__ == "__main__":
+    main()
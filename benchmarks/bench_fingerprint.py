@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+
+"""
+Cache validation benchmark over many files, for each file fingerprint policy
+(See cache.FINGERPRINT_POLICIES):
+- warm : Nothing changed, validation needs only stat.
+- touched : mtime of every file changed, validation needs a checksum of
+  every file.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import os
+import tempfile
+
+import bench_common
+from depg import cache
+
+
+def makeFiles(root, num_files, file_size):
+    files = []
+    content = ("x" * 63 + "\n") * (file_size // 64)
+    for i in range(num_files):
+        directory = os.path.join(root, f"d{i // 1000}")
+        if i % 1000 == 0:
+            os.makedirs(directory)
+        file = os.path.join(directory, f"f{i}.hpp")
+        with open(file, "w") as fd:
+            fd.write(content)
+        files.append(file)
+    return files
+
+
+def validateAll(files, dump, policy):
+    file_cache = cache.InMemoryFileValueCache(dump, fingerprint_policy=policy)
+    return sum(1 for file in files if file in file_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_files", type=int, default=100000)
+    parser.add_argument("--file_size", type=int, default=8192)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        files = makeFiles(root, args.num_files, args.file_size)
+        for name in cache.FINGERPRINT_POLICIES:
+            policy = cache.getFingerprintPolicy(name)
+            file_cache = cache.InMemoryFileValueCache(fingerprint_policy=policy)
+            for file in files:
+                file_cache[file] = 1
+            dump = file_cache.export()
+            valid, seconds = bench_common.timeIt(validateAll, files, dump, policy)
+            bench_common.report(f"{name}: warm", seconds, "valid=%d" % valid)
+            for file in files:
+                st = os.stat(file)
+                os.utime(file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+            valid, seconds = bench_common.timeIt(validateAll, files, dump, policy)
+            bench_common.report(f"{name}: touched", seconds, "valid=%d" % valid)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+"""
+Micro-benchmark of the third-party header resolution. Synthetic
+HEADER_PREFIXES_MAP of 2k prefixes and 50k distinct headers under them,
+included from many directories. Compares the old `rsplit` loop against the
+HeaderResolver (prefix trie + memoization).
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import random
+import tempfile
+
+import bench_common
+from depg.file_index import FileIndex
+from depg.header_resolver import HeaderResolver, rstripSlashFromKeys
+
+
+def rsplitLookup(header_prefixes_map, header):
+    """The lookup used by SourceDepsParser before HeaderResolver."""
+    for i in range(header.count("/") + 1):
+        header_p = header.rsplit('/', i)[0]
+        if header_p in header_prefixes_map:
+            return header_prefixes_map[header_p]
+    return None
+
+
+def makeHeaders(num_prefixes, num_headers, seed=0):
+    rng = random.Random(seed)
+    prefixes = {}
+    for i in range(num_prefixes):
+        depth = rng.randint(1, 3)
+        prefix = "/".join(f"lib{i}_{d}" for d in range(depth)) + "/"
+        prefixes[prefix] = f"third_party/lib{i}"
+    prefix_list = list(prefixes)
+    headers = []
+    for i in range(num_headers):
+        prefix = rng.choice(prefix_list)
+        subdirs = "/".join(f"s{rng.randint(0, 3)}" for _ in range(rng.randint(0, 3)))
+        headers.append(prefix + (subdirs + "/" if subdirs else "") + f"h{i}.h")
+    return prefixes, headers
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_prefixes", type=int, default=2000)
+    parser.add_argument("--num_headers", type=int, default=50000)
+    parser.add_argument("--num_directories", type=int, default=200)
+    parser.add_argument("--includes", type=int, default=500000)
+    args = parser.parse_args()
+    prefixes, headers = makeHeaders(args.num_prefixes, args.num_headers)
+    rng = random.Random(1)
+    includes = [(rng.choice(headers), f"d{rng.randrange(args.num_directories)}/x.cpp")
+                for _ in range(args.includes)]
+    stripped = rstripSlashFromKeys(prefixes)
+    with tempfile.TemporaryDirectory() as root, bench_common.chdir(root):
+        configs = bench_common.getConfigs(["."], cache_directory=None)
+        file_index = FileIndex(["."], set(), set())
+        resolver = HeaderResolver(set(), prefixes, lambda x: None, configs,
+                                  file_index)
+        old, seconds = bench_common.timeIt(
+            lambda: [rsplitLookup(stripped, h) for h in headers])
+        bench_common.report("rsplit loop, distinct headers", seconds,
+                            "headers=%d" % len(headers))
+        trie, seconds = bench_common.timeIt(
+            lambda: [resolver.header_prefixes_trie.longestPrefixValue(h)
+                     for h in headers])
+        bench_common.report("prefix trie, distinct headers", seconds,
+                            "headers=%d" % len(headers))
+        assert old == trie
+        output, seconds = bench_common.timeIt(
+            lambda: [resolver.resolve(h, f) for h, f in includes])
+        bench_common.report("HeaderResolver.resolve", seconds,
+                            "includes=%d" % len(includes))
+        assert [x['name'] for x in output] == [rsplitLookup(stripped, h)
+                                               for h, _ in includes]
+
+
+if __name__ == "__main__":
+    main()
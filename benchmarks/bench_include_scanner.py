@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+"""
+Include scanning benchmark. Compares the previous implementation (decode the
+whole file, then two regexes over the text) against include_scanner in full
+and preamble modes, over small headers and a few huge generated headers.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import os
+import re
+import tempfile
+
+import bench_common
+from depg import common
+from depg import include_scanner
+
+OLD_REGEX_LIST = (
+    re.compile("^[ ]*#[ ]*include[ ]*<([^>]+)>", flags=re.MULTILINE),
+    re.compile("^[ ]*#[ ]*include[ ]*\"([^\"]+)\"", flags=re.MULTILINE))
+
+PREAMBLE = """\
+// Copyright header
+/* Multi line
+   comment */
+#pragma once
+#ifndef X_H
+#define X_H
+#include <vector>
+#include "a/b.hpp"
+#  include   <map>
+#define LONG_MACRO(x) \\
+    do { x; } while (0)
+#include "c/d.h"
+"""
+
+
+def oldScan(file):
+    content = common.readFile(file)
+    return tuple(list(regex.findall(content)) for regex in OLD_REGEX_LIST)
+
+
+def makeFiles(root, num_small, num_huge, huge_mb):
+    files = []
+    body = "int f%d() { return %d; }\n"
+    for i in range(num_small):
+        file = os.path.join(root, f"small{i}.hpp")
+        with open(file, "w") as fd:
+            fd.write(PREAMBLE + "".join(body % (j, j) for j in range(200)))
+        files.append(file)
+    chunk = "".join(body % (j, j) for j in range(10000))
+    for i in range(num_huge):
+        file = os.path.join(root, f"huge{i}.pb.h")
+        with open(file, "w") as fd:
+            fd.write(PREAMBLE)
+            while fd.tell() < huge_mb * 1024 * 1024:
+                fd.write(chunk)
+        files.append(file)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_small", type=int, default=2000)
+    parser.add_argument("--num_huge", type=int, default=3)
+    parser.add_argument("--huge_mb", type=int, default=30)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        files = makeFiles(root, args.num_small, args.num_huge, args.huge_mb)
+        small, huge = files[:args.num_small], files[args.num_small:]
+        for name, group in [("small", small), ("huge", huge)]:
+            old, seconds = bench_common.timeIt(lambda: [oldScan(x) for x in group])
+            bench_common.report(f"{name}: decode + 2 regexes", seconds)
+            for mode in include_scanner.SCAN_MODES:
+                output, seconds = bench_common.timeIt(
+                    lambda: [include_scanner.scanCppIncludes(x, mode)[0]
+                             for x in group])
+                bench_common.report(f"{name}: mmap, {mode}", seconds)
+                assert output == old, mode
+
+
+if __name__ == "__main__":
+    main()
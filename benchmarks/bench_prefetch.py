@@ -0,0 +1,54 @@
+#! /usr/bin/env python3
+
+"""
+Read-ahead prefetch benchmark on a simulated network filesystem, i.e.
+`--latency_ms` added to every file open (See bench_cache_validation.py).
+Builds the deps of the last directory of a synthetic project without cache,
+i.e. the headers are discovered along the traversal, scanning in the DepG
+process, without and with the prefetcher.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import tempfile
+
+import bench_common
+from bench_cache_validation import addLatency
+from depg import target_graph_builder
+
+
+def build(configs, paths):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(paths, configs)
+    output = builder.depsCover(target_names)
+    summary = builder.prefetcher.getSummary() if builder.prefetcher else ""
+    return list(output.items()), summary
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=20)
+    parser.add_argument("--files_per_dir", type=int, default=100)
+    parser.add_argument("--latency_ms", type=float, default=2.0)
+    parser.add_argument("--batched", action='store_true', default=False)
+    args = parser.parse_args()
+    outputs = []
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root), addLatency(args.latency_ms / 1000):
+            for mode in (None, "read", "fadvise"):
+                configs = bench_common.getConfigs(top_dirs, cache_directory=None)
+                configs.BATCHED_TRAVERSAL = args.batched
+                configs.SCAN_WORKERS = 1
+                configs.PREFETCH = mode
+                (output, summary), seconds = bench_common.timeIt(
+                    build, configs, top_dirs[-1:])
+                bench_common.report("prefetch %s" % mode, seconds, summary)
+                outputs.append(output)
+    assert all(x == outputs[0] for x in outputs)
+
+
+if __name__ == "__main__":
+    main()
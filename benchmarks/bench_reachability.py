@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+
+"""
+Reachability query benchmark on a generated graph (See bench_compact_graph.py):
+batches of "does A depend on B", transitive deps and path queries, against
+an algorithms.depsCover walk per query.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import random
+
+import bench_common
+from bench_compact_graph import makeTargetMap
+from depg import algorithms
+from depg import compact_graph
+from depg import reachability
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_targets", type=int, default=100000)
+    parser.add_argument("--num_deps", type=int, default=10)
+    parser.add_argument("--num_queries", type=int, default=10000)
+    args = parser.parse_args()
+    target_map = makeTargetMap(args.num_targets, args.num_deps)
+    graph = compact_graph.fromTargetMap(target_map)
+    index, seconds = bench_common.timeIt(reachability.ReachabilityIndex, graph)
+    bench_common.report("index (SCCs)", seconds)
+    rng = random.Random(0)
+    names = list(target_map)
+    pairs = [(rng.choice(names), rng.choice(names))
+             for _ in range(args.num_queries)]
+    output, seconds = bench_common.timeIt(
+        lambda: [index.dependsOn(a, b) for a, b in pairs])
+    bench_common.report("%d dependsOn (cold)" % len(pairs), seconds,
+                        "true=%d closures=%d" % (sum(output),
+                                                 len(index.reaches)))
+    _, seconds = bench_common.timeIt(
+        lambda: [index.dependsOn(a, b) for a, b in pairs])
+    bench_common.report("%d dependsOn (memoized)" % len(pairs), seconds)
+    edge_func = lambda x: (target_map[x].get('public_deps', []) +
+                           target_map[x].get('private_deps', []))
+    sample = pairs[:20]
+    _, seconds = bench_common.timeIt(
+        lambda: [b in algorithms.depsCover([a], edge_func) for a, b in sample])
+    bench_common.report("%d depsCover walks" % len(sample), seconds)
+    sample = [a for a, _ in pairs[:100]]
+    output, seconds = bench_common.timeIt(
+        lambda: [index.getTransitiveDeps(a) for a in sample])
+    bench_common.report("%d transitive deps" % len(sample), seconds,
+                        "avg=%d" % (sum(map(len, output)) / len(output)))
+    sample = [(a, b) for a, b in pairs if index.dependsOn(a, b)][:100]
+    output, seconds = bench_common.timeIt(
+        lambda: [index.findPath(a, b) for a, b in sample])
+    bench_common.report("%d paths" % len(sample), seconds, "avg length=%.1f" % (
+        sum(map(len, output)) / max(1, len(output))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+"""
+Cold bulk scanning benchmark. Scans every C++ file of a synthetic project via
+SourceDepsParser.scanMany, once in-process and once with a process pool.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import glob
+import os
+import tempfile
+
+import bench_common
+from depg.source_deps_parser import SourceDepsParser
+
+
+def scan(configs, files):
+    parser = SourceDepsParser(
+        configs.SYS_STD_HEADERS, configs.HEADER_PREFIXES_MAP,
+        configs.CUSTOM_HEADER_IDENTIFICATION_HANDLER, None, configs)
+    output = parser.scanMany(files)
+    parser.close()
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=40)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            files = sorted(glob.glob("*/*.?pp"))
+            configs = bench_common.getConfigs(top_dirs, cache_directory=None)
+            configs.SCAN_WORKERS = 1
+            serial, seconds = bench_common.timeIt(scan, configs, files)
+            bench_common.report("scanMany, 1 worker", seconds,
+                                "files=%d" % len(files))
+            configs.SCAN_WORKERS = args.workers
+            pooled, seconds = bench_common.timeIt(scan, configs, files)
+            bench_common.report("scanMany, %d workers" % args.workers, seconds,
+                                "files=%d" % len(files))
+    assert serial == pooled
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#! /usr/bin/env python3
+
+"""
+Strongly connected components benchmark (algorithms.stronglyConnectedComponents
+and topologicalSortedDepsCoverAndCycles) on generated graphs: a random graph
+of `--num_nodes` nodes, mostly acyclic with a few back edges, and chains
+`--depth` deep (plain and closed into one big cycle). The recursive DFS used
+before couldn't go deeper than the recursion limit (1000 by default).
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import random
+
+import bench_common
+from depg import algorithms
+
+
+def randomGraph(num_nodes, degree, num_back_edges, seed=0):
+    rng = random.Random(seed)
+    graph = [[] for _ in range(num_nodes)]
+    for a in range(num_nodes - 1):
+        for _ in range(degree):
+            graph[a].append(rng.randrange(a + 1, num_nodes))
+    for _ in range(num_back_edges):
+        a = rng.randrange(1, num_nodes)
+        graph[a].append(rng.randrange(a))
+    return graph
+
+
+def run(name, graph, roots):
+    (order, cycles), seconds = bench_common.timeIt(
+        algorithms.topologicalSortedDepsCoverAndCycles, roots, graph.__getitem__)
+    bench_common.report(name, seconds, "nodes=%d cycles=%d largest=%d" % (
+        len(order), len(cycles), max([len(x) - 1 for x in cycles] or [0])))
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_nodes", type=int, default=1000000)
+    parser.add_argument("--depth", type=int, default=100000)
+    args = parser.parse_args()
+    graph = randomGraph(args.num_nodes, 3, 100)
+    run("random graph", graph, range(args.num_nodes))
+    chain = [[i + 1] for i in range(args.depth)] + [[]]
+    run("chain", chain, [0])
+    chain[-1].append(0)
+    run("chain closed into a cycle", chain, [0])
+
+
+if __name__ == "__main__":
+    main()
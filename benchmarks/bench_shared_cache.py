@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+"""
+Shared scan cache benchmark. A "CI job" builds the whole graph of a synthetic
+project and publishes the scan results to a SHARED_CACHE. Then a fresh
+worker (empty CACHE_DIRECTORY) builds the graph without the shared cache,
+with it mounted read-only as a directory, and through the HTTP stand-in
+server, which adds a simulated network latency to each request. The files
+scanned by each run are counted.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import bench_common
+from depg import include_scanner
+from depg import shared_cache
+from depg import target_graph_builder
+
+
+def build(configs):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(["."], configs)
+    return builder.depsCover(target_names)
+
+
+def run(top_dirs, name, shared=None, read_only=False):
+    cache_directory = "build/cache_worker"
+    shutil.rmtree(cache_directory, ignore_errors=True)
+    configs = bench_common.getConfigs(top_dirs, cache_directory)
+    # Scanning in this process, so that the scans can be counted.
+    configs.SCAN_WORKERS = 1
+    configs.SHARED_CACHE = shared
+    configs.SHARED_CACHE_READ_ONLY = read_only
+    counter = {}
+    # Every scan, from the file or from the content already read.
+    with bench_common.countCalls(include_scanner, "scanBuffer", counter):
+        targets, seconds = bench_common.timeIt(build, configs)
+    bench_common.report(name, seconds, "targets=%d files scanned=%d" % (
+        len(targets), counter["scanBuffer"]))
+    return targets
+
+
+def makeSlowRequestHandler(directory, latency):
+    handler = shared_cache.makeRequestHandler(directory)
+
+    class SlowRequestHandler(handler):
+        def do_GET(self):
+            time.sleep(latency)
+            super().do_GET()
+
+    return SlowRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=40)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    parser.add_argument("--latency_ms", type=float, default=20)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        shared_dir = os.path.join(root, "build/shared")
+        with bench_common.chdir(root):
+            expected = run(top_dirs, "no shared cache")
+            run(top_dirs, "populating the shared cache", shared_dir)
+            outputs = [run(top_dirs, "shared cache (directory, read-only)",
+                           shared_dir, read_only=True)]
+            server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", 0),
+                makeSlowRequestHandler(shared_dir, args.latency_ms / 1000))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            url = "http://127.0.0.1:%d" % server.server_address[1]
+            outputs.append(run(top_dirs, "shared cache (http, %g ms)" %
+                               args.latency_ms, url))
+            server.shutdown()
+            server.server_close()
+    assert all(x == expected for x in outputs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#! /usr/bin/env python3
+
+"""
+Target snapshot benchmark. Warm builds of the whole graph of a synthetic
+project with and without TARGET_SNAPSHOT, followed by a build after touching
+a single header (only its target is rebuilt).
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import tempfile
+
+import bench_common
+from depg import target_graph_builder
+
+
+def build(top_dirs, snapshot, cache_directory, backend):
+    configs = bench_common.getConfigs(top_dirs, cache_directory)
+    configs.TARGET_SNAPSHOT = snapshot
+    configs.CACHE_BACKEND = backend
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(["."], configs)
+    return builder.depsCover(target_names), builder
+
+
+def run(top_dirs, snapshot, backend, name):
+    cache_directory = "build/cache_%s_%s" % (backend, snapshot)
+    build(top_dirs, snapshot, cache_directory, backend)
+    (targets, builder), seconds = bench_common.timeIt(
+        build, top_dirs, snapshot, cache_directory, backend)
+    summary = builder.target_snapshot.getSummary() if snapshot else ""
+    bench_common.report(name, seconds, summary)
+    return targets
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=40)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            outputs = []
+            for backend in target_graph_builder.CACHE_BACKENDS:
+                outputs.append(run(top_dirs, False, backend,
+                                   "%s, warm, without snapshot" % backend))
+                outputs.append(run(top_dirs, True, backend,
+                                   "%s, warm, with snapshot" % backend))
+            with open("d0/f0.hpp", "a") as fd:
+                fd.write("// Touched\n")
+            for backend in target_graph_builder.CACHE_BACKENDS:
+                (touched, builder), seconds = bench_common.timeIt(
+                    build, top_dirs, True, "build/cache_%s_True" % backend,
+                    backend)
+                bench_common.report(
+                    "%s, one header changed, with snapshot" % backend,
+                    seconds, builder.target_snapshot.getSummary())
+                outputs.append(touched)
+    assert all(x == outputs[0] for x in outputs)
+
+
+if __name__ == "__main__":
+    main()
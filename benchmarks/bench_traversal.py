@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+
+"""
+Cold traversal benchmark. Builds the whole graph of a synthetic project
+without cache, using the serial traversal and the frontier-batched traversal
+(with process and thread workers), and checks that outputs are identical.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import os
+import tempfile
+
+import bench_common
+from depg import target_graph_builder
+
+
+def buildAll(configs):
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_names = target_graph_builder.changedPathsToTargetNames(["."], configs)
+    return list(builder.depsCover(target_names).items())
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_dirs", type=int, default=20)
+    parser.add_argument("--files_per_dir", type=int, default=250)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    outputs = []
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = bench_common.makeSyntheticProject(
+            root, args.num_dirs, args.files_per_dir)
+        with bench_common.chdir(root):
+            for batched, executor in [(False, None), (True, "process"),
+                                      (True, "thread")]:
+                configs = bench_common.getConfigs(top_dirs, cache_directory=None)
+                configs.BATCHED_TRAVERSAL = batched
+                configs.SCAN_WORKERS = args.workers
+                configs.SCAN_EXECUTOR = executor or "process"
+                output, seconds = bench_common.timeIt(buildAll, configs)
+                name = f"batched, {executor} workers" if batched else "serial"
+                bench_common.report(name, seconds, "targets=%d" % len(output))
+                outputs.append(output)
+    assert all(x == outputs[0] for x in outputs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+
+"""
+Directory walk benchmark: listDirectoryRecursive(".") on a generated tree,
+against the former os.walk based one, with 1 and `--workers` threads, then
+the whole changedPathsToTargetNames(["."]). A network filesystem is simulated
+by adding `--latency_ms` to every `os.scandir` (which `os.walk` uses too).
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+
+import bench_common
+from depg import target_graph_builder
+from depg.target_graph_builder import listDirectoryRecursive as listDirectory
+
+
+def osWalkListDirectory(directory, forbidden_paths, ignored_paths, workers=1):
+    """The former listDirectoryRecursive."""
+    del workers
+    for i in forbidden_paths:
+        if directory.startswith(i):
+            return []
+    output = []
+    for (root, dirs, files) in os.walk(directory):
+        root = os.path.relpath(root)
+        if (root in forbidden_paths
+                or (root != directory and root in ignored_paths)):
+            dirs[:] = []
+            continue
+        for file in files:
+            file_path = root + "/" + file
+            if file_path in forbidden_paths:
+                continue
+            output.append(file_path)
+    return output
+
+
+@contextlib.contextmanager
+def addScandirLatency(seconds):
+    old_scandir = os.scandir
+    def scandir(*args, **kwargs):
+        time.sleep(seconds)
+        return old_scandir(*args, **kwargs)
+    os.scandir = scandir
+    try:
+        yield
+    finally:
+        os.scandir = old_scandir
+
+
+def makeTree(root, num_files, files_per_dir, fanout):
+    """Directories `fanout` wide, having `files_per_dir` files each."""
+    queue, created = [""], 0
+    while created < num_files:
+        directory = queue.pop(0)
+        for i in range(fanout):
+            queue.append(os.path.join(directory, "d%d" % i))
+            os.makedirs(os.path.join(root, queue[-1]))
+        for i in range(files_per_dir):
+            open(os.path.join(root, directory, "f%d.cpp" % i), "w").close()
+        created += files_per_dir
+    return sorted(x for x in os.listdir(root))
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("--num_files", type=int, default=100000)
+    parser.add_argument("--files_per_dir", type=int, default=20)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--ignored", type=int, default=1000,
+                        help="Extra ignored and forbidden paths.")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency_ms", type=float, default=0.0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as root:
+        top_dirs = makeTree(root, args.num_files, args.files_per_dir,
+                            args.fanout)
+        with bench_common.chdir(root), \
+                addScandirLatency(args.latency_ms / 1000):
+            configs = bench_common.getConfigs(top_dirs, cache_directory=None)
+            configs.IGNORED_PATHS |= set("x%d" % i for i in range(args.ignored))
+            configs.FORBIDDEN_PATHS |= set("d0/y%d" % i
+                                           for i in range(args.ignored))
+            outputs = []
+            for name, walk, workers in [
+                    ("os.walk", osWalkListDirectory, 1),
+                    ("scandir + trie", listDirectory, 1),
+                    ("scandir + trie, %d workers" % args.workers,
+                     listDirectory, args.workers)]:
+                output, seconds = bench_common.timeIt(
+                    walk, ".", configs.FORBIDDEN_PATHS, configs.IGNORED_PATHS,
+                    workers)
+                bench_common.report(name, seconds, "files=%d" % len(output))
+                outputs.append(output)
+            configs.WALK_WORKERS = args.workers
+            output, seconds = bench_common.timeIt(
+                target_graph_builder.changedPathsToTargetNames, ["."], configs)
+            bench_common.report("changedPathsToTargetNames, %d workers" %
+                                args.workers, seconds,
+                                "targets=%d" % len(output))
+    # The former walk names the files directly under "." as "./file".
+    assert [os.path.normpath(x) for x in outputs[0]] == outputs[1] == \
+        outputs[2]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+#! /usr/bin/env python3
+
+"""
+How parallel the build of a target graph can be. Each target is weighted by
+the size of its source files or, if given, by its measured compile time (a
+JSON file: {target name: seconds}). Then:
+- The critical path is the heaviest chain of deps, i.e. the minimum build
+  time with unlimited cores. Splitting its targets shortens the build.
+- The level of a target is the length of its longest chain of deps, the
+  targets of the same level can be built in parallel.
+- The speedup limit is the total weight over the critical path weight.
+Mutually dependent targets (a cycle) can't be built apart, hence each
+strongly connected component is weighed as one unit, and the cyclic ones are
+reported.
+See example_parallelism_main.py for the CLI.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import json
+import os
+
+from . import algorithms
+from . import compact_graph
+from . import depg_lib_main
+from . import target_graph_builder
+
+
+class ParallelismReport:
+    def __init__(self, total_weight, critical_path, level_widths, unit,
+                 cycles=None):
+        self.total_weight = total_weight
+        # List of (target name, weight), deps first.
+        self.critical_path = critical_path
+        self.critical_path_weight = sum(x[1] for x in critical_path)
+        # Level -> number of targets.
+        self.level_widths = level_widths
+        self.unit = unit
+        # List of the target names of each cyclic component.
+        self.cycles = cycles or []
+
+    def getSpeedupLimit(self):
+        if self.critical_path_weight == 0:
+            return 1.0
+        return self.total_weight / self.critical_path_weight
+
+    def formatWeight(self, weight):
+        if self.unit == "seconds":
+            return "%.2f seconds" % weight
+        return "%d bytes" % weight
+
+    def getLines(self):
+        output = [
+            "Targets: %d, total weight: %s" % (
+                sum(self.level_widths), self.formatWeight(self.total_weight)),
+            "Critical path: %d targets, %s (%.1f%% of total)" % (
+                len(self.critical_path),
+                self.formatWeight(self.critical_path_weight),
+                100.0 * self.critical_path_weight /
+                max(self.total_weight, 1e-9)),
+            "Speedup limit: %.1fx" % self.getSpeedupLimit(),
+            "Level widths: %s" % " ".join(map(str, self.level_widths)),
+            "Critical path targets (deps first):"]
+        for name, weight in self.critical_path:
+            output.append("  %s  %s" % (name, self.formatWeight(weight)))
+        if len(self.cycles) > 0:
+            output.append("Cycles, each weighed as one unit: %d" %
+                          len(self.cycles))
+            for names in self.cycles:
+                output.append("  " + ", ".join(names))
+        return output
+
+
+def loadCompileTimes(file):
+    with open(file, encoding="utf-8") as fd:
+        return json.load(fd)
+
+
+def getFileSize(file):
+    try:
+        return os.path.getsize(file)
+    except FileNotFoundError:
+        return 0
+
+
+def getTargetWeights(builder, target_map, compile_times=None):
+    """
+    Return the tuple (target name -> weight, unit). Weights are the source
+    bytes, or the @compile_times (seconds) if given. The targets missing in
+    @compile_times are estimated from their bytes, at the average seconds per
+    byte of the measured targets.
+    """
+    num_bytes = {}
+    for name, target in target_map.items():
+        files = builder.getTargetSourceFiles(target) or []
+        num_bytes[name] = sum(getFileSize(x) for x in files)
+    if compile_times is None:
+        return num_bytes, "bytes"
+    measured = [x for x in target_map if x in compile_times]
+    measured_bytes = sum(num_bytes[x] for x in measured)
+    seconds_per_byte = sum(compile_times[x] for x in measured) / \
+        measured_bytes if measured_bytes > 0 else 0.0
+    return dict((x, compile_times[x] if x in compile_times else
+                 y * seconds_per_byte) for x, y in num_bytes.items()), \
+        "seconds"
+
+
+def analyzeParallelism(target_map, weights, unit="bytes"):
+    """
+    Return the ParallelismReport of @target_map, @weights being target name ->
+    weight. The deps absent in @target_map weigh nothing. The targets of a
+    cycle share their chain and their level.
+    """
+    graph = compact_graph.fromTargetMap(target_map)
+    offsets, edges = graph.offsets, graph.edges
+    num_nodes = graph.getNumNodes()
+    weight = [weights.get(x, 0) if x in target_map else 0
+              for x in graph.names]
+    # Deps first, i.e. the deps of a component are computed before it.
+    components = algorithms.csrStronglyConnectedComponents(
+        offsets, edges, range(num_nodes))
+    component_of = [0] * num_nodes
+    # Component -> weight of the heaviest chain ending at it, its dep on that
+    # chain and its level (-1 for the deps absent in @target_map).
+    finish = [0] * len(components)
+    parent = [-1] * len(components)
+    level = [-1] * len(components)
+    cycles = []
+    for i, component in enumerate(components):
+        for x in component:
+            component_of[x] = i
+        if len(component) > 1 or component[0] in graph.getEdges(component[0]):
+            cycles.append(graph.getNames(component))
+        best, best_dep, max_level = 0, -1, -1
+        for x in component:
+            for y in edges[offsets[x]:offsets[x + 1]]:
+                j = component_of[y]
+                if j == i:
+                    continue
+                if finish[j] > best:
+                    best, best_dep = finish[j], j
+                if level[j] > max_level:
+                    max_level = level[j]
+        finish[i] = best + sum(weight[x] for x in component)
+        parent[i] = best_dep
+        if any(graph.names[x] in target_map for x in component):
+            level[i] = max_level + 1
+    critical_path = []
+    i = max(range(len(components)), key=finish.__getitem__, default=-1)
+    while i != -1 and finish[i] > 0:
+        critical_path.extend((graph.names[x], weight[x])
+                             for x in reversed(components[i]))
+        i = parent[i]
+    critical_path.reverse()
+    level_widths = [0] * (max(level, default=-1) + 1)
+    for i, component in enumerate(components):
+        if level[i] != -1:
+            level_widths[level[i]] += sum(
+                1 for x in component if graph.names[x] in target_map)
+    return ParallelismReport(sum(weight), critical_path, level_widths, unit,
+                             cycles)
+
+
+def getArgs(argv=None):
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("paths", nargs="*",
+                        help="Analyze the targets under these paths and their "
+                             "deps (default: TOP_DIRECTORY_LIST).")
+    parser.add_argument("--compile_times", default=None,
+                        help="JSON file {target name: seconds}, to weigh the "
+                             "targets by compile time instead of bytes.")
+    return parser.parse_args(argv)
+
+
+def main(configs, argv=None):
+    """
+    Print the parallelism report of the targets given in @argv (default:
+    command line arguments). Return the exit code.
+    """
+    args = getArgs(argv)
+    configs = depg_lib_main.preprocessConfig(configs)
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    target_map = builder.depsCover(
+        target_graph_builder.changedPathsToTargetNames(
+            args.paths or configs.TOP_DIRECTORY_LIST, configs))
+    compile_times = None
+    if args.compile_times is not None:
+        compile_times = loadCompileTimes(args.compile_times)
+    weights, unit = getTargetWeights(builder, target_map, compile_times)
+    print("\n".join(analyzeParallelism(target_map, weights, unit).getLines()))
+    return 0
@@ -4,38 +4,510 @@
 # pylint: disable=invalid-name
 
 import os
+import json
+import time
+import hashlib
 
 from . import common
 
+# Version of the layout of cache.json itself. Increase it by 1 whenever the
+# structure of the exported cache (not the cached values) changes. A mismatch
+# discards the entire cache.
+CACHE_SCHEMA_VERSION = 3
+
+DEPG_VERSION_KEY = '__DEPG_VERSION__'
+SECTIONS_KEY = 'sections'
+
+_MISSING = object()
+
+# Resolution of the last access time of the cache entries (used for LRU
+# eviction). Coarse, so that a warm run refreshes an entry at most once a day
+# instead of rewriting the cache every time.
+ACCESS_TIME_RESOLUTION = 86400
+
+
+def getAccessTime():
+    return int(time.time()) // ACCESS_TIME_RESOLUTION * ACCESS_TIME_RESOLUTION
+
 
 def getFileTimestampMs(file):
     a = os.path.getmtime(file)
     return int(a*1000)
 
+
+class FingerprintPolicy:
+    """
+    Defines the fingerprint of a file. A fingerprint is a dict having:
+    - stat : A cheap key computed from the `os.stat` result of the file.
+    - checksum : Hash of the file content.
+    - size : File size.
+    A cache entry is valid if the stat key of the file is same as the recorded
+    one, or else if the checksum is same as the recorded one. Hence checksum is
+    computed only when the stat key differs.
+    Stat keys must be json-serializable and compare equal after a json
+    round-trip (i.e. int or list, not tuple).
+    """
+    def __init__(self, name, stat_key_func, hash_func, read_size):
+        self.name = name
+        self.stat_key_func = stat_key_func
+        self.hash_func = hash_func
+        self.read_size = read_size
+
+    def getStatKey(self, stat_result):
+        return self.stat_key_func(stat_result)
+
+    def getFileChecksum(self, file):
+        hasher = self.hash_func()
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(self.read_size), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def getBufferFingerprint(self, stat_result, buf):
+        """
+        Fingerprint of a file from its @stat_result and its content @buf
+        (bytes like object, eg: mmap). Used when the content is already read,
+        so that the file is not read again for computing the checksum.
+        """
+        hasher = self.hash_func()
+        hasher.update(buf)
+        return dict(stat=self.getStatKey(stat_result),
+                    checksum=hasher.hexdigest(),
+                    size=stat_result.st_size)
+
+    def getFileFingerprint(self, file, entry=None):
+        """
+        Fingerprint of @file. If the stat key of file matches with the one in
+        @entry (a recorded fingerprint), checksum is taken from the @entry
+        instead of reading the file.
+        """
+        stat_result = os.stat(file)
+        stat_key = self.getStatKey(stat_result)
+        if entry is not None and entry['stat'] == stat_key:
+            checksum = entry['checksum']
+        else:
+            checksum = self.getFileChecksum(file)
+        return dict(stat=stat_key, checksum=checksum, size=stat_result.st_size)
+
+
+FINGERPRINT_POLICIES = dict((x.name, x) for x in [
+    # Millisecond mtime, md5 in 4KB chunks. The original DepG fingerprint.
+    FingerprintPolicy("mtime_md5",
+                      lambda st: int(st.st_mtime*1000),
+                      hashlib.md5, 4096),
+    # Nanosecond mtime, size and inode. A file replaced by another one (eg:
+    # `git checkout`, `mv`) is detected even if mtime is same.
+    FingerprintPolicy("stat_blake2b",
+                      lambda st: [st.st_mtime_ns, st.st_size, st.st_ino],
+                      lambda: hashlib.blake2b(digest_size=16), 1 << 20),
+])
+
+DEFAULT_FINGERPRINT_POLICY = "stat_blake2b"
+
+
+def getFingerprintPolicy(name):
+    assert name in FINGERPRINT_POLICIES, \
+        "Unknown file fingerprint policy '%s'. Available: %s" % (
+            name, ", ".join(FINGERPRINT_POLICIES))
+    return FINGERPRINT_POLICIES[name]
+
+
+def getBufferFingerprint(policy_name, stat_result, buf):
+    """
+    FingerprintPolicy.getBufferFingerprint of the policy @policy_name. The
+    policy is referred by name, so that it can be passed to worker processes.
+    """
+    return getFingerprintPolicy(policy_name).getBufferFingerprint(
+        stat_result, buf)
+
+
 class InMemoryFileValueCache:
-    """In memory cache from file content to value."""
-    def __init__(self, cache_dump=None):
+    """
+    In memory cache from file content to value. Entries are validated using
+    the fingerprint of the files (See FingerprintPolicy).
+    The current fingerprint of a file is computed at most once per run (one
+    stat and, only if the stat key differs, one checksum) and it's shared among
+    all the caches having same @current_fingerprints (eg: sections of a
+    DepgCache).
+    """
+    def __init__(self, cache_dump=None, current_fingerprints=None,
+                 fingerprint_policy=None):
         self.data = cache_dump or {}
+        # file -> fingerprint of the current content of the file.
+        if current_fingerprints is None:
+            current_fingerprints = {}
+        self.current_fingerprints = current_fingerprints
+        self.fingerprint_policy = fingerprint_policy or getFingerprintPolicy(
+            DEFAULT_FINGERPRINT_POLICY)
+        # Files whose entry is added or refreshed in this run.
+        self.dirty = set()
+        # Files whose entry is deleted in this run.
+        self.deleted = set()
+        self.stats = dict(hits=0, misses=0)
+        self.access_time = getAccessTime()
 
     def export(self):
         return self.data
 
+    def getEntries(self):
+        """Return the list of (file, entry) of all the entries."""
+        return list(self.data.items())
+
+    def getEntryCount(self):
+        return len(self.data)
+
+    def getCurrentFingerprint(self, file, entry=None):
+        """
+        Return the fingerprint of the current content of @file. See
+        FingerprintPolicy.getFileFingerprint.
+        """
+        fingerprint = self.current_fingerprints.get(file)
+        if fingerprint is None:
+            fingerprint = self.fingerprint_policy.getFileFingerprint(file, entry)
+            self.current_fingerprints[file] = fingerprint
+        return fingerprint
+
+    def getEntry(self, file):
+        """
+        Return the recorded entry (fingerprint and value) of @file, None if
+        absent. Storage hook, along with putEntry.
+        """
+        return self.data.get(file)
+
+    def putEntry(self, file, entry):
+        self.data[file] = entry
+        self.dirty.add(file)
+        self.deleted.discard(file)
+
+    def deleteEntry(self, file):
+        self.data.pop(file, None)
+        self.dirty.discard(file)
+        self.deleted.add(file)
+
+    def touchEntry(self, file, entry):
+        """
+        Record the access of @entry of @file, for the LRU eviction. Return the
+        updated entry.
+        """
+        self.stats['hits'] += 1
+        if entry.get('accessed', 0) < self.access_time:
+            entry = dict(entry, accessed=self.access_time)
+            self.putEntry(file, entry)
+        return entry
+
+    def mergeEntries(self, entries):
+        """
+        Merge @entries (eg: stored by a concurrent run) into this cache. The
+        entries modified or deleted in this run take precedence.
+        """
+        for file, entry in entries.items():
+            if file not in self.dirty and file not in self.deleted:
+                self.data[file] = entry
+
+    def get(self, file, default=None):
+        entry = self.getEntry(file)
+        if entry is None:
+            self.stats['misses'] += 1
+            return default
+        fingerprint = self.getCurrentFingerprint(file, entry)
+        if fingerprint['checksum'] != entry['checksum']:
+            self.stats['misses'] += 1
+            return default
+        if fingerprint['stat'] != entry['stat']:
+            # Same content but touched (or replaced) file. Refresh the entry
+            # so that the next run doesn't compute the checksum again.
+            entry = dict(entry, **fingerprint)
+            self.putEntry(file, entry)
+        return self.touchEntry(file, entry)['value']
+
     def __contains__(self, file):
-        if file not in self.data:
-            return False
-        value = self.data[file]
-        if getFileTimestampMs(file) == value['timestamp']:
-            return True
-        if common.getFileCheckSum(file) == value['checksum']:
-            return True
-        return False
+        return self.get(file, _MISSING) is not _MISSING
 
     def __getitem__(self, file):
-        assert self.__contains__(file)
-        return self.data[file]['value']
+        value = self.get(file, _MISSING)
+        assert value is not _MISSING
+        return value
 
     def __setitem__(self, file, value):
-        self.data[file] = dict(
-            timestamp=getFileTimestampMs(file),
-            checksum=common.getFileCheckSum(file),
-            value=value)
+        self.setEntry(file, value, self.getCurrentFingerprint(file))
+
+    def setEntry(self, file, value, fingerprint):
+        """
+        Same as `self[file] = value`, for an already known @fingerprint of the
+        current content of @file.
+        """
+        self.current_fingerprints[file] = fingerprint
+        self.putEntry(file, dict(fingerprint, value=value,
+                                 accessed=self.access_time))
+
+    def getRecordedSize(self, file):
+        """
+        Size of @file when its entry was recorded, even if the entry is stale.
+        None if unknown.
+        """
+        return (self.getEntry(file) or {}).get('size')
+
+
+def toJsonCompatible(value):
+    """
+    Convert @value into a form which has a deterministic json encoding. Sets
+    are sorted, tuples become lists and functions are represented by their
+    qualified name.
+    """
+    if isinstance(value, dict):
+        return dict((str(k), toJsonCompatible(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return sorted(toJsonCompatible(x) for x in value)
+    if isinstance(value, (list, tuple)):
+        return [toJsonCompatible(x) for x in value]
+    if callable(value):
+        return getattr(value, '__module__', '') + "." + \
+            getattr(value, '__qualname__', repr(value))
+    return value
+
+
+def getCodeChecksum(module_files):
+    """
+    Checksum of the DepG source files @module_files (relative to the DepG
+    package directory). Used for invalidating the cached values when the code
+    producing them changes.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return ":".join(common.getFileCheckSum(os.path.join(directory, x))
+                    for x in module_files)
+
+
+def getSectionKey(section_spec, configs):
+    """
+    Compute the validity key of a cache section. @section_spec is a dict
+    having `code` (list of DepG module files) and `configs` (list of config
+    names) on which the values stored in the section depend.
+    """
+    config_values = dict((x, toJsonCompatible(configs.get(x)))
+                         for x in section_spec['configs'])
+    content = json.dumps(dict(code=getCodeChecksum(section_spec['code']),
+                              configs=config_values), sort_keys=True)
+    return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+def getStoredSections(cache_dump):
+    """
+    Return the sections of the exported cache @cache_dump, empty if it has a
+    different CACHE_SCHEMA_VERSION.
+    """
+    cache_dump = cache_dump or {}
+    if cache_dump.get(DEPG_VERSION_KEY) == CACHE_SCHEMA_VERSION:
+        return cache_dump.get(SECTIONS_KEY, {})
+    return {}
+
+
+class DepgCache:
+    """
+    Persistent DepG cache. It's a collection of named sections, each one
+    being an InMemoryFileValueCache. Every section carries a key computed from
+    the DepG code and the configs it depends on (See getSectionKey). On load,
+    a section whose key doesn't match the expected key is discarded, while the
+    other sections are retained.
+    """
+    def __init__(self, cache_dump, section_keys, fingerprint_policy=None,
+                 source_stamp=None):
+        """
+        @cache_dump is the exported cache (can be empty).
+        @section_keys is a map from section name to the expected key.
+        @fingerprint_policy is the FingerprintPolicy of the entries. It must
+        be covered by the @section_keys.
+        @source_stamp identifies the version of the stored cache @cache_dump
+        was read from (See common.getFileStamp).
+        """
+        stored_sections = getStoredSections(cache_dump)
+        self.section_keys = section_keys
+        self.source_stamp = source_stamp
+        self.sections = {}
+        self.invalidated_sections = []
+        current_fingerprints = {}
+        for name, key in section_keys.items():
+            stored = stored_sections.get(name)
+            entries = None
+            if stored is not None:
+                if stored['key'] == key:
+                    entries = stored['entries']
+                else:
+                    self.invalidated_sections.append(name)
+            self.sections[name] = InMemoryFileValueCache(
+                entries, current_fingerprints, fingerprint_policy)
+
+    def section(self, name):
+        return self.sections[name]
+
+    def merge(self, cache_dump):
+        """
+        Merge the exported cache @cache_dump, stored by a concurrent run after
+        this cache was loaded. Sections having a different key are ignored.
+        """
+        stored_sections = getStoredSections(cache_dump)
+        for name, section in self.sections.items():
+            stored = stored_sections.get(name)
+            if stored is not None and stored['key'] == self.section_keys[name]:
+                section.mergeEntries(stored['entries'])
+
+    def isModified(self):
+        """
+        Return False if the exported cache would be same as the one loaded
+        (See source_stamp).
+        """
+        return (self.source_stamp is None
+                or len(self.invalidated_sections) > 0
+                or any(len(x.dirty) > 0 or len(x.deleted) > 0
+                       for x in self.sections.values()))
+
+    def markStored(self, source_stamp):
+        """Mark the cache as stored, as the version @source_stamp."""
+        self.source_stamp = source_stamp
+        self.invalidated_sections = []
+        for section in self.sections.values():
+            section.dirty = set()
+            section.deleted = set()
+
+    def export(self):
+        sections = dict((name, dict(key=self.section_keys[name],
+                                    entries=section.export()))
+                        for name, section in self.sections.items())
+        return {DEPG_VERSION_KEY: CACHE_SCHEMA_VERSION, SECTIONS_KEY: sections}
+
+
+def getEntryFiles(file, entry):
+    """
+    Files on which the cache @entry of @file depends. The entries keyed by
+    something else than a file (eg: TargetSnapshot) list them in `files`.
+    """
+    return entry['files'] if 'files' in entry else [file]
+
+
+def pruneEntries(cache_object, should_prune):
+    """
+    Delete the entries of all the sections of @cache_object (DepgCache or
+    SqliteDepgCache) for which `should_prune(section, file, entry)` is True.
+    Return the map from section name to number of entries deleted.
+    """
+    output = {}
+    for name, section in cache_object.sections.items():
+        pruned = [file for file, entry in section.getEntries()
+                  if should_prune(section, file, entry)]
+        for file in pruned:
+            section.deleteEntry(file)
+        output[name] = len(pruned)
+    return output
+
+
+def isEntryMissing(section, file, entry):  # pylint: disable=unused-argument
+    """True if any of the files of the cache @entry doesn't exist."""
+    return not all(os.path.isfile(x) for x in getEntryFiles(file, entry))
+
+
+def isEntryStale(section, file, entry):
+    """True if the cache @entry of @file is missing or won't be ever valid."""
+    if isEntryMissing(section, file, entry):
+        return True
+    recorded = entry['files'] if 'files' in entry else {file: entry}
+    return any(section.getCurrentFingerprint(x, fingerprint)['checksum'] !=
+               fingerprint['checksum'] for x, fingerprint in recorded.items())
+
+
+def statOrNone(file):
+    try:
+        return os.stat(file)
+    except FileNotFoundError:
+        return None
+
+
+def validateEntries(cache_object, files, executor):
+    """
+    Compute upfront the current fingerprints of the recorded @files of
+    @cache_object (DepgCache or SqliteDepgCache), so that the later lookups
+    don't stat and hash one file at a time. All the files are stat-ed as one
+    batch, then only the ones whose stat key differs from the recorded one
+    are hashed. Both are done on @executor (a thread pool: os.stat and
+    hashlib release the GIL).
+    Return the tuple (number of valid entries, number of stale entries).
+    """
+    sections = list(cache_object.sections.values())
+    if len(sections) == 0:
+        return 0, 0
+    current_fingerprints = sections[0].current_fingerprints
+    policy = sections[0].fingerprint_policy
+    recorded = {}
+    for file in files:
+        if file in recorded or file in current_fingerprints:
+            continue
+        for section in sections:
+            entry = section.getEntry(file)
+            if entry is not None and 'checksum' in entry:
+                recorded[file] = entry
+                break
+    files = list(recorded)
+    num_valid, num_stale, mismatches = 0, 0, []
+    for file, stat_result in zip(files, executor.map(statOrNone, files)):
+        if stat_result is None:
+            continue  # Reported by the lookup.
+        entry = recorded[file]
+        fingerprint = dict(stat=policy.getStatKey(stat_result),
+                           checksum=entry['checksum'],
+                           size=stat_result.st_size)
+        if fingerprint['stat'] == entry['stat']:
+            current_fingerprints[file] = fingerprint
+            num_valid += 1
+        else:
+            mismatches.append((file, fingerprint))
+    def getChecksum(file):
+        try:
+            return policy.getFileChecksum(file)
+        except FileNotFoundError:
+            return None
+    checksums = executor.map(getChecksum, [file for file, _ in mismatches])
+    for (file, fingerprint), checksum in zip(mismatches, checksums):
+        if checksum is None:
+            continue
+        if checksum == fingerprint['checksum']:
+            num_valid += 1
+        else:
+            num_stale += 1
+        current_fingerprints[file] = dict(fingerprint, checksum=checksum)
+    return num_valid, num_stale
+
+
+def getEntrySize(file, entry):
+    """Size of the cache @entry of @file in cache.json, its key included."""
+    return len(json.dumps(file)) + len(json.dumps(entry)) + len(", : ")
+
+
+def evictLeastRecentlyUsed(cache_object, max_entries=None, max_bytes=None,
+                           disk_size=None):
+    """
+    Delete the least recently accessed entries of @cache_object, until it has
+    at most @max_entries entries and takes at most @max_bytes. The size is
+    the one of the entries in cache.json (See getEntrySize) or, if given,
+    @disk_size (the measured size of the stored cache) reduced in proportion
+    to the entries deleted. Return the number of entries deleted.
+    """
+    candidates = []
+    for section in cache_object.sections.values():
+        for file, entry in section.getEntries():
+            candidates.append((entry.get('accessed', 0), file, section,
+                               getEntrySize(file, entry)))
+    candidates.sort(key=lambda x: x[:2])
+    num_entries = len(candidates)
+    num_bytes = sum(x[3] for x in candidates)
+    scale = 1.0
+    if disk_size is not None and num_bytes > 0:
+        scale = disk_size / num_bytes
+        num_bytes = disk_size
+    evicted = 0
+    for _, file, section, size in candidates:
+        if (max_entries is None or num_entries <= max_entries) and \
+                (max_bytes is None or num_bytes <= max_bytes):
+            break
+        section.deleteEntry(file)
+        num_entries -= 1
+        num_bytes -= size * scale
+        evicted += 1
+    return evicted
@@ -0,0 +1,232 @@
+#! /usr/bin/env python3
+
+"""
+Maintenance of the DepG cache. Commands:
+- stats : Number of entries, hit rates (last run and across the runs) and
+          on-disk size of the cache.
+- verify : Check that the cache is readable and count the valid, stale
+           (file changed) and missing (file deleted) entries.
+- prune : Delete the entries of deleted files (and of changed files with
+          `--stale`), then evict the least recently used entries beyond
+          `--max_entries`/`--max_bytes` (default: CACHE_MAX_ENTRIES and
+          CACHE_MAX_BYTES configs).
+- warm : Scan every C++/proto file under TOP_DIRECTORY_LIST into the cache,
+         at low priority (`--nice`, `--max_mb_per_sec`), so that the next
+         DepG run (eg: after a big rebase) finds the includes in cache.
+         Files already in cache are skipped and the cache is checkpointed
+         as the scan proceeds, hence an interrupted warm-up resumes.
+See example_cache_main.py for the usage.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from . import cache
+from . import common
+from . import target_graph_builder
+from .depg_lib_main import preprocessConfig
+from .sqlite_cache import SqliteDepgCache
+
+
+def getArgs(argv=None):
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("command",
+                        choices=["stats", "verify", "prune", "warm"])
+    parser.add_argument("--stale", action='store_true', default=False,
+                        help="prune: Delete the entries of changed files too.")
+    parser.add_argument("--max_entries", type=int, default=None)
+    parser.add_argument("--max_bytes", type=int, default=None)
+    parser.add_argument("--nice", type=int, default=10,
+                        help="warm: Niceness increment of the scanning.")
+    parser.add_argument("--max_mb_per_sec", type=float, default=None,
+                        help="warm: Bound on the rate of the bytes scanned.")
+    parser.add_argument("--batch_size", type=int, default=1000)
+    return parser.parse_args(argv)
+
+
+def formatSize(num_bytes):
+    return "%.1f MB" % (num_bytes / 1e6)
+
+
+def formatHitRate(stats):
+    total = stats.get('hits', 0) + stats.get('misses', 0)
+    if total == 0:
+        return "-"
+    return "%.1f%% (%d/%d)" % (100.0 * stats['hits'] / total, stats['hits'],
+                               total)
+
+
+def printTable(rows):
+    widths = [max(len(str(row[i])) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(str(x).ljust(w) for x, w in zip(row, widths)).rstrip())
+
+
+def stats(configs, cache_object):
+    cache_directory = configs.CACHE_DIRECTORY
+    run_stats = target_graph_builder.loadRunStats(cache_directory)
+    print("Cache: %s (%s backend), on-disk size: %s, runs recorded: %d" % (
+        cache_directory, configs.CACHE_BACKEND,
+        formatSize(target_graph_builder.getCacheDiskSize(cache_directory)),
+        run_stats.get('runs', 0)))
+    rows = [("section", "entries", "hit rate (last run)", "hit rate (total)")]
+    for name, section in sorted(cache_object.sections.items()):
+        rows.append((name, section.getEntryCount(),
+                     formatHitRate(run_stats.get('last_run', {}).get(name, {})),
+                     formatHitRate(run_stats.get('total', {}).get(name, {}))))
+    printTable(rows)
+    if len(cache_object.invalidated_sections) > 0:
+        print("Invalidated sections (code or configs changed): " +
+              ", ".join(cache_object.invalidated_sections))
+    return 0
+
+
+def checkReadable(configs):
+    """Return the error message if the stored cache is corrupted, else None."""
+    cache_directory = configs.CACHE_DIRECTORY
+    if configs.CACHE_BACKEND == "sqlite":
+        file = target_graph_builder.getSqliteCacheFile(cache_directory)
+        if not os.path.isfile(file):
+            return None
+        connection = sqlite3.connect(file)
+        try:
+            result = connection.execute("PRAGMA integrity_check").fetchone()
+        except sqlite3.DatabaseError as e:
+            return str(e)
+        finally:
+            connection.close()
+        return None if result[0] == "ok" else result[0]
+    file = target_graph_builder.getCacheFile(cache_directory)
+    if not os.path.isfile(file):
+        return None
+    try:
+        with open(file, encoding="utf-8") as fd:
+            json.loads(fd.read().strip() or "{}")
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def verify(cache_object):
+    rows = [("section", "entries", "valid", "stale", "missing")]
+    for name, section in sorted(cache_object.sections.items()):
+        counts = [0, 0, 0]
+        for file, entry in section.getEntries():
+            if cache.isEntryMissing(section, file, entry):
+                counts[2] += 1
+            elif cache.isEntryStale(section, file, entry):
+                counts[1] += 1
+            else:
+                counts[0] += 1
+        rows.append((name, sum(counts), *counts))
+    printTable(rows)
+    return 0
+
+
+def prune(configs, cache_object, args):
+    cache_directory = configs.CACHE_DIRECTORY
+    size_before = target_graph_builder.getCacheDiskSize(cache_directory)
+    should_prune = cache.isEntryStale if args.stale else cache.isEntryMissing
+    pruned = cache.pruneEntries(cache_object, should_prune)
+    max_entries = args.max_entries
+    if max_entries is None:
+        max_entries = configs.CACHE_MAX_ENTRIES
+    max_bytes = args.max_bytes
+    if max_bytes is None:
+        max_bytes = configs.CACHE_MAX_BYTES
+    target_graph_builder.storeCache(cache_directory, cache_object)
+    if isinstance(cache_object, SqliteDepgCache):
+        cache_object.vacuum()
+    evicted = target_graph_builder.evictToLimits(
+        cache_directory, cache_object, max_entries, max_bytes)
+    for name, count in sorted(pruned.items()):
+        print("%s: %d entries pruned" % (name, count))
+    print("%d entries evicted (least recently used)" % evicted)
+    print("On-disk size: %s -> %s" % (
+        formatSize(size_before),
+        formatSize(target_graph_builder.getCacheDiskSize(cache_directory))))
+    return 0
+
+
+def getWarmFiles(configs):
+    """Return the C++ files and the proto files under TOP_DIRECTORY_LIST."""
+    files = []
+    for directory in common.toRelativePaths(configs.TOP_DIRECTORY_LIST):
+        files.extend(target_graph_builder.listDirectoryRecursive(
+            directory, configs.FORBIDDEN_PATHS, configs.IGNORED_PATHS,
+            configs.WALK_WORKERS))
+    cpp_files = [x for x in files
+                 if common.hasExtensions(x, configs.CPP_EXTENSIONS)]
+    proto_files = [x for x in files if x.endswith(configs.PROTO_EXTENSION)]
+    return cpp_files, proto_files
+
+
+def formatProgress(num_done, num_files, scan_stats, seconds):
+    seconds = max(seconds, 1e-6)
+    return "%d/%d files, %d scanned: %.0f files/s, %.1f MB/s" % (
+        num_done, num_files, scan_stats['files'],
+        scan_stats['files'] / seconds, scan_stats['bytes'] / 1e6 / seconds)
+
+
+def warm(configs, args):
+    if args.nice:
+        os.nice(args.nice)  # Inherited by the scan worker processes.
+    builder = target_graph_builder.TargetGraphBuilder(configs)
+    parser = builder.source_deps_parser
+    cpp_files, proto_files = getWarmFiles(configs)
+    batches = [(True, cpp_files[i:i + args.batch_size])
+               for i in range(0, len(cpp_files), args.batch_size)]
+    batches += [(False, proto_files[i:i + args.batch_size])
+                for i in range(0, len(proto_files), args.batch_size)]
+    num_files, num_done = len(cpp_files) + len(proto_files), 0
+    start = time.monotonic()
+    with builder.storingCacheOnError():
+        for is_cpp, batch in batches:
+            if is_cpp:
+                parser.scanMany(batch)
+            else:
+                parser.scanManyProtos(batch)
+            num_done += len(batch)
+            builder.checkpointCache()
+            if args.max_mb_per_sec:
+                # Sleep until the average rate is within the bound.
+                delay = parser.scan_stats['bytes'] / 1e6 / args.max_mb_per_sec \
+                    - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+            print(formatProgress(num_done, num_files, parser.scan_stats,
+                                 time.monotonic() - start), file=sys.stderr)
+    builder.finishRun()
+    print("Warmed up: " + formatProgress(num_done, num_files, parser.scan_stats,
+                                         time.monotonic() - start))
+    return 0
+
+
+def main(configs, argv=None):
+    """
+    Run the cache command given in @argv (default: command line arguments)
+    on the cache of @configs. Return the exit code.
+    """
+    args = getArgs(argv)
+    configs = preprocessConfig(configs)
+    assert configs.CACHE_DIRECTORY, "CACHE_DIRECTORY is not set."
+    if args.command == "verify":
+        # A corrupted cache is loaded as empty, so check before loading.
+        error = checkReadable(configs)
+        if error is not None:
+            print("Corrupted cache: " + error)
+            return 1
+    if args.command == "warm":
+        return warm(configs, args)
+    cache_object = target_graph_builder.loadCache(configs)
+    if args.command == "stats":
+        return stats(configs, cache_object)
+    if args.command == "verify":
+        return verify(cache_object)
+    return prune(configs, cache_object, args)
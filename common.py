@@ -5,9 +5,23 @@
 
 import os
 import hashlib
+import tempfile
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows.
+    fcntl = None
 
 from .targets import TargetType
 
+_MISSING = object()
+
+# Read once at import, as os.umask can only be read by setting it, which
+# isn't safe while other threads create files.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 CPP_TARGETS = set([TargetType.CPP_SOURCE, TargetType.CPP_EXECUTABLE,
                    TargetType.CPP_SHARED_LIB, TargetType.CPP_STATIC_LIB,
                    TargetType.CPP_TEST])
@@ -93,11 +107,13 @@ def withSerializableCacheOnArg0(self_to_cache_store_func, serializer=None,
     def func_converter(old_func):
         def new_func(self, arg1, *args):
             cache_store = self_to_cache_store_func(self)
-            if cache_store is not None and arg1 in cache_store:
-                output = cache_store[arg1]
-                if deserializer is not None:
-                    output = deserializer(output)
-                return output
+            if cache_store is not None:
+                # Single lookup, validating a cache entry can be costly.
+                output = cache_store.get(arg1, _MISSING)
+                if output is not _MISSING:
+                    if deserializer is not None:
+                        output = deserializer(output)
+                    return output
             output = old_func(self, arg1, *args)
             if cache_store is not None:
                 cache_output = output
@@ -108,10 +124,23 @@ def withSerializableCacheOnArg0(self_to_cache_store_func, serializer=None,
         return new_func
     return func_converter
 
-def assertFileExists(file, configs, msg=''):
+def normalizePath(path):
+    """
+    Same as os.path.normpath, but avoids the call when @path is already
+    normalized in an obvious way (no `.`, `..` components or `//`).
+    """
+    if path.startswith(".") or "/." in path or "//" in path or \
+            path.endswith("/"):
+        return os.path.normpath(path)
+    return path
+
+def assertFileExists(file, configs, msg='', file_index=None):
     if file in configs.IGNORE_EXISTANCE:
         return
-    assert os.path.isfile(file), msg
+    if file_index is not None:
+        assert file_index.isFile(file), msg
+    else:
+        assert os.path.isfile(file), msg
 
 def readFile(file):
     with open(file, encoding="utf-8", errors="ignore") as fd:
@@ -121,6 +150,59 @@ def writeFile(file, data, mode='w'):
     with open(file, mode, encoding="utf-8") as fd:
         return fd.write(data)
 
+def writeFileAtomic(file, data):
+    """
+    Write @data to @file such that readers see either the old or the new
+    content, never a partially written file (even if the process is killed).
+    @data is either str or bytes.
+    """
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(file) or ".",
+                                    prefix=os.path.basename(file) + ".tmp")
+    try:
+        # mkstemp creates the file readable by the owner only. The new file
+        # gets the mode of the one it replaces, or the one of a regular
+        # file, as it may be shared with other users (eg: SHARED_CACHE).
+        try:
+            mode = os.stat(file).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_file, mode)
+        with (os.fdopen(fd, "wb") if isinstance(data, bytes) else
+              os.fdopen(fd, "w", encoding="utf-8")) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, file)
+    except BaseException:
+        os.remove(tmp_file)
+        raise
+
+@contextlib.contextmanager
+def fileLock(lock_file):
+    """
+    Exclusive advisory lock (fcntl.flock) on @lock_file, held during the
+    with-block. No-op where fcntl isn't available.
+    """
+    with open(lock_file, "a") as fd:
+        if fcntl is not None:
+            fcntl.flock(fd.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd.fileno(), fcntl.LOCK_UN)
+
+def getFileStamp(file):
+    """
+    Return a value which changes whenever @file is rewritten, None if @file
+    doesn't exist.
+    """
+    try:
+        st = os.stat(file)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
 def getFileCheckSum(file):
     assert (os.path.isfile(file)), ("File %s doesn't exists." % file)
     hash_md5 = hashlib.md5()
@@ -0,0 +1,209 @@
+#! /usr/bin/env python3
+
+"""
+Compact representation of a target graph. Target names are interned to ints
+(ids) and the adjacency is stored in CSR form, i.e. two `array('i')`:
+`offsets` (one per node, plus one) and `edges`. The deps of the node x are
+`edges[offsets[x]:offsets[x + 1]]`, its public deps first. A few bytes per
+node and per edge, against a dict and lists of names per target in the
+target_map, and the traversals run on the ints directly.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import array
+import json
+
+from . import algorithms
+from .targets import TargetType, DepgTarget
+
+# Type of the nodes which are deps only, i.e. absent in the target_map.
+UNKNOWN_TYPE = 0
+
+
+class CompactGraph:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.types = array.array('b')
+        self.num_public = array.array('i')
+        self.offsets = array.array('i', [0])
+        self.edges = array.array('i')
+
+    def intern(self, name):
+        """Return the id of @name, assigning a new one if absent."""
+        node = self.ids.get(name)
+        if node is None:
+            node = len(self.names)
+            self.ids[name] = node
+            self.names.append(name)
+        return node
+
+    def addNode(self, name, target_type, public_deps, private_deps):
+        """Add the node @name. Nodes must be added in the order of their ids."""
+        assert self.intern(name) == len(self.types)
+        self.edges.extend(self.intern(x) for x in public_deps)
+        self.edges.extend(self.intern(x) for x in private_deps)
+        self.num_public.append(len(public_deps))
+        self.offsets.append(len(self.edges))
+        self.types.append(int(target_type))
+
+    def getNumNodes(self):
+        return len(self.types)
+
+    def getEdges(self, node):
+        return self.edges[self.offsets[node]:self.offsets[node + 1]]
+
+    def getDeps(self, name):
+        """Return the tuple (public deps, private deps) of @name."""
+        node = self.ids[name]
+        start, end = self.offsets[node], self.offsets[node + 1]
+        middle = start + self.num_public[node]
+        return ([self.names[x] for x in self.edges[start:middle]],
+                [self.names[x] for x in self.edges[middle:end]])
+
+    def getIds(self, names):
+        return [self.ids[x] for x in names]
+
+    def getNames(self, nodes):
+        return [self.names[x] for x in nodes]
+
+    def toTargetMap(self):
+        """
+        Return the target_map of the graph. Targets have only the name, type
+        and deps, the other fields (eg: hdrs) are not part of the graph.
+        """
+        output = {}
+        for node, name in enumerate(self.names):
+            if self.types[node] == UNKNOWN_TYPE:
+                continue
+            target = DepgTarget(name=name, type=TargetType(self.types[node]))
+            public_deps, private_deps = self.getDeps(name)
+            if len(public_deps) > 0:
+                target.public_deps = public_deps
+            if len(private_deps) > 0:
+                target.private_deps = private_deps
+            output[name] = target
+        return output
+
+    def depsCover(self, names):
+        """Same as algorithms.depsCover, on the names of this graph."""
+        return set(self.getNames(algorithms.csrDepsCover(
+            self.offsets, self.edges, self.getIds(names))))
+
+    def stronglyConnectedComponents(self, names):
+        """Same as algorithms.stronglyConnectedComponents."""
+        components = algorithms.csrStronglyConnectedComponents(
+            self.offsets, self.edges, self.getIds(names))
+        return [self.getNames(x) for x in components]
+
+    def topologicalSortedDepsCover(self, names):
+        """Same as algorithms.topologicalSortedDepsCover."""
+        output = []
+        for component in algorithms.csrStronglyConnectedComponents(
+                self.offsets, self.edges, self.getIds(names)):
+            assert len(component) == 1 and component[0] not in \
+                self.getEdges(component[0]), "Cycle in the graph: %s" % (
+                    ", ".join(self.getNames(component)))
+            output.append(self.names[component[0]])
+        return output
+
+    def getReversed(self):
+        """
+        Return the graph having the same nodes and every edge reversed. A
+        reversed edge is public if the edge was.
+        """
+        num_nodes = self.getNumNodes()
+        output = CompactGraph()
+        output.names, output.ids = self.names, self.ids
+        output.types = self.types
+        output.num_public = array.array('i', [0]) * num_nodes
+        for x in range(num_nodes):
+            start = self.offsets[x]
+            for y in self.edges[start:start + self.num_public[x]]:
+                output.num_public[y] += 1
+        in_degree = array.array('i', [0]) * num_nodes
+        for y in self.edges:
+            in_degree[y] += 1
+        output.offsets = array.array('i', [0]) * (num_nodes + 1)
+        for y in range(num_nodes):
+            output.offsets[y + 1] = output.offsets[y] + in_degree[y]
+        # Public edges are placed first, then the private ones.
+        output.edges = array.array('i', [0]) * len(self.edges)
+        positions = output.offsets[:-1]
+        for is_public in (True, False):
+            for x in range(num_nodes):
+                start, end = self.offsets[x], self.offsets[x + 1]
+                middle = start + self.num_public[x]
+                for y in (self.edges[start:middle] if is_public else
+                          self.edges[middle:end]):
+                    output.edges[positions[y]] = x
+                    positions[y] += 1
+        return output
+
+    def getPublicSubgraph(self):
+        """Return the graph having the same nodes and only the public edges."""
+        output = CompactGraph()
+        output.names, output.ids = self.names, self.ids
+        output.types = self.types
+        output.num_public = self.num_public
+        for x in range(self.getNumNodes()):
+            start = self.offsets[x]
+            output.edges.extend(self.edges[start:start + self.num_public[x]])
+            output.offsets.append(len(output.edges))
+        return output
+
+    def toBytes(self, metadata=None):
+        """
+        Serialize the graph, along with @metadata (json-serializable). The
+        arrays are stored raw, hence the output is meant for this machine
+        only (eg: a cache). See fromBytes.
+        """
+        names = "\n".join(self.names).encode("utf-8")
+        header = dict(metadata=metadata, names_size=len(names),
+                      num_nodes=self.getNumNodes(), num_edges=len(self.edges),
+                      itemsize=self.edges.itemsize)
+        return b"".join([json.dumps(header).encode("utf-8"), b"\n", names,
+                         self.types.tobytes(), self.num_public.tobytes(),
+                         self.offsets.tobytes(), self.edges.tobytes()])
+
+
+def fromBytes(data):
+    """Return the tuple (graph, metadata) serialized by CompactGraph.toBytes."""
+    position = data.index(b"\n")
+    header = json.loads(data[:position])
+    assert header['itemsize'] == array.array('i').itemsize
+    graph = CompactGraph()
+    position += 1
+    names_size = header['names_size']
+    names = data[position:position + names_size].decode("utf-8")
+    graph.names = names.split("\n") if names_size > 0 else []
+    graph.ids = dict(zip(graph.names, range(len(graph.names))))
+    position += names_size
+    num_nodes = header['num_nodes']
+    for field, count in (('types', num_nodes), ('num_public', num_nodes),
+                         ('offsets', num_nodes + 1),
+                         ('edges', header['num_edges'])):
+        values = getattr(graph, field)
+        del values[:]
+        size = count * values.itemsize
+        values.frombytes(data[position:position + size])
+        position += size
+    assert position == len(data), "Truncated graph data"
+    return graph, header['metadata']
+
+
+def fromTargetMap(target_map):
+    """
+    Build the CompactGraph of @target_map. The deps absent in @target_map
+    are nodes of UNKNOWN_TYPE, without deps.
+    """
+    graph = CompactGraph()
+    for name in target_map:
+        graph.intern(name)
+    for name, target in target_map.items():
+        graph.addNode(name, target.type, target.get('public_deps', []),
+                      target.get('private_deps', []))
+    for name in graph.names[graph.getNumNodes():]:
+        graph.addNode(name, UNKNOWN_TYPE, [], [])
+    return graph
@@ -45,6 +45,53 @@ def getDefaultConfigs():
 
     configs.CACHE_DIRECTORY = "build/.depg/cache"
 
+    # Storage of the cache in CACHE_DIRECTORY. "json": single cache.json,
+    # loaded and rewritten in full by every run. "sqlite": cache.sqlite,
+    # entries are loaded on demand and only the modified ones are written
+    # back. An existing cache.json is migrated. See sqlite_cache.py.
+    configs.CACHE_BACKEND = "json"
+
+    # Journal mode of the "sqlite" backend. "WAL" lets concurrent runs read
+    # while one of them is writing, but needs shared memory, hence doesn't
+    # work when CACHE_DIRECTORY is on a network filesystem (NFS, FUSE): use
+    # "DELETE" (or "TRUNCATE") there. Falls back to "DELETE" where WAL isn't
+    # supported.
+    configs.CACHE_SQLITE_JOURNAL_MODE = "WAL"
+
+    # Optional bounds of the cache. When exceeded at the end of a run, the
+    # least recently used entries are evicted (down to 90% of the bound).
+    # CACHE_MAX_BYTES is compared with the disk usage of CACHE_DIRECTORY once
+    # stored, and the SQLite database is vacuumed after an eviction.
+    # None means unbounded. See cache_tool.py for the manual pruning.
+    configs.CACHE_MAX_ENTRIES = None
+    configs.CACHE_MAX_BYTES = None
+
+    # Store the cache during the run, once CACHE_CHECKPOINT_ENTRIES entries
+    # are modified or CACHE_CHECKPOINT_SECONDS seconds elapsed since the last
+    # store, so that an interrupted long run is resumed by the next one. The
+    # cache is also stored if the run fails (or on SIGINT). None disables the
+    # respective trigger. Each checkpoint of the "json" backend rewrites the
+    # whole cache.json, hence the time based trigger suits it better.
+    configs.CACHE_CHECKPOINT_ENTRIES = None
+    configs.CACHE_CHECKPOINT_SECONDS = 60
+
+    # Number of threads validating the cache entries of the files a query is
+    # going to look up, in bulk before the traversal: one burst of `stat`s,
+    # then hashing only the files whose stat changed. Pays off on network
+    # filesystems. 0 (or None) means validating lazily, one file at a time.
+    # With IO_MAX_IN_FLIGHT, its threads are used instead.
+    configs.CACHE_VALIDATION_WORKERS = 16
+
+    # Content-addressed cache of the scan results, shareable across checkouts
+    # and machines (See shared_cache.py): a directory (eg: populated by a CI
+    # job and mounted in the others) or an `http://` URL (See
+    # `python -m depg.shared_cache`). Consulted on the misses of the cache in
+    # CACHE_DIRECTORY, hence requires it. None disables it.
+    configs.SHARED_CACHE = None
+
+    # Only read the SHARED_CACHE, never publish the new scan results to it.
+    configs.SHARED_CACHE_READ_ONLY = False
+
     configs.BUILD_FILE_NAME = "BUILD"
 
     configs.THIRD_PARTY_TARGET_BUILD_FILES = []
@@ -63,4 +110,73 @@ def getDefaultConfigs():
     # set to `configs.DEPG_DEPS_CACHE_CHECKSUM`.
     configs.DEPG_DEPS_CACHE_CHECKSUM = None
 
+    # How much of a source file is scanned for includes/imports. "full" scans
+    # the whole file. "preamble" stops at the first line which is not a
+    # comment or a preprocessor directive, which is much faster for huge
+    # (eg: generated) files but misses the includes placed after the code.
+    # See include_scanner.py.
+    configs.INCLUDE_SCAN_MODE = "full"
+
+    # How the cache detects changed files. See cache.FINGERPRINT_POLICIES.
+    # "stat_blake2b": (mtime in ns, size, inode), content hashed by blake2b
+    #                 only if these differ.
+    # "mtime_md5": mtime in ms, content hashed by md5 only if it differs.
+    configs.FILE_FINGERPRINT = "stat_blake2b"
+
+    # Number of worker processes used for scanning the source files in bulk.
+    # None means `os.cpu_count()`. 1 means scanning in the DepG process itself.
+    configs.SCAN_WORKERS = None
+
+    # Read the source files to be scanned concurrently, up to these many reads
+    # in flight (See async_io.py), and scan them in the DepG process. Meant
+    # for network filesystems (NFS, FUSE) where the reads are bound by the
+    # latency. The reads ahead, the shared cache reads and the cache validation
+    # stats share the same bound. None means reading through the scan workers
+    # instead.
+    configs.IO_MAX_IN_FLIGHT = None
+
+    # Read ahead the in-repo headers as soon as they are resolved, as they
+    # are going to be scanned soon (See prefetcher.py): "fadvise" (page
+    # cache), "read" (buffers of up to PREFETCH_BUFFER_MB) or None (disabled).
+    configs.PREFETCH = None
+    configs.PREFETCH_BUFFER_MB = 64
+
+    # Worker processes are used only if a bulk scan has at least these many
+    # files missing in the cache. Starting the workers is not worth it for a
+    # handful of files.
+    configs.SCAN_POOL_MIN_FILES = 64
+
+    # Kind of workers used for the bulk scanning: "process" or "thread".
+    # Processes scale the regex matching with cores, threads are cheaper to
+    # start and are enough when the reads dominate (eg: network filesystems).
+    configs.SCAN_EXECUTOR = "process"
+
+    # Build the targets frontier by frontier, scanning all the source files of
+    # a frontier in bulk. If False, targets are built one at a time (serial
+    # path, useful for debugging). Output is identical in both cases.
+    configs.BATCHED_TRAVERSAL = True
+
+    # Persist the built targets in the cache (See target_snapshot.py), so
+    # that a target whose source files haven't changed is restored instead
+    # of being rebuilt. Meant for CACHE_BACKEND "sqlite": with "json", the
+    # larger cache.json costs more to load than the snapshot saves.
+    configs.TARGET_SNAPSHOT = False
+
+    # Threads walking the subtrees of the directories given to DepG (See
+    # target_graph_builder.listDirectoryRecursive). More than 1 pays off on
+    # large trees, especially on network filesystems.
+    configs.WALK_WORKERS = 1
+
+    # Answer the file existence queries from an index built by walking the
+    # TOP_DIRECTORY_LIST once, instead of a `stat` per query.
+    configs.FILE_INDEX = True
+
+    # Drop the deps of the generated targets which are implied by their other
+    # deps (See deps_reduction.py), before writing the BUILD files.
+    configs.TRANSITIVE_REDUCTION = False
+
+    # Print the summary of the work done (See
+    # TargetGraphBuilder.getRunSummary) at the end of the run.
+    configs.PRINT_RUN_SUMMARY = False
+
     return configs
@@ -17,6 +17,8 @@ from .default_configs import getDefaultConfigs
 from . import merge_build_file
 from . import parser
 from . import common
+from . import deps_reduction
+from .targets import DepgTarget
 
 
 def getHeaderPrefixesMap(third_p_build_files):
@@ -65,9 +67,38 @@ class Depg:
         target_names = target_graph_builder.changedPathsToTargetNames(
             paths, self.configs)
         targets_map = self.deps_parser.getDeps(target_names)
+        run_summary = self.deps_parser.getRunSummary()
+        if self.configs.TRANSITIVE_REDUCTION:
+            targets_map, num_removed = self.reduceDeps(targets_map,
+                                                       target_names)
+            run_summary.append("TransitiveReduction: %d deps removed" %
+                               num_removed)
         build_files_map = merge_build_file.depgTargetsToLocalTargets(targets_map)
+        if self.configs.PRINT_RUN_SUMMARY:
+            print("\n".join(run_summary))
         return build_files_map
 
+    def reduceDeps(self, targets_map, target_names):
+        """
+        Return deps_reduction.reduceDeps of the targets @target_names of
+        @targets_map (as returned by getDeps). A dep is implied through the
+        public deps of the other deps, so these are built first, whichever
+        paths are regenerated.
+        """
+        # Copies, so that the deps built below stay declarations here.
+        output = dict((x, DepgTarget(y)) for x, y in targets_map.items())
+        deps = set()
+        for name in target_names:
+            target = targets_map[name]
+            deps.update(target.get('public_deps', []) +
+                        target.get('private_deps', []))
+        graph_map = self.deps_parser.publicDepsCover(sorted(deps))
+        graph_map.update((x, output[x]) for x in target_names)
+        reduced_map, num_removed = deps_reduction.reduceDeps(graph_map,
+                                                             target_names)
+        output.update((x, reduced_map[x]) for x in target_names)
+        return output, num_removed
+
     def regenerateBuildFiles(self, paths, output_directory="."):
         build_files_map = self.autoGenBuildFileMap(paths)
         merge_build_file.regenerateBuildFiles(build_files_map,
@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+
+"""
+Transitive reduction of the deps of the built targets: a dep is dropped when
+it's implied by another dep of the same target.
+Public deps are visible to the dependents, private deps are not. Hence the
+target X reaches the target D through its dep E iff D is reachable from E by
+public deps only. So:
+- A private dep D of X is implied if it's reachable so from any other dep E.
+- A public dep D of X is implied only if it's reachable so from another
+  public dep E, as X's dependents must still see D.
+The reachability is answered by the bitset closures of the public-deps graph
+(See reachability.py). The deps in the same cycle don't imply each other,
+so that at least one of them stays, and the deps in the same cycle as the
+target don't imply anything.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+from . import compact_graph
+from . import reachability
+from .targets import DepgTarget
+
+
+def reduceDeps(target_map, target_names=None):
+    """
+    Return the tuple (reduced target_map, number of deps removed). Only the
+    targets @target_names (default: all) are reduced, the others are used
+    for the reachability only. @target_map is unchanged, the reduced targets
+    are copies.
+    """
+    graph = compact_graph.fromTargetMap(target_map)
+    index = reachability.ReachabilityIndex(graph.getPublicSubgraph())
+    ids, rank = graph.ids, index.rank
+    # Rank -> closure excluding its own component, i.e. the deps in the same
+    # cycle.
+    closures = [index.getReach(x) ^ (1 << x)
+                for x in range(len(index.components))]
+
+    def impliedRanks(deps, own_rank):
+        output = 0
+        for x in deps:
+            x = rank[ids[x]]
+            # The paths from a dep in the same cycle as the target go through
+            # the target's own deps, which are being reduced.
+            if x != own_rank:
+                output |= closures[x]
+        return output
+
+    output = dict(target_map)
+    num_removed = 0
+    if target_names is None:
+        target_names = list(target_map)
+    for name in target_names:
+        target = target_map[name]
+        public_deps = target.get('public_deps', [])
+        private_deps = target.get('private_deps', [])
+        own_rank = rank[ids[name]]
+        by_public = impliedRanks(public_deps, own_rank)
+        by_any = by_public | impliedRanks(private_deps, own_rank)
+        reduced_public = [x for x in public_deps
+                          if not (by_public >> rank[ids[x]]) & 1]
+        reduced_private = [x for x in private_deps
+                           if not (by_any >> rank[ids[x]]) & 1]
+        removed = len(public_deps) + len(private_deps) - \
+            len(reduced_public) - len(reduced_private)
+        if removed == 0:
+            output[name] = target
+            continue
+        num_removed += removed
+        target = DepgTarget(target)
+        for field, deps in (('public_deps', reduced_public),
+                            ('private_deps', reduced_private)):
+            if len(deps) > 0:
+                target[field] = deps
+            else:
+                target.pop(field, None)
+        output[name] = target
+    return output, num_removed
@@ -0,0 +1,36 @@
+#! /usr/bin/env python3
+
+# Author: Mohit Saini (mohitsaini1196@gmail.com)
+
+"""
+Usage:
+./tools/depg/cache_main.py stats|verify|prune [--stale] [--max_entries N]
+                           [--max_bytes N]
+./tools/depg/cache_main.py warm [--nice N] [--max_mb_per_sec X]
+                           [--batch_size N]
+Maintenance of the DepG cache. See cache_tool.py for the commands.
+Configs must be same as the ones of `./tools/depg/main.py`.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import os
+import sys
+
+import depg.cache_tool as cache_tool
+import depg.depg_lib_main as depg
+
+def getConfigs():
+    configs = depg.getDefaultConfigs()
+    configs.THIRD_PARTY_TARGET_BUILD_FILES = ["third_party/targets/BUILD"]
+    configs.TOP_DIRECTORY_LIST = ["sage", "common", "testing", "third_party"]
+    return configs
+
+
+def main():
+    source_directory = os.path.abspath("ms/ctwik_experimental")
+    os.chdir(source_directory)
+    sys.exit(cache_tool.main(getConfigs()))
+
+if __name__ == "__main__":
+    main()
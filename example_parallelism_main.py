@@ -0,0 +1,34 @@
+#! /usr/bin/env python3
+
+# Author: Mohit Saini (mohitsaini1196@gmail.com)
+
+"""
+Usage:
+./tools/depg/parallelism_main.py [--compile_times <json file>] [paths]
+Print the critical path and parallelism report of the targets under the paths.
+See build_parallelism.py.
+Configs must be same as the ones of `./tools/depg/main.py`.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import os
+import sys
+
+import depg.build_parallelism as build_parallelism
+import depg.depg_lib_main as depg
+
+def getConfigs():
+    configs = depg.getDefaultConfigs()
+    configs.THIRD_PARTY_TARGET_BUILD_FILES = ["third_party/targets/BUILD"]
+    configs.TOP_DIRECTORY_LIST = ["sage", "common", "testing", "third_party"]
+    return configs
+
+
+def main():
+    source_directory = os.path.abspath("ms/ctwik_experimental")
+    os.chdir(source_directory)
+    sys.exit(build_parallelism.main(getConfigs()))
+
+if __name__ == "__main__":
+    main()
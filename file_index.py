@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+
+# pylint: disable=missing-module-docstring,missing-function-docstring
+# pylint: disable=invalid-name
+
+import os
+
+from . import common
+
+
+class FileIndex:
+    """
+    Index of the files present in the source directories. It's built by a
+    single `os.scandir` walk of @top_directories and answers the file
+    existence queries without any syscall.
+    The directories matching with @forbidden_paths or @ignored_paths are not
+    walked (same as target_graph_builder.listDirectoryRecursive). A query on a
+    path which is not covered by the walk (eg: path outside the
+    @top_directories, or inside an ignored directory) falls back to
+    `os.path.isfile`, hence the answers are always same as `os.path.isfile`.
+    The index is built lazily on the first query.
+    """
+    def __init__(self, top_directories, forbidden_paths, ignored_paths):
+        self.top_directories = [os.path.normpath(x) for x in top_directories]
+        self.forbidden_paths = forbidden_paths
+        self.ignored_paths = ignored_paths
+        self.files = None
+        # Directories (or files) not walked. Queries inside them fall back to
+        # `os.path.isfile`.
+        self.skipped_paths = set()
+        # Memoized results of isDirectoryCovered.
+        self.covered_directories = {}
+        self.stats = dict(directories_scanned=0, lookups=0, fallbacks=0)
+
+    def build(self):
+        self.files = set()
+        stack = [x for x in self.top_directories if os.path.isdir(x)]
+        while len(stack) > 0:
+            directory = stack.pop()
+            self.stats['directories_scanned'] += 1
+            with os.scandir(directory) as it:
+                for entry in it:
+                    path = entry.name if directory == "." else \
+                        directory + "/" + entry.name
+                    if path in self.forbidden_paths:
+                        self.skipped_paths.add(path)
+                    elif entry.is_dir(follow_symlinks=False):
+                        if path in self.ignored_paths:
+                            self.skipped_paths.add(path)
+                        else:
+                            stack.append(path)
+                    elif entry.is_file():
+                        self.files.add(path)
+                    elif entry.is_dir():
+                        # Symlink to a directory. Not walked, same as os.walk.
+                        self.skipped_paths.add(path)
+
+    def isCovered(self, path):
+        """Return True if the walk has visited the directory of @path."""
+        if path.startswith("/") or path.startswith("../") or path == "..":
+            return False
+        if path in self.skipped_paths:
+            return False
+        return self.isDirectoryCovered(path.rpartition("/")[0])
+
+    def isDirectoryCovered(self, directory):
+        """@directory is a normalized relative path, "" for the root."""
+        output = self.covered_directories.get(directory)
+        if output is None:
+            if directory in self.skipped_paths:
+                output = False
+            elif directory in self.top_directories:
+                output = True
+            elif directory == "":
+                output = "." in self.top_directories
+            else:
+                output = self.isDirectoryCovered(directory.rpartition("/")[0])
+            self.covered_directories[directory] = output
+        return output
+
+    def isFile(self, path):
+        if self.files is None:
+            self.build()
+        if path in self.files:
+            self.stats['lookups'] += 1
+            return True
+        path = common.normalizePath(path)
+        if path in self.files:
+            self.stats['lookups'] += 1
+            return True
+        if self.isCovered(path):
+            self.stats['lookups'] += 1
+            return False
+        self.stats['fallbacks'] += 1
+        return os.path.isfile(path)
+
+    def existingExtensions(self, stem, extensions):
+        """
+        Return the extensions among @extensions (in same order) for which the
+        file `@stem + extension` exists.
+        """
+        if self.files is None:
+            self.build()
+        stem = common.normalizePath(stem)
+        if not self.isCovered(stem):
+            return [x for x in extensions if self.isFile(stem + x)]
+        # All the candidates are in the same covered directory, so only the
+        # skipped files need a fallback.
+        self.stats['lookups'] += len(extensions)
+        return [x for x in extensions if stem + x in self.files or (
+            stem + x in self.skipped_paths and self.isFile(stem + x))]
+
+    def getSummary(self):
+        stats = self.stats
+        if self.files is None:
+            return "FileIndex: not used"
+        return ("FileIndex: %d files indexed by scanning %d directories; "
+                "%d stat syscalls saved, %d fallbacks to os.path.isfile") % (
+                    len(self.files), stats['directories_scanned'],
+                    stats['lookups'], stats['fallbacks'])
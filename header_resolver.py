@@ -0,0 +1,185 @@
+#! /usr/bin/env python3
+
+"""
+Header Resolver
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+# pylint: disable=too-many-instance-attributes,too-many-return-statements
+
+import os
+
+from . import common
+from . import utils
+from .targets import TargetType
+
+_MISSING = object()
+_RELATIVE = object()  # Marker of the headers needing the including directory.
+
+
+def rstripSlashFromKeys(d):
+    return dict((k.rstrip("/"), v) for k, v in d.items())
+
+
+def joinPath(directory, header):
+    """
+    Path of @header relative to @directory, normalized. Both the arguments
+    are relative paths.
+    """
+    if directory == ".":
+        path = header
+    else:
+        path = directory + "/" + header
+    path = common.normalizePath(path)
+    assert not path.startswith("../"), path
+    return path
+
+
+class HeaderResolver:
+    """
+    Identify the target corresponding to a header included in a C++ source
+    file.
+    Resolution of a header depends on the directory of the including file
+    only when the header is not found as it is, i.e. it might be a relative
+    include. Hence the results are memoized on the header alone when the
+    directory is not consulted and on (directory, header) otherwise.
+    HEADER_PREFIXES_MAP is compiled into a utils.PathTrie and INCLUDE_PATHS
+    into a list of normalized directories, once.
+    """
+    def __init__(self, system_includes, header_prefixes_map,
+                 manual_header_interpreter, configs, file_index,
+                 header_found_func=None):
+        self.system_includes = set(system_includes)
+        self.header_prefixes_trie = utils.PathTrie(
+            rstripSlashFromKeys(header_prefixes_map).items())
+        self.manual_header_interpreter = manual_header_interpreter
+        self.configs = configs
+        self.file_index = file_index
+        # Called with the path of each in-repo header resolved (See
+        # SourceDepsParser.prefetchHeader).
+        self.header_found_func = header_found_func
+        # Lookup plan for the headers not found as it is.
+        self.include_paths = [os.path.relpath(x) for x in configs.INCLUDE_PATHS]
+        # header -> target, for the results not depending on the directory.
+        # _RELATIVE for the rest.
+        self.header_cache = {}
+        # (directory, header) -> target, for the rest.
+        self.relative_header_cache = {}
+        # header -> target, resolution of _RELATIVE headers not found in the
+        # directory of the including file.
+        self.include_paths_cache = {}
+
+    def resolve(self, header, source_file):
+        """
+        Return the target (dict having name, type..) corresponding to
+        @header included in @source_file. None if the @header should be
+        ignored (eg: std headers).
+        """
+        output = self.header_cache.get(header, _MISSING)
+        if output is _MISSING:
+            if self.isRelativeInclude(header):
+                output = _RELATIVE
+            else:
+                output = self.resolveUncached(header, source_file)
+            self.header_cache[header] = output
+        if output is not _RELATIVE:
+            return output
+        directory = os.path.dirname(source_file) or "."
+        key = (directory, header)
+        output = self.relative_header_cache.get(key, _MISSING)
+        if output is _MISSING:
+            output = self.resolveRelative(header, directory, source_file)
+            self.relative_header_cache[key] = output
+        return output
+
+    def resolveRelative(self, header, directory, source_file):
+        """
+        Resolve @header, which is not found as it is, for an including file
+        in @directory. The @directory is looked into first, then the rest of
+        the resolution doesn't depend on @directory, hence memoized on the
+        @header alone.
+        """
+        path = joinPath(directory, header)
+        if path != header and self.file_index.isFile(path):
+            return self.cppHeaderTarget(path)
+        output = self.include_paths_cache.get(header, _MISSING)
+        if output is _MISSING:
+            output = self.resolveUncached(header, source_file)
+            self.include_paths_cache[header] = output
+        return output
+
+    def isRelativeInclude(self, header):
+        """
+        True if the resolution of @header need to look into the directory of
+        the including file.
+        """
+        return (header not in self.system_includes
+                and not header.endswith(self.configs.GRPC_HEADER_EXTENSION)
+                and common.hasExtensions(header,
+                                         self.configs.CPP_HEADER_EXTENSIONS)
+                and not self.file_index.isFile(header)
+                and not self.isProtoHeader(header))
+
+    def isProtoHeader(self, header):
+        configs = self.configs
+        if header.endswith(configs.PROTO_HEADER_EXTENSION):
+            return self.file_index.isFile(self.protoHeaderToProto(header))
+        return False
+
+    def protoHeaderToProto(self, header):
+        configs = self.configs
+        return common.trimExtension(header, configs.PROTO_HEADER_EXTENSION) + \
+            configs.PROTO_EXTENSION
+
+    def findHeader(self, header):
+        """
+        Return the path of @header, looking into the INCLUDE_PATHS if not
+        found as it is. None if not found.
+        """
+        if self.file_index.isFile(header):
+            return header
+        for include_path in self.include_paths:
+            path = joinPath(include_path, header)
+            if self.file_index.isFile(path):
+                return path
+        return None
+
+    def cppHeaderTarget(self, path):
+        if self.header_found_func is not None:
+            self.header_found_func(path)
+        return dict(
+            type=TargetType.CPP_SOURCE,
+            name=common.trimExtensions(path, self.configs.CPP_HEADER_EXTENSIONS))
+
+    def resolveUncached(self, header, source_file):
+        if header in self.system_includes:
+            return None
+        configs = self.configs
+        if header.endswith(configs.GRPC_HEADER_EXTENSION):
+            target = common.trimExtension(header, configs.GRPC_HEADER_EXTENSION)
+            common.assertFileExists(target + configs.PROTO_EXTENSION, configs,
+                                    file_index=self.file_index)
+            return dict(
+                type=TargetType.GRPC_LIBRARY,
+                name=target + ".grpc",
+                deps=[target + configs.PROTO_EXTENSION])
+        if self.isProtoHeader(header):
+            return dict(
+                type=TargetType.PROTO_LIBRARY,
+                name=self.protoHeaderToProto(header))
+        if common.hasExtensions(header, configs.CPP_HEADER_EXTENSIONS):
+            path = self.findHeader(header)
+            if path is not None:
+                return self.cppHeaderTarget(path)
+        thirdp_target = self.header_prefixes_trie.longestPrefixValue(header)
+        if thirdp_target is not None:
+            return dict(
+                type=TargetType.CPP_SOURCE,
+                name=thirdp_target)
+        if header in configs.IGNORED_HEADERS:
+            return None
+        obj = self.manual_header_interpreter(header)
+        if obj is not None:
+            return obj
+        raise Exception(
+            "Unrecognized Header '%s' in file '%s'" % (header, source_file))
@@ -0,0 +1,127 @@
+#! /usr/bin/env python3
+
+"""
+Scanner of the includes (C++) and imports (proto) of a source file. The file
+is memory-mapped and matched by a single bytes regex, so it's neither read
+in full nor decoded.
+
+Scan modes:
+- "full" : The whole file is scanned.
+- "preamble" : Only the preamble of the file is scanned, i.e. the leading
+  part made of blank lines, comments and preprocessor directives (C++) or
+  `syntax`/`package`/`import`/`option` statements (proto). Scan time is
+  bounded by the size of preamble, but the includes placed after the code
+  (eg: an `-inl.hpp` included at the end of a header) are missed.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import mmap
+import os
+import re
+
+FULL_SCAN = "full"
+PREAMBLE_SCAN = "preamble"
+SCAN_MODES = (FULL_SCAN, PREAMBLE_SCAN)
+
+# Group 1: <...> include, Group 2: "..." include.
+CPP_INCLUDE_REGEX = re.compile(
+    rb'^[ ]*#[ ]*include[ ]*(?:<([^>]+)>|"([^"]+)")', flags=re.MULTILINE)
+
+PROTO_IMPORT_REGEX = re.compile(rb'^[ ]*import[ ]+"([^"]+)"', flags=re.MULTILINE)
+
+CPP_PREAMBLE_REGEX = re.compile(
+    rb'(?:\s+|//[^\n]*|/\*.*?\*/|#[^\n]*(?:(?<=\\)\n[^\n]*)*)*', flags=re.DOTALL)
+
+PROTO_PREAMBLE_REGEX = re.compile(
+    rb'(?:\s+|//[^\n]*|/\*.*?\*/|(?:syntax|package|import|option)\b[^\n]*)*',
+    flags=re.DOTALL)
+
+
+def decode(value):
+    return value.decode("utf-8", errors="ignore")
+
+
+def scanBuffer(buf, regex, preamble_regex, mode):
+    """
+    Return the list of groups of each match of @regex in @buf (bytes like
+    object). If @mode is PREAMBLE_SCAN, only the part of @buf matched by
+    @preamble_regex (from the start) is scanned.
+    """
+    assert mode in SCAN_MODES, "Unknown scan mode '%s'" % mode
+    end = len(buf)
+    if mode == PREAMBLE_SCAN:
+        end = preamble_regex.match(buf).end()
+    return [match.groups() for match in regex.finditer(buf, 0, end)]
+
+
+def scanFile(file, regex, preamble_regex, mode, fingerprint_func=None):
+    """
+    Return the tuple (scanBuffer of the content of @file, fingerprint).
+    If @fingerprint_func is given, fingerprint is
+    `fingerprint_func(stat result, content)` computed on the same mapping of
+    the file (See cache.getBufferFingerprint), otherwise it's None. This way
+    the file is read only once for scanning as well as fingerprinting.
+    """
+    assert mode in SCAN_MODES, "Unknown scan mode '%s'" % mode
+    with open(file, "rb") as fd:
+        fingerprint = None
+        stat_result = os.fstat(fd.fileno())
+        if stat_result.st_size == 0:  # Empty file can't be mapped.
+            if fingerprint_func is not None:
+                fingerprint = fingerprint_func(stat_result, b"")
+            return [], fingerprint
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            output = scanBuffer(buf, regex, preamble_regex, mode)
+            if fingerprint_func is not None:
+                fingerprint = fingerprint_func(stat_result, buf)
+            return output, fingerprint
+
+
+def toCppIncludes(groups_list):
+    """Return (angle bracket includes, quoted includes) of the matches."""
+    angle, quoted = [], []
+    for angle_include, quoted_include in groups_list:
+        if angle_include is not None:
+            angle.append(decode(angle_include))
+        else:
+            quoted.append(decode(quoted_include))
+    return angle, quoted
+
+
+def scanCppIncludes(file, mode=FULL_SCAN, fingerprint_func=None):
+    """
+    Return the tuple ((angle bracket includes, quoted includes), fingerprint)
+    of C++ @file. See scanFile.
+    """
+    groups_list, fingerprint = scanFile(
+        file, CPP_INCLUDE_REGEX, CPP_PREAMBLE_REGEX, mode, fingerprint_func)
+    return toCppIncludes(groups_list), fingerprint
+
+
+def scanCppBuffer(stat_result, buf, mode=FULL_SCAN, fingerprint_func=None):
+    """
+    Same as scanCppIncludes, on the already read content @buf of a file
+    having the stat @stat_result (See async_io.py).
+    """
+    fingerprint = None
+    if fingerprint_func is not None:
+        fingerprint = fingerprint_func(stat_result, buf)
+    return toCppIncludes(scanBuffer(buf, CPP_INCLUDE_REGEX, CPP_PREAMBLE_REGEX,
+                                    mode)), fingerprint
+
+
+def scanProtoImports(file, mode=FULL_SCAN, fingerprint_func=None):
+    """Return the tuple (imports, fingerprint) of proto @file."""
+    groups_list, fingerprint = scanFile(
+        file, PROTO_IMPORT_REGEX, PROTO_PREAMBLE_REGEX, mode, fingerprint_func)
+    return [decode(groups[0]) for groups in groups_list], fingerprint
+
+
+def scanProtoBuffer(stat_result, buf, mode=FULL_SCAN, fingerprint_func=None):
+    """Same as scanProtoImports, on the already read content @buf."""
+    fingerprint = None
+    if fingerprint_func is not None:
+        fingerprint = fingerprint_func(stat_result, buf)
+    return [decode(groups[0]) for groups in scanBuffer(
+        buf, PROTO_IMPORT_REGEX, PROTO_PREAMBLE_REGEX, mode)], fingerprint
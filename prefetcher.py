@@ -0,0 +1,171 @@
+#! /usr/bin/env python3
+
+"""
+Read-ahead of the headers discovered while resolving the includes: an
+in-repo header is going to be scanned soon (when its target is built), so
+it's queued as soon as it's resolved and a background thread reads it ahead,
+overlapping the I/O with the scanning of the other files.
+Modes:
+- "fadvise" : `os.posix_fadvise(WILLNEED)`, i.e. the kernel reads the file
+  into the page cache asynchronously. Falls back to "read" where it's not
+  available.
+- "read" : The file is read into a pool of buffers bounded in bytes (least
+  recently read evicted first) and the scanner takes its content from there.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import collections
+import os
+import threading
+from concurrent import futures
+
+FADVISE_MODE = "fadvise"
+READ_MODE = "read"
+PREFETCH_MODES = (FADVISE_MODE, READ_MODE)
+
+# Background reader threads, and files waiting for them. Beyond that, the
+# prefetch requests are dropped.
+NUM_THREADS = 4
+MAX_QUEUED = 4096
+
+
+class ReadAheadPrefetcher:
+    def __init__(self, mode, max_buffer_bytes, executor_func=None):
+        assert mode in PREFETCH_MODES, "Unknown prefetch mode '%s'" % mode
+        if mode == FADVISE_MODE and not hasattr(os, "posix_fadvise"):
+            mode = READ_MODE
+        self.mode = mode
+        self.max_buffer_bytes = max_buffer_bytes
+        self.lock = threading.Lock()
+        # Returns the thread pool to read on (eg: ConcurrentFileIO.getExecutor,
+        # so that its bound covers these reads too). If None, one of
+        # NUM_THREADS threads is started on the first prefetch, and again
+        # after close.
+        self.executor_func = executor_func
+        self.executor = None
+        # Future of each file queued or being read. A file taken meanwhile is
+        # removed, so that the reader hands its content to the taker instead
+        # of keeping it.
+        self.loading = {}
+        # Files prefetched ("fadvise" mode), or their buffers: file ->
+        # (stat result, content) in the order of reading ("read" mode).
+        self.done = set()
+        self.buffers = collections.OrderedDict()
+        self.buffered_bytes = 0
+        # Outcome of each take: prefetched (hits), being read and waited for
+        # (waited), still queued hence cancelled (late), never queued or
+        # evicted (misses).
+        self.stats = dict(queued=0, dropped=0, evicted=0, hits=0, waited=0,
+                          late=0, misses=0)
+
+    def prefetch(self, file):
+        """Queue @file to be read ahead, unless already requested."""
+        with self.lock:
+            if file in self.loading or file in self.done or \
+                    file in self.buffers:
+                return
+            if len(self.loading) >= MAX_QUEUED:
+                self.stats['dropped'] += 1
+                return
+            # The reader takes the lock before looking up `loading`, i.e.
+            # after the future is recorded.
+            self.loading[file] = self.getExecutor().submit(self.load, file)
+            self.stats['queued'] += 1
+
+    def getExecutor(self):
+        if self.executor is None:
+            if self.executor_func is not None:
+                self.executor = self.executor_func()
+            else:
+                self.executor = futures.ThreadPoolExecutor(
+                    NUM_THREADS, thread_name_prefix="depg-prefetch")
+        return self.executor
+
+    def load(self, file):
+        """
+        Read ahead @file. Return the value for a taker waiting for it: (stat
+        result, content) in "read" mode, None otherwise or on error.
+        """
+        try:
+            with open(file, "rb") as fd:
+                if self.mode == FADVISE_MODE:
+                    os.posix_fadvise(fd.fileno(), 0, 0,
+                                     os.POSIX_FADV_WILLNEED)
+                    value = None
+                else:
+                    value = (os.fstat(fd.fileno()), fd.read())
+        except OSError:
+            value = False  # The scan reports it.
+        with self.lock:
+            if self.loading.pop(file, None) is None:
+                # Taken while being read.
+                return value if value is not False else None
+            if value is False:
+                return None
+            if value is None:
+                self.done.add(file)
+                return None
+            self.buffers[file] = value
+            self.buffered_bytes += len(value[1])
+            while self.buffered_bytes > self.max_buffer_bytes:
+                _, (_, content) = self.buffers.popitem(last=False)
+                self.buffered_bytes -= len(content)
+                self.stats['evicted'] += 1
+        return None
+
+    def take(self, file):
+        """
+        Called when @file is about to be scanned. Return its (stat result,
+        content) if prefetched in "read" mode, None otherwise. A file being
+        read is waited for, a queued one is cancelled (the scanner reads it).
+        """
+        with self.lock:
+            if file in self.buffers:
+                self.stats['hits'] += 1
+                value = self.buffers.pop(file)
+                self.buffered_bytes -= len(value[1])
+                return value
+            if file in self.done:
+                self.stats['hits'] += 1
+                self.done.discard(file)
+                return None
+            future = self.loading.pop(file, None)
+            if future is None:
+                self.stats['misses'] += 1
+                return None
+            if future.cancel():
+                self.stats['late'] += 1
+                return None
+            self.stats['waited'] += 1
+        return future.result()
+
+    def getHitRate(self):
+        """Fraction of the scans served by the prefetcher."""
+        stats = self.stats
+        total = stats['hits'] + stats['waited'] + stats['late'] + \
+            stats['misses']
+        return (stats['hits'] + stats['waited']) / total if total > 0 else 0.0
+
+    def getSummary(self):
+        stats = self.stats
+        return ("Prefetch (%s): %d queued, %d dropped, %d evicted; scans: %d "
+                "hits, %d waited, %d late, %d misses, hit rate %.1f%%" % (
+                    self.mode, stats['queued'], stats['dropped'],
+                    stats['evicted'], stats['hits'], stats['waited'],
+                    stats['late'], stats['misses'], 100 * self.getHitRate()))
+
+    def close(self):
+        """
+        Stop the reads, and the threads unless `executor_func` provides them.
+        The queued files are dropped.
+        """
+        if self.executor is None:
+            return
+        with self.lock:
+            for future in self.loading.values():
+                future.cancel()
+            self.loading.clear()
+        if self.executor_func is None:
+            self.executor.shutdown()
+        self.executor = None
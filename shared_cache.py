@@ -0,0 +1,264 @@
+#! /usr/bin/env python3
+
+"""
+Content-addressed cache of the scan results (raw includes/imports), shareable
+across checkouts and machines. Entries are keyed by the checksum of the file
+content (not its path), hence a renamed, copied or freshly checked out file
+still hits.
+Layout: `<location>/<namespace>/<xx>.json`, where namespace identifies the
+scanner (See target_graph_builder.getSharedCacheNamespace) and the shard
+`xx` is the first two hex digits of the checksum. A shard is a json map from
+`<kind>:<checksum>` to the scan result.
+The location is either a directory (eg: populated by one CI job and mounted
+read-only in the others) or the URL of an HTTP server exposing the same
+layout with GET, and PUT for merging new entries into a shard (See serve).
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import argparse
+import http.server
+import json
+import os
+import re
+import urllib.error
+import urllib.request
+from concurrent import futures
+
+from . import common
+
+NUM_SHARD_DIGITS = 2
+HTTP_TIMEOUT = 10  # Seconds.
+# Shards fetched concurrently by fetchShards.
+FETCH_THREADS = 16
+
+_SHARD_PATH_REGEX = re.compile(r'^/([0-9a-f]+)/([0-9a-f]{%d})\.json$' %
+                               NUM_SHARD_DIGITS)
+
+
+class DirectoryShardStore:
+    """Shards stored as files in @directory."""
+    def __init__(self, directory):
+        self.directory = directory
+
+    def getShardFile(self, namespace, shard):
+        return os.path.join(self.directory, namespace, shard + ".json")
+
+    def readShard(self, namespace, shard):
+        file = self.getShardFile(namespace, shard)
+        try:
+            with open(file, encoding="utf-8") as fd:
+                return json.loads(fd.read())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def mergeShard(self, namespace, shard, entries):
+        """
+        Add @entries to the shard. Concurrent writers are serialized by a lock
+        and readers always see a complete shard.
+        """
+        file = self.getShardFile(namespace, shard)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        with common.fileLock(file + ".lock"):
+            content = self.readShard(namespace, shard)
+            content.update(entries)
+            common.writeFileAtomic(file, json.dumps(content, sort_keys=True))
+
+
+class HttpShardStore:
+    """Shards served by an HTTP server at @url (See serve)."""
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def getShardUrl(self, namespace, shard):
+        return "%s/%s/%s.json" % (self.url, namespace, shard)
+
+    def readShard(self, namespace, shard):
+        try:
+            with urllib.request.urlopen(self.getShardUrl(namespace, shard),
+                                        timeout=HTTP_TIMEOUT) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return {}
+            raise
+
+    def mergeShard(self, namespace, shard, entries):
+        request = urllib.request.Request(
+            self.getShardUrl(namespace, shard), method="PUT",
+            data=json.dumps(entries).encode("utf-8"),
+            headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT):
+            pass
+
+
+def openShardStore(location):
+    if location.startswith("http://") or location.startswith("https://"):
+        return HttpShardStore(location)
+    return DirectoryShardStore(location)
+
+
+class SharedScanCache:
+    """
+    Content-addressed scan results stored in the shard store of @location
+    under @namespace. A shard is fetched on the first lookup into it. New
+    entries are buffered and published by flush, unless @read_only.
+    The shared cache is an optimization only: if the store is unreachable,
+    lookups miss and publishing is skipped.
+    """
+    def __init__(self, location, namespace, read_only=False):
+        self.store = openShardStore(location)
+        self.namespace = namespace
+        self.read_only = read_only
+        self.shards = {}
+        # shard -> {key: value}, not published yet.
+        self.pending = {}
+        self.stats = dict(hits=0, misses=0, published=0, errors=0)
+
+    @staticmethod
+    def getKey(kind, checksum):
+        return kind + ":" + checksum
+
+    def readShard(self, shard):
+        """Return the content of @shard, None if the store failed."""
+        try:
+            return self.store.readShard(self.namespace, shard)
+        except (OSError, ValueError):
+            return None
+
+    def addShard(self, shard, content):
+        if content is None:
+            self.stats['errors'] += 1
+            content = {}
+        self.shards[shard] = content
+        return content
+
+    def getShard(self, checksum):
+        shard = checksum[:NUM_SHARD_DIGITS]
+        content = self.shards.get(shard)
+        if content is None:
+            content = self.addShard(shard, self.readShard(shard))
+        return content
+
+    def fetchShards(self, checksums):
+        """
+        Fetch concurrently the shards of @checksums not fetched yet, so that
+        the lookups of a batch of files don't wait for one shard at a time.
+        """
+        shards = sorted(set(x[:NUM_SHARD_DIGITS] for x in checksums) -
+                        set(self.shards))
+        if len(shards) == 0:
+            return
+        with futures.ThreadPoolExecutor(min(FETCH_THREADS, len(shards))) as pool:
+            for shard, content in zip(shards, pool.map(self.readShard, shards)):
+                self.addShard(shard, content)
+
+    def get(self, kind, checksum):
+        """
+        Return the scan result of kind @kind (eg: "cpp") of the content having
+        @checksum, None if absent.
+        """
+        value = self.getShard(checksum).get(self.getKey(kind, checksum))
+        self.stats['misses' if value is None else 'hits'] += 1
+        return value
+
+    def put(self, kind, checksum, value):
+        if self.read_only:
+            return
+        key = self.getKey(kind, checksum)
+        shard = checksum[:NUM_SHARD_DIGITS]
+        if self.shards.get(shard, {}).get(key) == value:
+            return
+        self.pending.setdefault(shard, {})[key] = value
+
+    def flush(self):
+        """Publish the new entries to the store."""
+        pending, self.pending = self.pending, {}
+        for shard, entries in sorted(pending.items()):
+            try:
+                self.store.mergeShard(self.namespace, shard, entries)
+            except OSError:
+                self.stats['errors'] += 1
+                continue
+            self.stats['published'] += len(entries)
+            if shard in self.shards:
+                self.shards[shard].update(entries)
+
+    def getSummary(self):
+        stats = self.stats
+        return ("SharedScanCache: %d hits, %d misses, %d entries published, "
+                "%d errors") % (stats['hits'], stats['misses'],
+                                stats['published'], stats['errors'])
+
+
+def makeRequestHandler(directory):
+    store = DirectoryShardStore(directory)
+
+    class ShardRequestHandler(http.server.BaseHTTPRequestHandler):
+        def parseShardPath(self):
+            match = _SHARD_PATH_REGEX.match(self.path)
+            if match is None:
+                self.send_error(404)
+                return None
+            return match.groups()
+
+        def sendJson(self, content):
+            body = json.dumps(content).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            shard_path = self.parseShardPath()
+            if shard_path is None:
+                return
+            if not os.path.isfile(store.getShardFile(*shard_path)):
+                self.send_error(404)
+                return
+            self.sendJson(store.readShard(*shard_path))
+
+        def do_PUT(self):
+            shard_path = self.parseShardPath()
+            if shard_path is None:
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                entries = json.loads(self.rfile.read(length))
+                assert isinstance(entries, dict)
+            except (ValueError, AssertionError):
+                self.send_error(400)
+                return
+            store.mergeShard(*shard_path, entries)
+            self.sendJson({})
+
+        def log_message(self, *args):  # pylint: disable=arguments-differ
+            pass
+
+    return ShardRequestHandler
+
+
+def serve(directory, port, host="127.0.0.1"):
+    """
+    Serve the shared cache stored in @directory over HTTP. A stand-in for a
+    real artifact server, for sharing the cache among local workers.
+    """
+    server = http.server.ThreadingHTTPServer((host, port),
+                                             makeRequestHandler(directory))
+    print("Serving the shared scan cache in %s at http://%s:%d" % (
+        directory, host, server.server_address[1]))
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False)
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+    serve(args.directory, args.port, args.host)
+
+
+if __name__ == "__main__":
+    main()
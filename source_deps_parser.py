@@ -11,32 +11,105 @@ Source Deps Parser
 
 import re
 import os
+import functools
+import itertools
+import multiprocessing
+import threading
+from concurrent import futures
 
+from . import async_io
+from . import cache
 from . import common
+from . import include_scanner
 from .targets import TargetType
-
-def rstripSlashFromKeys(d):
-    return dict((k.rstrip("/"), v) for k, v in d.items())
-
-def cppHeaderRegexList():
-    re1 = re.compile("^[ ]*#[ ]*include[ ]*<([^>]+)>", flags=re.MULTILINE)
-    re2 = re.compile("^[ ]*#[ ]*include[ ]*\"([^\"]+)\"", flags=re.MULTILINE)
-    return (re1, re2)
-
-def protoImportRegex():
-    regex = re.compile("^[ ]*import[ ]+\"([^\"]+)\"", flags=re.MULTILINE)
-    return regex
+from .file_index import FileIndex
+from .header_resolver import HeaderResolver
 
 def thriftIncludeRegex():
     regex = re.compile("^[ ]*include[ ]+\"([^\"]+)\"", flags=re.MULTILINE)
     return regex
 
-def getCppHeader(file, header_regex_list):
-    content = common.readFile(file)
-    return tuple(list(regex.findall(content)) for regex in header_regex_list)
+def getFingerprintFunc(fingerprint_policy):
+    """
+    @fingerprint_policy is the name of cache.FingerprintPolicy, or None if the
+    fingerprint is not needed.
+    """
+    if fingerprint_policy is None:
+        return None
+    return functools.partial(cache.getBufferFingerprint, fingerprint_policy)
 
-def getProtoImports(file, regex):
-    return list(regex.findall(common.readFile(file)))
+def getCppHeader(file, scan_mode, fingerprint_policy):
+    return include_scanner.scanCppIncludes(
+        file, scan_mode, getFingerprintFunc(fingerprint_policy))
+
+def scanCppIncludes(file, scan_mode, fingerprint_policy):
+    """
+    Return the tuple (raw includes, fingerprint) of C++ @file. The file is
+    read once for both. Module level function so that it can be executed in
+    the worker processes of SourceDepsParser.scanMany.
+    """
+    headers_bkt, fingerprint = getCppHeader(file, scan_mode, fingerprint_policy)
+    return headers_bkt[0] + headers_bkt[1], fingerprint
+
+def storeScanResult(cache_store, file, value, fingerprint):
+    if isinstance(cache_store, cache.InMemoryFileValueCache):
+        cache_store.setEntry(file, value, fingerprint)
+    else:
+        cache_store[file] = value
+
+def getScanWorkers(configs):
+    workers = configs.get("SCAN_WORKERS")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, workers)
+
+def getProtoImports(file, scan_mode, fingerprint_policy):
+    return include_scanner.scanProtoImports(
+        file, scan_mode, getFingerprintFunc(fingerprint_policy))
+
+def getProcessContext():
+    """
+    Start method of the scan worker processes. Forking while other threads run
+    (eg: the prefetcher or the shared cache reads) may leave the children with
+    a lock held by a thread which doesn't exist there, hence the workers are
+    started by a fork server then. Otherwise, the default one: the fork start
+    method launches all the workers on the first submit, before any other
+    thread is started.
+    """
+    context = multiprocessing.get_context()
+    if context.get_start_method() == "fork" and threading.active_count() > 1:
+        return multiprocessing.get_context("forkserver")
+    return context
+
+
+def readAndFingerprint(files, fingerprint_policy):
+    """
+    Return the list of the tuples (fingerprint, content) of @files, both from
+    one read, None for a file which doesn't exist. Run on the I/O threads of
+    SourceDepsParser.scanWithSharedCache (hashlib releases the GIL), a chunk
+    of files per call so that the overhead per task is amortized.
+    """
+    output = []
+    for file in files:
+        value = async_io.readFile(file)
+        if value is not None:
+            stat_result, content = value
+            value = (cache.getBufferFingerprint(fingerprint_policy, stat_result,
+                                                content), content)
+        output.append(value)
+    return output
+
+def scanContent(kind, scan_mode, content):
+    """
+    Return the raw includes (@kind "cpp") or imports ("proto") of the already
+    read @content. Module level function, so that it can be executed in the
+    worker processes.
+    """
+    if kind == "cpp":
+        headers_bkt, _ = include_scanner.scanCppBuffer(None, content, scan_mode)
+        return headers_bkt[0] + headers_bkt[1]
+    imports, _ = include_scanner.scanProtoBuffer(None, content, scan_mode)
+    return imports
 
 def getThriftIncludes(file, regex):
     return list(regex.findall(common.readFile(file)))
@@ -50,29 +123,365 @@ def withCache(cache_store_func):
     return common.withSerializableCacheOnArg0(cache_store_func,
                                               deserializer=DeserializeTargets)
 
+# Threads reading the files in this process (eg: for the shared cache
+# lookups), unless a `file_io` bounds them. Files per batch of these lookups.
+IO_THREADS = 16
+SHARED_SCAN_BATCH_SIZE = 1024
+READ_CHUNK_SIZE = 16
+
 class SourceDepsParser:
     def __init__(self, system_includes, header_prefixes_map,
                  manual_header_interpreter, source_file_to_deps_cache,
-                 configs):
-        self.system_includes = set(system_includes)
-        self.header_prefixes_map = rstripSlashFromKeys(header_prefixes_map)
-        self.cpp_header_regex_list = cppHeaderRegexList()
-        self.manual_header_interpreter = manual_header_interpreter
-        self.header_to_target_cache = {}
+                 configs, source_file_to_includes_cache=None,
+                 file_index=None, shared_cache=None, checkpoint_func=None,
+                 file_io=None, prefetcher=None):
+        self.scan_mode = configs.INCLUDE_SCAN_MODE
         self.thrift_parser_regex = thriftIncludeRegex()
-        self.proto_parser_regex = protoImportRegex()
+        # Resolved deps of a source file. These depend on the configs used for
+        # resolving the headers, (eg: HEADER_PREFIXES_MAP, INCLUDE_PATHS).
         self.source_file_to_deps_cache = source_file_to_deps_cache
+        # Raw includes/imports of a source file. These depend only on the
+        # content of the file, hence survive the config changes. Without a
+        # persistent cache, the includes are memoized for the current run only,
+        # so that the results of scanMany can be consumed by the later lookups.
+        if source_file_to_includes_cache is None:
+            source_file_to_includes_cache = {}
+        self.source_file_to_includes_cache = source_file_to_includes_cache
+        # Fingerprints are computed while scanning only if they are going to
+        # be stored.
+        self.fingerprint_policy = None
+        if isinstance(source_file_to_includes_cache,
+                      cache.InMemoryFileValueCache):
+            self.fingerprint_policy = \
+                source_file_to_includes_cache.fingerprint_policy.name
+        # Content-addressed scan results shared across checkouts (See
+        # shared_cache.py). Consulted on the includes cache misses, it needs
+        # the content checksums, hence a persistent includes cache.
+        assert shared_cache is None or self.fingerprint_policy is not None, \
+            "Shared scan cache requires a persistent includes cache."
+        self.shared_cache = shared_cache
+        # Called after every file scanned, so that a long scan can store the
+        # cache periodically (See TargetGraphBuilder.checkpointCache).
+        self.checkpoint_func = checkpoint_func
+        # If given (a ConcurrentFileIO), the files to be scanned are read
+        # through it concurrently, and scanned in this process.
+        self.file_io = file_io
+        # If given (a ReadAheadPrefetcher), the in-repo headers are read ahead
+        # as soon as they are resolved, as they are going to be scanned soon.
+        self.prefetcher = prefetcher
         self.configs = configs
+        if file_index is None:
+            # Index covering nothing, i.e. every query goes to os.path.isfile.
+            file_index = FileIndex([], set(), set())
+        self.file_index = file_index
+        self.header_resolver = HeaderResolver(
+            system_includes, header_prefixes_map, manual_header_interpreter,
+            configs, file_index,
+            self.prefetchHeader if prefetcher is not None else None)
+        self.scan_workers = getScanWorkers(configs)
+        self.scan_pool = None
+        self.io_pool = None
+        # Files scanned (i.e. not found in the caches) and their bytes. The
+        # bytes are known only with a persistent includes cache.
+        self.scan_stats = dict(files=0, bytes=0)
+
+    def cppSourceToIncludes(self, source_file):
+        return self.scanMany([source_file])[source_file]
+
+    def scanMany(self, source_files):
+        """
+        Bulk version of cppSourceToIncludes. Return a map from each of
+        @source_files to its raw includes. The files missing in the includes
+        cache are scanned by a pool of `configs.SCAN_WORKERS` processes and the
+        results are merged into the includes cache.
+        The pool is used only if there are at least `configs.SCAN_POOL_MIN_FILES`
+        files to be scanned, otherwise the files are scanned in this process.
+        With a `file_io`, the files are read through it instead (See
+        scanWithFileIO). With a shared cache, the files are looked up there
+        before being scanned (See scanWithSharedCache).
+        """
+        output, missing = self.lookUpMany(source_files)
+        if len(missing) == 0:
+            return output
+        prefetched = {}
+        if self.prefetcher is not None:
+            prefetched = self.takePrefetched(missing)
+            missing = [x for x in missing if x not in prefetched]
+        if self.shared_cache is not None:
+            results = self.scanWithSharedCache("cpp", missing, prefetched,
+                                               output)
+        else:
+            results = zip(missing, self.scanFiles(missing))
+            if len(prefetched) > 0:
+                results = itertools.chain(
+                    zip(prefetched, self.scanBuffers(prefetched)), results)
+        self.storeResults("cpp", results, output)
+        return output
+
+    def scanManyProtos(self, source_files):
+        """
+        Bulk version of protoSourceToImports. Return a map from each of
+        @source_files to its raw imports. The files missing in the includes
+        cache are read concurrently with a `file_io` (See scanWithFileIO) or
+        a shared cache (See scanWithSharedCache), otherwise one at a time.
+        """
+        output, missing = self.lookUpMany(source_files)
+        if len(missing) == 0:
+            return output
+        if self.shared_cache is not None:
+            results = self.scanWithSharedCache("proto", missing, {}, output)
+        elif self.file_io is not None:
+            results = zip(missing, self.scanWithFileIO("proto", missing))
+        else:
+            results = ((x, getProtoImports(x, self.scan_mode,
+                                           self.fingerprint_policy))
+                       for x in missing)
+        self.storeResults("proto", results, output)
+        return output
+
+    def lookUpMany(self, source_files):
+        """
+        Return the map from each of @source_files to its scan result in the
+        includes cache (None if missing), and the list of the missing ones.
+        """
+        includes_cache = self.source_file_to_includes_cache
+        output = {}
+        missing = []
+        for file in source_files:
+            if file in output:
+                continue
+            value = includes_cache.get(file)
+            if value is None:
+                missing.append(file)
+            output[file] = value
+        return output, missing
+
+    def storeResults(self, kind, results, output):
+        """
+        Store each (file, (scan result, fingerprint)) of @results of kind
+        @kind in the caches and @output.
+        """
+        includes_cache = self.source_file_to_includes_cache
+        for file, (value, fingerprint) in results:
+            storeScanResult(includes_cache, file, value, fingerprint)
+            if self.shared_cache is not None:
+                self.shared_cache.put(kind, fingerprint['checksum'], value)
+            output[file] = value
+            self.recordScan(fingerprint)
+            if self.checkpoint_func is not None:
+                self.checkpoint_func()
+
+    def scanFiles(self, files):
+        """Return the scanCppIncludes of each of @files, in order."""
+        if self.file_io is not None:
+            return self.scanWithFileIO("cpp", files)
+        if self.usesScanPool(len(files)):
+            # Largest files first, so that a big file picked at the end doesn't
+            # keep the other workers idle.
+            files.sort(key=self.getScanCost, reverse=True)
+            return self.getScanPool().map(
+                functools.partial(scanCppIncludes, scan_mode=self.scan_mode,
+                                  fingerprint_policy=self.fingerprint_policy),
+                files, chunksize=self.getChunkSize(len(files)))
+        return (scanCppIncludes(x, self.scan_mode, self.fingerprint_policy)
+                for x in files)
+
+    def usesScanPool(self, num_files):
+        return self.scan_workers > 1 and \
+            num_files >= self.configs.SCAN_POOL_MIN_FILES
+
+    def getChunkSize(self, num_files):
+        return max(1, num_files // (self.scan_workers * 4))
+
+    def prefetchHeader(self, path):
+        includes_cache = self.source_file_to_includes_cache
+        if isinstance(includes_cache, cache.InMemoryFileValueCache):
+            if includes_cache.getEntry(path) is not None:
+                return  # Likely valid, not to be scanned.
+        elif path in includes_cache:
+            return
+        self.prefetcher.prefetch(path)
+
+    def takePrefetched(self, files):
+        """
+        Return the map from each of @files read ahead by the prefetcher to
+        its (stat result, content).
+        """
+        output = {}
+        for file in files:
+            value = self.prefetcher.take(file)
+            if value is not None:
+                output[file] = value
+        return output
+
+    def scanBuffers(self, contents):
+        """
+        Yield scanCppIncludes of each file of @contents (file -> (stat
+        result, content)), in order, from the content.
+        """
+        fingerprint_func = getFingerprintFunc(self.fingerprint_policy)
+        for stat_result, buf in contents.values():
+            headers_bkt, fingerprint = include_scanner.scanCppBuffer(
+                stat_result, buf, self.scan_mode, fingerprint_func)
+            yield headers_bkt[0] + headers_bkt[1], fingerprint
+
+    def scanWithFileIO(self, kind, files):
+        """
+        Yield scanCppIncludes (@kind "cpp") or getProtoImports ("proto") of
+        each of @files, in order. The files are read concurrently by
+        `file_io`, in batches bounding the contents held in memory, and the
+        buffers are scanned in this process.
+        """
+        fingerprint_func = getFingerprintFunc(self.fingerprint_policy)
+        batch_size = self.file_io.max_in_flight * 16
+        for start in range(0, len(files), batch_size):
+            batch = files[start:start + batch_size]
+            contents = self.file_io.readMany(batch)
+            for file in batch:
+                if contents[file] is None:
+                    # Missing file, raises the same error as the other paths.
+                    file_scan_func = scanCppIncludes if kind == "cpp" else \
+                        getProtoImports
+                    yield file_scan_func(file, self.scan_mode,
+                                         self.fingerprint_policy)
+                elif kind == "cpp":
+                    yield from self.scanBuffers({file: contents[file]})
+                else:
+                    yield include_scanner.scanProtoBuffer(
+                        *contents[file], self.scan_mode, fingerprint_func)
+
+    def recordScan(self, fingerprint):
+        self.scan_stats['files'] += 1
+        if fingerprint is not None:
+            self.scan_stats['bytes'] += fingerprint['size']
+
+    def scanWithSharedCache(self, kind, files, contents, output):
+        """
+        Look up the scan results of kind @kind (eg: "cpp") of @files, and of
+        the already read @contents (file -> (stat result, content)), in the
+        shared cache. The found ones are stored in the includes cache and
+        @output. Yield (file, (scan result, fingerprint)) for each of the
+        others, scanned.
+        Per batch, the files are read and fingerprinted on the I/O threads,
+        the shards of their checksums are fetched concurrently, and the
+        misses are scanned from the contents read (on the scan pool, if
+        worth it), so that each file is read once.
+        """
+        includes_cache = self.source_file_to_includes_cache
+        read_func = functools.partial(
+            readAndFingerprint, fingerprint_policy=self.fingerprint_policy)
+        files = list(contents) + files
+        for start in range(0, len(files), SHARED_SCAN_BATCH_SIZE):
+            batch = files[start:start + SHARED_SCAN_BATCH_SIZE]
+            to_read = [x for x in batch if x not in contents]
+            chunks = [to_read[i:i + READ_CHUNK_SIZE]
+                      for i in range(0, len(to_read), READ_CHUNK_SIZE)]
+            values = dict(zip(to_read, itertools.chain.from_iterable(
+                self.getIOExecutor().map(read_func, chunks))))
+            for file in batch:
+                if file in contents:
+                    stat_result, content = contents.pop(file)
+                    values[file] = (cache.getBufferFingerprint(
+                        self.fingerprint_policy, stat_result, content), content)
+            self.shared_cache.fetchShards(
+                x[0]['checksum'] for x in values.values() if x is not None)
+            misses = []
+            for file in batch:
+                if values[file] is None:
+                    misses.append(file)  # Scanning reports it.
+                    continue
+                fingerprint = values[file][0]
+                value = self.shared_cache.get(kind, fingerprint['checksum'])
+                if value is None:
+                    misses.append(file)
+                else:
+                    storeScanResult(includes_cache, file, value, fingerprint)
+                    output[file] = value
+            buffers = [values[x][1] for x in misses if values[x] is not None]
+            scan_func = functools.partial(scanContent, kind, self.scan_mode)
+            if self.usesScanPool(len(buffers)):
+                results = self.getScanPool().map(
+                    scan_func, buffers,
+                    chunksize=self.getChunkSize(len(buffers)))
+            else:
+                results = map(scan_func, buffers)
+            results = iter(results)
+            for file in misses:
+                if values[file] is None:
+                    # Raises the same error as the other paths.
+                    file_scan_func = scanCppIncludes if kind == "cpp" else \
+                        getProtoImports
+                    yield file, file_scan_func(file, self.scan_mode,
+                                               self.fingerprint_policy)
+                    continue
+                fingerprint = values.pop(file)[0]
+                yield file, (next(results), fingerprint)
+
+    def getIOExecutor(self):
+        """
+        Thread pool for the file reads done in this process. With a
+        `file_io`, it's its pool, so that IO_MAX_IN_FLIGHT bounds them too.
+        """
+        if self.file_io is not None:
+            return self.file_io.getExecutor()
+        if self.io_pool is None:
+            self.io_pool = futures.ThreadPoolExecutor(
+                IO_THREADS, thread_name_prefix="depg-read")
+        return self.io_pool
+
+    def getScanCost(self, file):
+        """
+        Estimated cost of scanning @file. It's the file size recorded in the
+        includes cache when @file was scanned last time, otherwise the current
+        file size.
+        """
+        includes_cache = self.source_file_to_includes_cache
+        cost = None
+        if isinstance(includes_cache, cache.InMemoryFileValueCache):
+            cost = includes_cache.getRecordedSize(file)
+        if cost is None:
+            cost = os.path.getsize(file)
+        return cost
+
+    def getScanPool(self):
+        if self.scan_pool is None:
+            if self.configs.SCAN_EXECUTOR == "thread":
+                self.scan_pool = futures.ThreadPoolExecutor(self.scan_workers)
+            else:
+                assert self.configs.SCAN_EXECUTOR == "process", \
+                    "Unknown SCAN_EXECUTOR '%s'" % self.configs.SCAN_EXECUTOR
+                self.scan_pool = futures.ProcessPoolExecutor(
+                    self.scan_workers, mp_context=getProcessContext())
+        return self.scan_pool
+
+    def close(self, cancel=False):
+        """
+        Release the worker processes of scanMany, if any. If @cancel, the
+        pending scans are dropped instead of being waited for.
+        """
+        if self.scan_pool is not None:
+            self.scan_pool.shutdown(wait=not cancel, cancel_futures=cancel)
+            self.scan_pool = None
+        if self.io_pool is not None:
+            self.io_pool.shutdown(wait=not cancel, cancel_futures=cancel)
+            self.io_pool = None
+        # The prefetcher may read on the threads of `file_io`.
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        if self.file_io is not None:
+            self.file_io.close()
+
+    def protoSourceToImports(self, source_file):
+        return self.scanManyProtos([source_file])[source_file]
 
     @withCache(lambda self: self.source_file_to_deps_cache)
     def cppSourceToDeps(self, source_file):
-        headers_bkt = getCppHeader(source_file, self.cpp_header_regex_list)
-        headers = headers_bkt[0] + headers_bkt[1]
+        headers = self.cppSourceToIncludes(source_file)
         return self.__cppHeadersToTargets(headers, source_file)
 
     @withCache(lambda self: self.source_file_to_deps_cache)
     def protoSourceToDeps(self, source_file):
-        imports = getProtoImports(source_file, self.proto_parser_regex)
+        imports = self.protoSourceToImports(source_file)
         public_deps = []
         for dep_name in imports:
             if dep_name.startswith("google/protobuf/"):
@@ -80,68 +489,18 @@ class SourceDepsParser:
             common.assertFileExists(
                 dep_name,
                 self.configs,
-                "'%s' doesn't exists. Required by %s" % (dep_name, source_file))
+                "'%s' doesn't exists. Required by %s" % (dep_name, source_file),
+                self.file_index)
             public_deps.append(dict(name=dep_name,
                              type=TargetType.PROTO_LIBRARY))
         return public_deps
 
-    @common.withCacheOnArg0(lambda self: self.header_to_target_cache)
-    def __cppHeaderToTarget(self, header, source_file):
-        if header in self.system_includes:
-            return None
-        configs = self.configs
-        if header.endswith(configs.GRPC_HEADER_EXTENSION):
-            target = common.trimExtension(header, configs.GRPC_HEADER_EXTENSION)
-            common.assertFileExists(target + configs.PROTO_EXTENSION, self.configs)
-            return dict(
-                type=TargetType.GRPC_LIBRARY,
-                name=target + ".grpc",
-                deps=[target + configs.PROTO_EXTENSION])
-        if header.endswith(configs.PROTO_HEADER_EXTENSION):
-            target = header[:-len(configs.PROTO_HEADER_EXTENSION)] + configs.PROTO_EXTENSION
-            if os.path.isfile(target):
-                return dict(
-                    type=TargetType.PROTO_LIBRARY,
-                    name=target)
-        if common.hasExtensions(header, configs.CPP_HEADER_EXTENSIONS):
-            if not os.path.isfile(header):
-                for ip in [os.path.dirname(source_file)] + configs.INCLUDE_PATHS:
-                    relpath = os.path.relpath(ip + "/" + header)
-                    assert not relpath.startswith("../")
-                    if os.path.isfile(relpath):
-                        header = relpath
-                        break
-            if os.path.isfile(header):
-                return dict(
-                    type=TargetType.CPP_SOURCE,
-                    name=common.trimExtensions(
-                        header, configs.CPP_HEADER_EXTENSIONS))
-        thirdp_target = self.__getThirdPartyCppLibraryTarget(header)
-        if thirdp_target is not None:
-            return dict(
-                type=TargetType.CPP_SOURCE,
-                name=thirdp_target)
-        if header in configs.IGNORED_HEADERS:
-            return None
-        obj = self.manual_header_interpreter(header)
-        if obj is not None:
-            return obj
-        raise Exception(
-            "Unrecognized Header '%s' in file '%s'" % (header, source_file))
-
     def __cppHeadersToTargets(self, headers, source_file):
         output = []
         deps_names = set()
         for header in headers:
-            target = self.__cppHeaderToTarget(header, source_file)
+            target = self.header_resolver.resolve(header, source_file)
             if target is not None and target['name'] not in deps_names:
                 output.append(target)
                 deps_names.add(target['name'])
         return output
-
-    def __getThirdPartyCppLibraryTarget(self, header):
-        for i in range(header.count("/") + 1):
-            header_p = header.rsplit('/', i)[0]
-            if header_p in self.header_prefixes_map:
-                return self.header_prefixes_map[header_p]
-        return None
@@ -0,0 +1,228 @@
+#! /usr/bin/env python3
+
+"""
+SQLite backed persistent DepG cache. Same as cache.DepgCache, except that the
+entries live in a SQLite database instead of a single JSON blob:
+- An entry is loaded only when its file is queried, hence the startup cost
+  doesn't depend on the size of the cache.
+- Only the entries added or refreshed in the run are written back, in one
+  transaction.
+An existing cache.json is migrated on the first run.
+"""
+
+# pylint: disable=missing-function-docstring,invalid-name
+
+import json
+import os
+import sqlite3
+
+from . import cache
+
+_MISSING = object()
+
+# Seconds to wait for a concurrent DepG run holding the write lock.
+BUSY_TIMEOUT = 600
+
+# See configs.CACHE_SQLITE_JOURNAL_MODE. "WAL" lets concurrent runs read
+# while one of them is writing, but needs shared memory between them, i.e.
+# it's not safe on network filesystems. The rollback journal modes are.
+JOURNAL_MODES = ("WAL", "DELETE", "TRUNCATE", "PERSIST")
+FALLBACK_JOURNAL_MODE = "DELETE"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS sections (name TEXT PRIMARY KEY, key TEXT);
+CREATE TABLE IF NOT EXISTS entries (
+    section TEXT, file TEXT, entry TEXT, PRIMARY KEY (section, file)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteFileValueCache(cache.InMemoryFileValueCache):
+    """
+    InMemoryFileValueCache whose entries are loaded from the `entries` table
+    of @connection on demand. The modified entries are tracked in `dirty`.
+    """
+    def __init__(self, connection, section, current_fingerprints=None,
+                 fingerprint_policy=None):
+        super().__init__(None, current_fingerprints, fingerprint_policy)
+        self.connection = connection
+        self.section = section
+        # file -> entry (None if absent in database), for the queried files.
+        self.data = {}
+
+    def getEntry(self, file):
+        entry = self.data.get(file, _MISSING)
+        if entry is _MISSING:
+            row = self.connection.execute(
+                "SELECT entry FROM entries WHERE section = ? AND file = ?",
+                (self.section, file)).fetchone()
+            entry = None if row is None else json.loads(row[0])
+            self.data[file] = entry
+        return entry
+
+    def export(self):
+        output = dict((file, json.loads(entry)) for file, entry in
+                      self.connection.execute(
+                          "SELECT file, entry FROM entries WHERE section = ?",
+                          (self.section,)) if file not in self.deleted)
+        output.update((file, self.data[file]) for file in self.dirty)
+        return output
+
+    def deleteEntry(self, file):
+        super().deleteEntry(file)
+        self.data[file] = None  # Row is deleted only on commit.
+
+    def getEntries(self):
+        return list(self.export().items())
+
+    def getEntryCount(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM entries WHERE section = ?",
+            (self.section,)).fetchone()[0]
+
+    def popDirtyRows(self):
+        """Return the rows of the dirty entries and reset them as clean."""
+        output = [(self.section, file, json.dumps(self.data[file]))
+                  for file in sorted(self.dirty)]
+        self.dirty = set()
+        return output
+
+    def popDeletedRows(self):
+        output = [(self.section, file) for file in sorted(self.deleted)]
+        self.deleted = set()
+        return output
+
+
+class SqliteDepgCache:
+    """
+    Persistent DepG cache stored in the SQLite database @db_file. Interface
+    and invalidation rules are same as cache.DepgCache. If the database is
+    new and @json_file (a cache.json) exists, it's migrated into the database
+    and removed. @journal_mode is one of JOURNAL_MODES. If the filesystem
+    doesn't support it, FALLBACK_JOURNAL_MODE is used.
+    """
+    def __init__(self, db_file, section_keys, fingerprint_policy=None,
+                 json_file=None, journal_mode="WAL"):
+        assert journal_mode in JOURNAL_MODES, \
+            "Unknown SQLite journal mode '%s'" % journal_mode
+        self.db_file = db_file
+        self.section_keys = section_keys
+        self.invalidated_sections = []
+        self.connection = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT)
+        self.journal_mode = self.setJournalMode(journal_mode)
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+        stored_keys = self.validateDatabase()
+        if stored_keys is None and json_file is not None and \
+                os.path.isfile(json_file):
+            self.migrateJsonCache(json_file, fingerprint_policy)
+            stored_keys = dict(self.connection.execute(
+                "SELECT name, key FROM sections"))
+        stored_keys = stored_keys or {}
+        current_fingerprints = {}
+        self.sections = {}
+        for name, key in section_keys.items():
+            if stored_keys.get(name, key) != key:
+                self.invalidated_sections.append(name)
+            self.sections[name] = SqliteFileValueCache(
+                self.connection, name, current_fingerprints, fingerprint_policy)
+        with self.connection:
+            for name in self.invalidated_sections:
+                self.connection.execute(
+                    "DELETE FROM entries WHERE section = ?", (name,))
+            self.updateSectionKeys()
+
+    def setJournalMode(self, journal_mode):
+        """
+        Return the journal mode in effect: @journal_mode, or
+        FALLBACK_JOURNAL_MODE if SQLite kept another one (eg: no WAL support).
+        """
+        mode = self.connection.execute(
+            "PRAGMA journal_mode=%s" % journal_mode).fetchone()[0].upper()
+        if mode != journal_mode:
+            mode = self.connection.execute(
+                "PRAGMA journal_mode=%s" % FALLBACK_JOURNAL_MODE
+            ).fetchone()[0].upper()
+        return mode
+
+    def validateDatabase(self):
+        """
+        Discard the whole database if it was written with a different
+        cache.CACHE_SCHEMA_VERSION. Return the stored section keys, None if
+        the database is new.
+        """
+        row = self.connection.execute(
+            "SELECT value FROM metadata WHERE name = 'schema_version'"
+        ).fetchone()
+        if row is not None and row[0] == str(cache.CACHE_SCHEMA_VERSION):
+            return dict(self.connection.execute(
+                "SELECT name, key FROM sections"))
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("DELETE FROM sections")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata VALUES ('schema_version', ?)",
+                (str(cache.CACHE_SCHEMA_VERSION),))
+        return None
+
+    def migrateJsonCache(self, json_file, fingerprint_policy):
+        try:
+            with open(json_file) as f:
+                data = json.loads(f.read().strip() or "{}")
+        except (FileNotFoundError, ValueError):  # Migrated concurrently, or
+            return                                # truncated.
+        # Validates the sections same as a JSON backed run would do.
+        json_cache = cache.DepgCache(data, self.section_keys, fingerprint_policy)
+        with self.connection:
+            for name, section in json_cache.sections.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    ((name, file, json.dumps(entry))
+                     for file, entry in section.export().items()))
+            self.updateSectionKeys()
+        try:
+            os.remove(json_file)
+        except FileNotFoundError:
+            pass
+
+    def updateSectionKeys(self):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO sections VALUES (?, ?)",
+            self.section_keys.items())
+
+    def section(self, name):
+        return self.sections[name]
+
+    def export(self):
+        sections = dict((name, dict(key=self.section_keys[name],
+                                    entries=section.export()))
+                        for name, section in self.sections.items())
+        return {cache.DEPG_VERSION_KEY: cache.CACHE_SCHEMA_VERSION,
+                cache.SECTIONS_KEY: sections}
+
+    def commit(self):
+        """Write the dirty entries of all the sections in one transaction."""
+        with self.connection:
+            for section in self.sections.values():
+                self.connection.executemany(
+                    "DELETE FROM entries WHERE section = ? AND file = ?",
+                    section.popDeletedRows())
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                    section.popDirtyRows())
+
+    def vacuum(self):
+        """Give the space of the deleted entries back to the filesystem."""
+        self.connection.execute("VACUUM")
+        self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Move the write-ahead log into the database and truncate it, so that
+        the size of the files is the one of the entries. No-op out of WAL.
+        """
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.connection.close()
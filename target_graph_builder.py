@@ -1,19 +1,63 @@
 import os
 import json
+import time
+import contextlib
 from collections import OrderedDict
+from concurrent import futures
 
 from . import algorithms
 from . import common
 from . import utils
 from .targets import TargetType, DepgTarget
 from .source_deps_parser import SourceDepsParser
+from .shared_cache import SharedScanCache
+from .async_io import ConcurrentFileIO
+from .prefetcher import ReadAheadPrefetcher
+from .file_index import FileIndex
+from .sqlite_cache import SqliteDepgCache
+from .target_snapshot import TargetSnapshot
 from . import cache
 
 
 GTEST_MAIN_TARGET = None # "testing/gtest/gtest_with_glog_main"
 
-import time
-DEPG_VERSION_VALUE = int(time.time() * 100)
+# Sections of the persistent cache. For each section, `code` lists the DepG
+# modules and `configs` lists the config names, the cached values depend on.
+# A change in any of them invalidates only that section (See cache.DepgCache).
+INCLUDES_CACHE_SECTION = "includes"
+DEPS_CACHE_SECTION = "deps"
+TARGETS_CACHE_SECTION = "targets"
+_DEPS_SECTION_CODE = ["source_deps_parser.py", "include_scanner.py",
+                      "header_resolver.py"]
+_DEPS_SECTION_CONFIGS = [
+    "HEADER_PREFIXES_MAP", "INCLUDE_PATHS", "CPP_HEADER_EXTENSIONS",
+    "CPP_SOURCE_EXTENSIONS", "PROTO_HEADER_EXTENSION", "GRPC_HEADER_EXTENSION",
+    "PROTO_EXTENSION", "SYS_STD_HEADERS", "IGNORED_HEADERS",
+    "IGNORE_EXISTANCE", "CUSTOM_HEADER_IDENTIFICATION_HANDLER",
+    "DEPG_DEPS_CACHE_CHECKSUM", "FILE_FINGERPRINT"]
+CACHE_SECTIONS = {
+    INCLUDES_CACHE_SECTION: dict(
+        code=["source_deps_parser.py", "include_scanner.py"],
+        configs=["INCLUDE_SCAN_MODE", "FILE_FINGERPRINT"]),
+    DEPS_CACHE_SECTION: dict(
+        code=_DEPS_SECTION_CODE,
+        configs=_DEPS_SECTION_CONFIGS),
+    # Keyed by target name, See TargetSnapshot.
+    TARGETS_CACHE_SECTION: dict(
+        code=_DEPS_SECTION_CODE + ["target_graph_builder.py",
+                                   "target_snapshot.py"],
+        configs=_DEPS_SECTION_CONFIGS + ["TEST_FILE_EXTENSION",
+                                         "GTEST_MAIN_TARGET"]),
+}
+
+# Storage of the persistent cache. See configs.CACHE_BACKEND.
+CACHE_BACKENDS = ("json", "sqlite")
+
+# Values of the trie of forbidden and ignored paths (See compilePathsTrie).
+FORBIDDEN_PATH = "forbidden"
+IGNORED_PATH = "ignored"
+# Levels of directories split into subtrees, for a parallel walk.
+MAX_SPLIT_DEPTH = 3
 
 def combinedList(a, b):
     if len(a) == 0:
@@ -31,7 +75,8 @@ def fileToTarget(file, configs):
     return None
 
 
-def listDirectoryRecursive(directory, forbidden_paths, ignored_paths):
+def listDirectoryRecursive(directory, forbidden_paths, ignored_paths,
+                           workers=1):
     """
     For a given relative path of @directory (w.r.t Git Root),
     list down all the files in this directory recursively.
@@ -54,30 +99,103 @@ def listDirectoryRecursive(directory, forbidden_paths, ignored_paths):
 
     Let a path is a valid relative path iff `os.path.relpath(path) == path`
 
+    The output is in the same order as an `os.walk` of @directory. If
+    @workers > 1, the subtrees of @directory are walked by that many threads.
+
     Preconditions:
     1. @directory is a valid relative path.
     2. @forbidden_paths and @ignored_paths are valid relative paths.
 
     """
     assert os.path.relpath(directory) == directory
-    for i in forbidden_paths:
-        if directory.startswith(i):
-            return []
+    trie = compilePathsTrie(forbidden_paths, ignored_paths)
+    node = trie.root
+    if directory != ".":
+        for component in directory.split("/"):
+            node = utils.PathTrie.getChild(node, component)
+            if utils.PathTrie.getValue(node) == FORBIDDEN_PATH:
+                return []
     if os.path.isfile(directory):
         # Assert (@directory not in @forbidden_paths)
         return [directory]
-    output = []
-    for (root, dirs, files) in os.walk(directory):
-        root = os.path.relpath(root)
-        if (root in forbidden_paths
-                or (root != directory and root in ignored_paths)):
-            dirs[:] = []
-            continue
-        for file in files:
-            file_path = root + "/" + file
-            if file_path in forbidden_paths:
+    if workers <= 1:
+        return walkTree(directory, node)
+    with futures.ThreadPoolExecutor(workers) as pool:
+        # Split the top levels into at least 4 subtrees per worker, keeping
+        # the files found on the way in place, so that the order is same.
+        parts = [(directory, node)]
+        for _ in range(MAX_SPLIT_DEPTH):
+            subtrees = [x for x in parts if isinstance(x, tuple)]
+            if len(subtrees) == 0 or len(subtrees) >= workers * 4:
+                break
+            scanned = iter(pool.map(lambda x: scanDirectory(*x), subtrees))
+            new_parts = []
+            for part in parts:
+                if isinstance(part, tuple):
+                    files, subdirs = next(scanned)
+                    new_parts.append(files)
+                    new_parts.extend(subdirs)
+                else:
+                    new_parts.append(part)
+            parts = new_parts
+        results = pool.map(
+            lambda x: walkTree(*x) if isinstance(x, tuple) else x, parts)
+        return [file for files in results for file in files]
+
+
+def compilePathsTrie(forbidden_paths, ignored_paths):
+    """
+    utils.PathTrie mapping each of @forbidden_paths to FORBIDDEN_PATH and each
+    of @ignored_paths to IGNORED_PATH. Forbidden wins if a path is both.
+    """
+    trie = utils.PathTrie((x, IGNORED_PATH) for x in ignored_paths)
+    for path in forbidden_paths:
+        trie.insert(path, FORBIDDEN_PATH)
+    return trie
+
+
+def scanDirectory(directory, node):
+    """
+    Return the tuple (files, subdirectories to walk) of @directory, both in
+    the order of `os.scandir`. @node is the node of @directory in the trie of
+    compilePathsTrie. The subdirectories are the tuples (path, node). Same as
+    a step of `os.walk`, the symlinks to directories are neither listed nor
+    walked and an unreadable directory is empty.
+    """
+    files, subdirs = [], []
+    prefix = "" if directory == "." else directory + "/"
+    try:
+        entries = os.scandir(directory)
+    except OSError:
+        return files, subdirs
+    with entries:
+        for entry in entries:
+            # Most of the directories have no forbidden or ignored path.
+            child, value = None, None
+            if node is not None:
+                child = utils.PathTrie.getChild(node, entry.name)
+                value = utils.PathTrie.getValue(child)
+            if value == FORBIDDEN_PATH:
                 continue
-            output.append(file_path)
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                files.append(prefix + entry.name)
+            elif value != IGNORED_PATH and not entry.is_symlink():
+                subdirs.append((prefix + entry.name, child))
+    return files, subdirs
+
+
+def walkTree(directory, node):
+    """Return the files under @directory, in the order of `os.walk`."""
+    output = []
+    stack = [(directory, node)]
+    while len(stack) > 0:
+        files, subdirs = scanDirectory(*stack.pop())
+        output.extend(files)
+        stack.extend(reversed(subdirs))
     return output
 
 
@@ -107,7 +225,8 @@ def changedPathsToTargetNames(input_paths, configs):
         else:
             assert os.path.isdir(path)
             new_files = listDirectoryRecursive(
-                path, configs.FORBIDDEN_PATHS, configs.IGNORED_PATHS)
+                path, configs.FORBIDDEN_PATHS, configs.IGNORED_PATHS,
+                configs.WALK_WORKERS)
             [files.add(x) for x in new_files]
     output = utils.OrderedSet()
     for file in files:
@@ -121,58 +240,241 @@ def getCacheFile(cache_directory):
     return cache_directory.rstrip("/") + "/cache.json"
 
 
+def getSqliteCacheFile(cache_directory):
+    return cache_directory.rstrip("/") + "/cache.sqlite"
+
+
+def getCacheLockFile(cache_directory):
+    return cache_directory.rstrip("/") + "/cache.lock"
+
+
+def getRunStatsFile(cache_directory):
+    return cache_directory.rstrip("/") + "/run_stats.json"
+
+
+def getCacheDiskSize(cache_directory):
+    """Total size of the files in @cache_directory, in bytes."""
+    if not os.path.isdir(cache_directory):
+        return 0
+    return sum(x.stat().st_size for x in os.scandir(cache_directory)
+               if x.is_file())
+
+
 def loadCacheData(file):
     if os.path.isfile(file):
         content = common.readFile(file).strip()
         if len(content) > 0:
-            return json.loads(content)
+            try:
+                return json.loads(content)
+            except ValueError:
+                # Truncated by a run killed while writing it (before the
+                # writes became atomic). Treated as empty.
+                pass
     return {}
 
+def getCacheSectionKeys(configs):
+    return dict((name, cache.getSectionKey(spec, configs))
+                for name, spec in CACHE_SECTIONS.items())
+
+
+def getSharedCacheNamespace(configs):
+    """
+    Namespace of the shared scan cache, i.e. the key of the includes section:
+    the scan results depend only on the content of the file, the scanner code
+    and INCLUDE_SCAN_MODE (and FILE_FINGERPRINT, which defines the checksum).
+    """
+    return cache.getSectionKey(CACHE_SECTIONS[INCLUDES_CACHE_SECTION], configs)
+
+
+def loadSharedCache(configs, cache_object):
+    if not configs.SHARED_CACHE or cache_object is None:
+        return None
+    return SharedScanCache(configs.SHARED_CACHE,
+                           getSharedCacheNamespace(configs),
+                           configs.SHARED_CACHE_READ_ONLY)
+
+
 def loadCache(configs):
     if configs.CACHE_DIRECTORY:
-        data = loadCacheData(getCacheFile(configs.CACHE_DIRECTORY))
-        # DepG version is used for invalidating the entire cache when we make some
-        # change in the DepG software itself.
-        # If you make some change in DepG software, you are expected to increase the
-        # DEPG_VERSION_VALUE counter by 1.
-        DEPG_VERSION_KEY = '__DEPG_VERSION__'
-        DEPG_DEPS_CACHE_CHECKSUM = "DEPG_DEPS_CACHE_CHECKSUM"
-        if data.get(DEPG_VERSION_KEY) != DEPG_VERSION_VALUE or \
-                data.get(DEPG_DEPS_CACHE_CHECKSUM) != configs.DEPG_DEPS_CACHE_CHECKSUM:
-            data = {
-                DEPG_VERSION_KEY : DEPG_VERSION_VALUE,
-                DEPG_DEPS_CACHE_CHECKSUM : configs.DEPG_DEPS_CACHE_CHECKSUM
-            }
-        return cache.InMemoryFileValueCache(data)
+        fingerprint_policy = cache.getFingerprintPolicy(configs.FILE_FINGERPRINT)
+        assert configs.CACHE_BACKEND in CACHE_BACKENDS, \
+            "Unknown cache backend '%s'" % configs.CACHE_BACKEND
+        if configs.CACHE_BACKEND == "sqlite":
+            os.makedirs(configs.CACHE_DIRECTORY, exist_ok=True)
+            return SqliteDepgCache(
+                getSqliteCacheFile(configs.CACHE_DIRECTORY),
+                getCacheSectionKeys(configs), fingerprint_policy,
+                json_file=getCacheFile(configs.CACHE_DIRECTORY),
+                journal_mode=configs.CACHE_SQLITE_JOURNAL_MODE)
+        file = getCacheFile(configs.CACHE_DIRECTORY)
+        # Taken before reading, so that a concurrent write in between is
+        # detected by storeCache.
+        stamp = common.getFileStamp(file)
+        data = loadCacheData(file)
+        return cache.DepgCache(
+            data, getCacheSectionKeys(configs), fingerprint_policy, stamp)
     return None
 
 
 def storeCache(cache_directory, cache_object):
     if cache_directory is None:
         return
+    if isinstance(cache_object, SqliteDepgCache):
+        cache_object.commit()
+        return
     file = getCacheFile(cache_directory)
     os.makedirs(os.path.dirname(file), exist_ok=True)
-    common.writeFile(file, json.dumps(cache_object.export()))
+    if not cache_object.isModified():
+        return
+    # Concurrent runs sharing the cache directory are serialized by the lock.
+    # If another run has stored the cache since this one loaded it, its
+    # entries are merged instead of being overwritten.
+    with common.fileLock(getCacheLockFile(cache_directory)):
+        stamp = common.getFileStamp(file)
+        if stamp is not None and stamp != cache_object.source_stamp:
+            cache_object.merge(loadCacheData(file))
+        common.writeFileAtomic(file, json.dumps(cache_object.export()))
+        cache_object.markStored(common.getFileStamp(file))
+
+def enforceCacheLimits(configs, cache_object):
+    """
+    If the stored @cache_object exceeds configs.CACHE_MAX_ENTRIES or
+    CACHE_MAX_BYTES (the disk usage of CACHE_DIRECTORY), evict the least
+    recently used entries until it's within 90% of these, so that the
+    eviction (which reads all the entries) doesn't happen every run.
+    Return the number of entries evicted.
+    """
+    max_entries, max_bytes = configs.CACHE_MAX_ENTRIES, configs.CACHE_MAX_BYTES
+    if max_entries is None and max_bytes is None:
+        return 0
+    if isWithinLimits(configs.CACHE_DIRECTORY, cache_object, max_entries,
+                      max_bytes):
+        return 0
+    return evictToLimits(
+        configs.CACHE_DIRECTORY, cache_object,
+        None if max_entries is None else int(max_entries * 0.9),
+        None if max_bytes is None else int(max_bytes * 0.9))
+
+
+def isWithinLimits(cache_directory, cache_object, max_entries, max_bytes):
+    if isinstance(cache_object, SqliteDepgCache):
+        cache_object.checkpoint()
+    num_entries = sum(x.getEntryCount() for x in cache_object.sections.values())
+    return (max_entries is None or num_entries <= max_entries) and \
+        (max_bytes is None or getCacheDiskSize(cache_directory) <= max_bytes)
+
+
+# The evicted size is estimated from the entries, which ignores the fixed
+# costs of the files (eg: run stats, SQLite pages), hence a few rounds of
+# eviction and measure.
+MAX_EVICTION_ROUNDS = 3
+
+def evictToLimits(cache_directory, cache_object, max_entries, max_bytes):
+    """
+    Evict the least recently used entries of the stored @cache_object until
+    it has at most @max_entries entries and @cache_directory takes at most
+    @max_bytes on disk. The cache is stored (and the SQLite one vacuumed)
+    after each round, then measured again. Return the number of entries
+    evicted.
+    """
+    evicted = 0
+    for _ in range(MAX_EVICTION_ROUNDS):
+        if isWithinLimits(cache_directory, cache_object, max_entries,
+                          max_bytes):
+            break
+        count = cache.evictLeastRecentlyUsed(
+            cache_object, max_entries, max_bytes,
+            getCacheDiskSize(cache_directory))
+        if count == 0:
+            break
+        evicted += count
+        storeCache(cache_directory, cache_object)
+        if isinstance(cache_object, SqliteDepgCache):
+            cache_object.vacuum()
+    return evicted
+
+
+def loadRunStats(cache_directory):
+    return loadCacheData(getRunStatsFile(cache_directory))
+
+
+def storeRunStats(cache_directory, cache_object):
+    """
+    Record the hits and misses of the sections of @cache_object in the run
+    stats file, for the last run as well as the total across the runs.
+    """
+    file = getRunStatsFile(cache_directory)
+    last_run = dict((name, section.stats)
+                    for name, section in cache_object.sections.items())
+    with common.fileLock(getCacheLockFile(cache_directory)):
+        run_stats = loadRunStats(cache_directory)
+        total = run_stats.get('total', {})
+        for name, stats in last_run.items():
+            section_total = total.setdefault(name, {})
+            for key, value in stats.items():
+                section_total[key] = section_total.get(key, 0) + value
+        common.writeFileAtomic(file, json.dumps(dict(
+            runs=run_stats.get('runs', 0) + 1, last_run=last_run,
+            total=total)))
+
 
 class TargetGraphBuilder:
     def __init__(self, configs):
         self.configs = configs
         self.source_deps_cache = loadCache(configs)
+        top_directories = configs.TOP_DIRECTORY_LIST if configs.FILE_INDEX else []
+        self.file_index = FileIndex(top_directories, configs.FORBIDDEN_PATHS,
+                                    configs.IGNORED_PATHS)
+        self.shared_cache = loadSharedCache(configs, self.source_deps_cache)
+        deps_cache, includes_cache = None, None
+        if self.source_deps_cache is not None:
+            deps_cache = self.source_deps_cache.section(DEPS_CACHE_SECTION)
+            includes_cache = self.source_deps_cache.section(
+                INCLUDES_CACHE_SECTION)
+        self.file_io = None
+        if configs.IO_MAX_IN_FLIGHT is not None:
+            self.file_io = ConcurrentFileIO(configs.IO_MAX_IN_FLIGHT)
+        self.prefetcher = None
+        if configs.PREFETCH is not None:
+            self.prefetcher = ReadAheadPrefetcher(
+                configs.PREFETCH, int(configs.PREFETCH_BUFFER_MB * 1e6),
+                self.file_io.getExecutor if self.file_io is not None else None)
         self.source_deps_parser = SourceDepsParser(
             configs.SYS_STD_HEADERS, configs.HEADER_PREFIXES_MAP,
             configs.CUSTOM_HEADER_IDENTIFICATION_HANDLER,
-            self.source_deps_cache, configs)
+            deps_cache, configs, includes_cache, self.file_index,
+            self.shared_cache, self.checkpointCache, self.file_io,
+            self.prefetcher)
+        self.target_snapshot = None
+        if self.source_deps_cache is not None and configs.TARGET_SNAPSHOT:
+            self.target_snapshot = TargetSnapshot(
+                self.source_deps_cache.section(TARGETS_CACHE_SECTION))
+        # Declarations made while building a target, for the snapshot.
+        self.declaration_log = None
         self.target_map = {}
         self.edge_cache = {}
+        # Target name -> (hdrs, srcs). See getCppTargetFiles.
+        self.target_files_cache = {}
+        # (valid, stale) entries found by validateCache.
+        self.cache_validation = None
+        # See checkpointCache.
+        self.last_checkpoint_time = time.monotonic()
+        self.num_checkpoints = 0
 
     def depsCover(self, target_names):
         for target_name in target_names:
             self.declareTarget(target_name,
                                type=self.getTargetType(target_name))
-        cover = algorithms.depsCover(target_names, self.edgeFunc)
+        with self.storingCacheOnError():
+            self.validateCache(target_names, transitive=True)
+            if self.configs.BATCHED_TRAVERSAL:
+                cover = algorithms.batchedDepsCover(target_names,
+                                                    self.batchEdgeFunc)
+            else:
+                cover = algorithms.depsCover(target_names, self.edgeFunc)
         target_map = dict((tname, self.target_map[tname]) for tname in cover)
         self.target_map = target_map
-        storeCache(self.configs.CACHE_DIRECTORY, self.source_deps_cache)
+        self.finishRun()
         return target_map
 
     def getDeps(self, target_names):
@@ -189,10 +491,177 @@ class TargetGraphBuilder:
         for target_name in target_names:
             self.declareTarget(target_name,
                                type=self.getTargetType(target_name))
-            self.edgeFunc(target_name)
-        storeCache(self.configs.CACHE_DIRECTORY, self.source_deps_cache)
+        with self.storingCacheOnError():
+            self.validateCache(target_names, transitive=False)
+            self.prescanTargets(target_names)
+            for target_name in target_names:
+                self.edgeFunc(target_name)
+        self.finishRun()
         return self.target_map
 
+    def publicDepsCover(self, target_names):
+        """
+        Build the targets reachable from @target_names by public deps only,
+        i.e. the ones visible through @target_names, and return their map.
+        """
+        for target_name in target_names:
+            self.declareTarget(target_name,
+                               type=self.getTargetType(target_name))
+        def publicEdgeFunc(names):
+            self.batchEdgeFunc(names)
+            return [self.target_map[x].get('public_deps', []) for x in names]
+        with self.storingCacheOnError():
+            cover = algorithms.batchedDepsCover(target_names, publicEdgeFunc)
+        self.finishRun()
+        return dict((x, self.target_map[x]) for x in cover)
+
+    def getRunSummary(self):
+        """Return the list of lines summarizing the work done in this run."""
+        output = [self.file_index.getSummary()]
+        if self.target_snapshot is not None:
+            output.append(self.target_snapshot.getSummary())
+        if self.shared_cache is not None:
+            output.append(self.shared_cache.getSummary())
+        if self.file_io is not None:
+            output.append(self.file_io.getSummary())
+        if self.prefetcher is not None:
+            output.append(self.prefetcher.getSummary())
+        if self.num_checkpoints > 0:
+            output.append("Cache checkpoints stored: %d" % self.num_checkpoints)
+        if self.cache_validation is not None:
+            output.append("CacheValidation: %d valid, %d stale entries" %
+                          self.cache_validation)
+        return output
+
+    def finishRun(self):
+        self.source_deps_parser.close()
+        if self.source_deps_cache is None:
+            return
+        if self.shared_cache is not None:
+            self.shared_cache.flush()
+        storeCache(self.configs.CACHE_DIRECTORY, self.source_deps_cache)
+        storeRunStats(self.configs.CACHE_DIRECTORY, self.source_deps_cache)
+        # Measured on the stored cache.
+        enforceCacheLimits(self.configs, self.source_deps_cache)
+
+    def checkpointCache(self):
+        """
+        Store the cache if `configs.CACHE_CHECKPOINT_ENTRIES` entries were
+        modified or `configs.CACHE_CHECKPOINT_SECONDS` elapsed since the last
+        checkpoint, so that an interrupted run doesn't lose the work done.
+        Called during the traversal, hence must be cheap when not storing.
+        """
+        if self.source_deps_cache is None:
+            return
+        configs = self.configs
+        seconds_due = configs.CACHE_CHECKPOINT_SECONDS is not None and \
+            time.monotonic() - self.last_checkpoint_time >= \
+            configs.CACHE_CHECKPOINT_SECONDS
+        entries_due = configs.CACHE_CHECKPOINT_ENTRIES is not None and sum(
+            len(x.dirty) + len(x.deleted) for x in
+            self.source_deps_cache.sections.values()) >= \
+            configs.CACHE_CHECKPOINT_ENTRIES
+        if not seconds_due and not entries_due:
+            return
+        self.storeCheckpoint()
+
+    def storeCheckpoint(self):
+        if self.shared_cache is not None:
+            self.shared_cache.flush()
+        storeCache(self.configs.CACHE_DIRECTORY, self.source_deps_cache)
+        self.last_checkpoint_time = time.monotonic()
+        self.num_checkpoints += 1
+
+    @contextlib.contextmanager
+    def storingCacheOnError(self):
+        """
+        Store the cache built so far if the enclosed traversal fails (eg:
+        unrecognized header, KeyboardInterrupt on SIGINT), so that a rerun
+        resumes from there. The error is propagated.
+        """
+        try:
+            yield
+        except BaseException:
+            self.source_deps_parser.close(cancel=True)
+            if self.source_deps_cache is not None:
+                self.storeCheckpoint()
+            raise
+
+    def validateCache(self, target_names, transitive):
+        """
+        Validate in bulk the cache entries of the source files of the targets
+        @target_names (and of their deps as recorded in the cache, if
+        @transitive) before the traversal. See cache.validateEntries.
+        """
+        workers = self.configs.CACHE_VALIDATION_WORKERS
+        if self.source_deps_cache is None or not workers:
+            return
+        files = self.getCachedClosureFiles(target_names, transitive)
+        if self.file_io is not None:
+            # Within IO_MAX_IN_FLIGHT, as the other reads.
+            self.cache_validation = cache.validateEntries(
+                self.source_deps_cache, files, self.file_io.getExecutor())
+            return
+        with futures.ThreadPoolExecutor(workers) as executor:
+            self.cache_validation = cache.validateEntries(
+                self.source_deps_cache, files, executor)
+
+    def getCachedClosureFiles(self, target_names, transitive):
+        """
+        Return the source files of @target_names and, if @transitive, of the
+        targets reachable from them as per the (not yet validated) deps
+        section. That's the files the traversal is going to look up, unless
+        some of them have changed.
+        """
+        deps_cache = self.source_deps_cache.section(DEPS_CACHE_SECTION)
+        configs = self.configs
+        output = []
+        visited = set(target_names)
+        queue = list(target_names)
+        while len(queue) > 0:
+            target_name = queue.pop()
+            if target_name.endswith(configs.PROTO_EXTENSION):
+                files = [target_name]
+            else:
+                files = [target_name + x for x in
+                         self.file_index.existingExtensions(
+                             target_name, configs.CPP_EXTENSIONS)]
+            output.extend(files)
+            if not transitive:
+                continue
+            for file in files:
+                entry = deps_cache.getEntry(file)
+                for dep in [] if entry is None else entry['value']:
+                    if dep['name'] not in visited:
+                        visited.add(dep['name'])
+                        queue.append(dep['name'])
+        return output
+
+    def prescanTargets(self, target_names):
+        """
+        Scan the source files of the C++ and proto targets @target_names in
+        bulk (See SourceDepsParser.scanMany and scanManyProtos), so that
+        building these targets later finds their includes in cache.
+        """
+        files = []
+        protos = []
+        for target_name in target_names:
+            target = self.target_map[target_name]
+            if target_name in self.edge_cache:
+                continue
+            if target.type in common.CPP_TARGETS or \
+                    target.type == TargetType.PROTO_LIBRARY:
+                source_files = self.getTargetSourceFiles(target)
+                if self.target_snapshot is not None and \
+                        self.target_snapshot.isRestorable(target, source_files):
+                    continue
+                if target.type == TargetType.PROTO_LIBRARY:
+                    protos.extend(source_files)
+                else:
+                    files.extend(source_files)
+        self.source_deps_parser.scanMany(files)
+        self.source_deps_parser.scanManyProtos(protos)
+
     def getTargetType(self, target_name, parent_target_name=None):
         """
         Given a @target_name, return the target type. In case of invalid
@@ -206,7 +675,7 @@ class TargetGraphBuilder:
             return TargetType.PROTO_LIBRARY
         for e in self.configs.CPP_EXTENSIONS:
             file = target_name + e
-            if os.path.isfile(file):
+            if self.file_index.isFile(file):
                 if file.endswith(self.configs.TEST_FILE_EXTENSION):
                     return TargetType.CPP_TEST
                 return TargetType.CPP_SOURCE
@@ -225,6 +694,8 @@ class TargetGraphBuilder:
         Declare a target with minimal information we know about target.
         If the target already exists, do nothing.
         """
+        if self.declaration_log is not None:
+            self.declaration_log.append(dict(name=name, **kwargs))
         if name in self.target_map:
             return
         assert 'type' in kwargs
@@ -251,12 +722,54 @@ class TargetGraphBuilder:
         populates the target fields eg: 'header', 'srcs', 'public_deps'.. etc.
         Assume: It method should be called at most once per target.
         """
-        self.buildTargetFromSource(target)
+        files = None
+        if self.target_snapshot is not None:
+            files = self.getTargetSourceFiles(target)
+        if files is None:
+            self.buildTargetFromSource(target)
+        elif not self.restoreTarget(target, files):
+            self.buildAndSnapshotTarget(target, files)
         deps = target.get('public_deps', []) + target.get('private_deps', [])
         for dep_name in deps:
             target_type = self.getTargetType(dep_name, target.name)
             self.declareTarget(dep_name, type=target_type)
 
+    def getTargetSourceFiles(self, target):
+        """
+        Return the source files of @target, None if it's not built from
+        source files.
+        """
+        if target.type in common.CPP_TARGETS:
+            hdrs, srcs = self.getCppTargetFiles(target)
+            return hdrs + srcs
+        if target.type == TargetType.PROTO_LIBRARY:
+            return [target.name]
+        return None
+
+    def restoreTarget(self, target, files):
+        """
+        Populate the fields of declared @target, having source @files, from
+        the target snapshot. Return False if there is no valid snapshot.
+        """
+        snapshot = self.target_snapshot.get(target, files)
+        if snapshot is None:
+            return False
+        target.update(self.target_snapshot.getBuiltFields(snapshot))
+        self.declareTargets(self.target_snapshot.getDeclarations(snapshot))
+        return True
+
+    def buildAndSnapshotTarget(self, target, files):
+        declaration = dict(target)
+        self.declaration_log = []
+        try:
+            self.buildTargetFromSource(target)
+            built = dict((k, v) for k, v in target.items()
+                         if k not in declaration or declaration[k] != v)
+            self.target_snapshot.put(declaration, files, built,
+                                     self.declaration_log)
+        finally:
+            self.declaration_log = None
+
     def cppSourceToDeps(self, source_file, target_name):
         deps_list = self.source_deps_parser.cppSourceToDeps(source_file)
         deps_list = [d for d in deps_list if d['name'] != target_name]
@@ -270,6 +783,32 @@ class TargetGraphBuilder:
             output.extend(self.cppSourceToDeps(source_file, target_name))
         return output
 
+    def getCppTargetFiles(self, target):
+        """
+        Return the (hdrs, srcs) of C++ @target. If not already present in the
+        @target, these are identified by probing the files having target name
+        as prefix and C++ extensions as suffix.
+        """
+        output = self.target_files_cache.get(target.name)
+        if output is None:
+            output = self.probeCppTargetFiles(target)
+            self.target_files_cache[target.name] = output
+        return output
+
+    def probeCppTargetFiles(self, target):
+        configs = self.configs
+        if "hdrs" in target:
+            hdrs = target.hdrs
+        else:
+            hdrs = [target.name + x for x in self.file_index.existingExtensions(
+                target.name, configs.CPP_HEADER_EXTENSIONS)]
+        if "srcs" in target:
+            srcs = target.srcs
+        else:
+            srcs = [target.name + x for x in self.file_index.existingExtensions(
+                target.name, configs.CPP_SOURCE_EXTENSIONS)][:1]
+        return hdrs, srcs
+
     def buildCppTarget(self, target):
         """
         Populate the fields of C++ @target by inspecting the source code.
@@ -277,18 +816,11 @@ class TargetGraphBuilder:
                       be already populated).
         """
         configs = self.configs
-        if "hdrs" not in target:
-            hdrs = []
-            for x in configs.CPP_HEADER_EXTENSIONS:
-                if os.path.isfile(target.name + x):
-                    hdrs.append(target.name + x)
-            if len(hdrs) > 0:
-                target.hdrs = hdrs
-        if "srcs" not in target:
-            for x in configs.CPP_SOURCE_EXTENSIONS:
-                if os.path.isfile(target.name + x):
-                    target.srcs = [target.name + x]
-                    break
+        hdrs, srcs = self.getCppTargetFiles(target)
+        if "hdrs" not in target and len(hdrs) > 0:
+            target.hdrs = hdrs
+        if "srcs" not in target and len(srcs) > 0:
+            target.srcs = srcs
         public_deps_set = set()
         if "hdrs" in target:
             public_deps = self.cppSourcesToDeps(target.hdrs, target.name)
@@ -299,9 +831,8 @@ class TargetGraphBuilder:
             private_deps = []
             if target.type == TargetType.CPP_TEST:
                 if configs.GTEST_MAIN_TARGET is not None:
-                    if configs.GTEST_MAIN_TARGET not in self.target_map:
-                        self.declareTarget(name=configs.GTEST_MAIN_TARGET,
-                                           type=TargetType.CPP_SOURCE)
+                    self.declareTarget(name=configs.GTEST_MAIN_TARGET,
+                                       type=TargetType.CPP_SOURCE)
                     private_deps.append(configs.GTEST_MAIN_TARGET)
             private_deps.extend(self.cppSourcesToDeps(
                 target.srcs, target.name))
@@ -323,4 +854,14 @@ class TargetGraphBuilder:
         assert target_name in self.target_map
         target = self.target_map[target_name]
         self.buildTarget(target)
+        self.checkpointCache()
         return target.get('private_deps', []) + target.get('public_deps', [])
+
+    def batchEdgeFunc(self, target_names):
+        """
+        Bulk version of edgeFunc, used by algorithms.batchedDepsCover. Source
+        files of all the @target_names are scanned as one batch before
+        building the targets.
+        """
+        self.prescanTargets(target_names)
+        return [self.edgeFunc(target_name) for target_name in target_names]
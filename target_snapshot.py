@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+
+# pylint: disable=missing-module-docstring,missing-function-docstring
+# pylint: disable=invalid-name
+
+from . import cache
+from .targets import TargetType
+
+
+def copyFields(fields):
+    """Copy of the dict @fields, along with its list values."""
+    return {k: (v[:] if type(v) is list else v) for k, v in fields.items()}
+
+
+class TargetSnapshot:
+    """
+    Persistent snapshot of the built targets, i.e. the fields populated by
+    TargetGraphBuilder.buildTargetFromSource and the targets declared while
+    building, so that an unchanged target is restored instead of rebuilt.
+    An entry is valid if the target is declared same as when it was built, it
+    has the same source files and none of these files has changed (See
+    cache.InMemoryFileValueCache.getCurrentFingerprint).
+    The entries are stored by target name in @storage, a cache section, so
+    they are persisted (and merged, migrated..) alongside the file cache.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        # Target name -> result of get, memoized for the run.
+        self.checked = {}
+        self.stats = storage.stats
+
+    def get(self, target, files):
+        """
+        Return the snapshot of declared @target having source @files, None if
+        there is no valid one. See getBuiltFields and getDeclarations.
+        """
+        if target.name in self.checked:
+            return self.checked[target.name]
+        entry = self.storage.getEntry(target.name)
+        if entry is None or not self.isValid(entry, target, files):
+            self.stats['misses'] += 1
+            entry = None
+        else:
+            entry = self.storage.touchEntry(target.name, entry)
+        self.checked[target.name] = entry
+        return entry
+
+    def isValid(self, entry, target, files):
+        # Declarations are compared after a json round-trip, i.e. a field
+        # declared as a tuple never matches. That's only a miss.
+        if entry['declaration'] != target:
+            return False
+        # The files are the keys of the recorded fingerprints, hence compared
+        # regardless of their order.
+        if set(entry['files']) != set(files):
+            return False
+        for file, recorded in entry['files'].items():
+            try:
+                fingerprint = self.storage.getCurrentFingerprint(file, recorded)
+            except FileNotFoundError:
+                return False  # Building reports it.
+            if fingerprint['checksum'] != recorded['checksum']:
+                return False
+        return True
+
+    @staticmethod
+    def getBuiltFields(snapshot):
+        return copyFields(snapshot['built'])
+
+    @staticmethod
+    def getDeclarations(snapshot):
+        """Return the list of declareTarget kwargs recorded in @snapshot."""
+        output = []
+        for name, declaration in snapshot['declared_targets'].items():
+            if isinstance(declaration, int):
+                output.append(dict(name=name, type=TargetType(declaration)))
+            else:
+                declaration = copyFields(declaration)
+                declaration.update(name=name,
+                                   type=TargetType(declaration['type']))
+                output.append(declaration)
+        return output
+
+    def put(self, declaration, files, built, declared_targets):
+        """
+        Record the target declared as @declaration having source @files,
+        whose building populated the fields @built and declared the targets
+        @declared_targets (list of declareTarget kwargs).
+        """
+        fingerprints = dict((file, self.storage.getCurrentFingerprint(file))
+                            for file in files)
+        # Name -> type, or the whole kwargs if having more than the type.
+        # Only the first declaration of a name is effective.
+        compact_declarations = {}
+        for x in declared_targets:
+            if x['name'] not in compact_declarations:
+                compact_declarations[x['name']] = x['type'] if len(x) == 2 \
+                    else dict((k, v) for k, v in x.items() if k != 'name')
+        self.storage.putEntry(declaration['name'], dict(
+            declaration=cache.toJsonCompatible(declaration),
+            files=fingerprints,
+            built=cache.toJsonCompatible(built),
+            declared_targets=cache.toJsonCompatible(compact_declarations)))
+
+    def isRestorable(self, target, files):
+        return self.get(target, files) is not None
+
+    def getSummary(self):
+        return "TargetSnapshot: %d targets restored, %d built" % (
+            self.stats['hits'], self.stats['misses'])
@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg import algorithms
+
+
+def randomGraph(num_nodes, num_edges, seed=0, acyclic=False):
+    rng = random.Random(seed)
+    graph = dict((i, []) for i in range(num_nodes))
+    for _ in range(num_edges):
+        a, b = rng.randrange(num_nodes), rng.randrange(num_nodes)
+        if acyclic and a >= b:
+            continue
+        graph[a].append(b)
+    return graph
+
+
+class TestDepsCover(unittest.TestCase):
+    def test_batched_same_as_serial(self):
+        for seed in range(5):
+            graph = randomGraph(300, 600, seed)
+            nodes = [0, 5, 7, 5, 100]
+            serial_order = []
+            def edgeFunc(x):
+                serial_order.append(x)
+                return graph[x]
+            batched_order = []
+            def batchEdgeFunc(frontier):
+                batched_order.extend(frontier)
+                return [graph[x] for x in frontier]
+            serial = algorithms.depsCover(nodes, edgeFunc)
+            batched = algorithms.batchedDepsCover(nodes, batchEdgeFunc)
+            self.assertEqual(serial, batched)
+            self.assertEqual(list(dict.fromkeys(serial_order)), batched_order)
+
+
+def reachable(graph, node):
+    return algorithms.depsCover([node], graph.__getitem__)
+
+
+class TestStronglyConnectedComponents(unittest.TestCase):
+    def test_same_as_reachability(self):
+        for seed in range(5):
+            graph = randomGraph(200, 300, seed)
+            components = algorithms.stronglyConnectedComponents(
+                list(graph), graph.__getitem__)
+            self.assertEqual(sorted(x for c in components for x in c),
+                             list(graph))
+            position = {}
+            for i, component in enumerate(components):
+                for x in component:
+                    position[x] = i
+                    # Same component iff mutually reachable.
+                    self.assertEqual(
+                        set(component),
+                        set(y for y in reachable(graph, x)
+                            if x in reachable(graph, y)))
+            for x, adjacent in graph.items():
+                for y in adjacent:
+                    self.assertLessEqual(position[y], position[x])
+
+    def test_cycles(self):
+        graph = {0: [1], 1: [2, 4], 2: [0], 3: [3], 4: [5], 5: [4]}
+        order, cycles = algorithms.topologicalSortedDepsCoverAndCycles(
+            [0], graph.__getitem__)
+        self.assertEqual(order, [5, 4, 2, 1, 0])
+        self.assertEqual(cycles, [[4, 5, 4], [0, 1, 2, 0]])
+        _, cycles = algorithms.topologicalSortedDepsCoverAndCycles(
+            [3], graph.__getitem__)
+        self.assertEqual(cycles, [[3, 3]])
+
+    def test_deep_chain(self):
+        depth = 100000
+        order = algorithms.topologicalSortedDepsCover(
+            [0], lambda x: [x + 1] if x < depth else [])
+        self.assertEqual(order, list(range(depth, -1, -1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
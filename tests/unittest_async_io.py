@@ -0,0 +1,120 @@
+#! /usr/bin/env python3
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import async_io
+from depg import cache
+from depg import prefetcher
+from depg import target_graph_builder
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestConcurrentFileIO(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_read(self):
+        writeFile("a.txt", "abc")
+        file_io = async_io.ConcurrentFileIO(4)
+        output = file_io.readMany(["a.txt", "b.txt"])
+        self.assertEqual(output["a.txt"][1], b"abc")
+        self.assertEqual(output["a.txt"][0].st_size, 3)
+        self.assertIsNone(output["b.txt"])
+        self.assertEqual((file_io.stats['reads'], file_io.stats['bytes']),
+                         (2, 3))
+        file_io.close()
+
+    def test_max_in_flight(self):
+        lock = threading.Lock()
+        counts = dict(current=0, peak=0)
+        def slowCall(file):
+            with lock:
+                counts['current'] += 1
+                counts['peak'] = max(counts['peak'], counts['current'])
+            time.sleep(0.01)
+            with lock:
+                counts['current'] -= 1
+            return file
+        file_io = async_io.ConcurrentFileIO(3)
+        output = asyncio.run(file_io.gather(slowCall, list(range(20))))
+        self.assertEqual(output, dict((x, x) for x in range(20)))
+        self.assertLessEqual(counts['peak'], 3)
+        self.assertLessEqual(file_io.stats['max_in_flight'], 3)
+        file_io.close()
+
+    def test_same_deps(self):
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n#include <vector>\n")
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+        writeFile("src/b.cpp", '#include "src/b.hpp"\n')
+        writeFile("src/c.cpp", '#include "src/b.hpp"\n#include "src/a.hpp"\n')
+        writeFile("src/p.proto", 'import "src/q.proto";\n')
+        writeFile("src/q.proto", 'syntax = "proto3";\n')
+        outputs = []
+        for max_in_flight in (None, 2):
+            configs = depg.getDefaultConfigs()
+            configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+            configs.TOP_DIRECTORY_LIST = ["src"]
+            configs.CACHE_DIRECTORY = "build/cache%s" % max_in_flight
+            configs.IO_MAX_IN_FLIGHT = max_in_flight
+            configs = depg.preprocessConfig(configs)
+            builder = target_graph_builder.TargetGraphBuilder(configs)
+            outputs.append(builder.getDeps(["src/b", "src/c", "src/p.proto"]))
+        self.assertEqual(outputs[0], outputs[1])
+        # The source files of src/b, src/c and src/p.proto.
+        self.assertEqual(builder.file_io.stats['reads'], 4)
+
+    def test_shared_executor(self):
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n")
+        writeFile("src/b.cpp", '#include "src/a.hpp"\n')
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs.IO_MAX_IN_FLIGHT = 2
+        configs.PREFETCH = "read"
+        configs = depg.preprocessConfig(configs)
+        threads = set()
+        def recordThread(func):
+            def wrapper(*args):
+                threads.add((func.__name__, threading.current_thread().name))
+                return func(*args)
+            return wrapper
+        reader_class = prefetcher.ReadAheadPrefetcher
+        with mock.patch.object(cache, "statOrNone",
+                               recordThread(cache.statOrNone)), \
+                mock.patch.object(reader_class, "load",
+                                  recordThread(reader_class.load)):
+            # The first run reads "src/a.hpp" ahead, the second one validates
+            # the cache entries.
+            for _ in range(2):
+                builder = target_graph_builder.TargetGraphBuilder(configs)
+                builder.depsCover(["src/b"])
+        # Both on the threads of `file_io`.
+        self.assertEqual(set(x[0] for x in threads), {"statOrNone", "load"})
+        self.assertTrue(all(x[1].startswith("depg-io") for x in threads))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import build_parallelism
+from depg import target_graph_builder
+from depg.targets import TargetType, DepgTarget
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestBuildParallelism(unittest.TestCase):
+    def test_critical_path(self):
+        target_map = dict((x.name, x) for x in [
+            DepgTarget(name="a", type=TargetType.CPP_SOURCE,
+                       public_deps=["b"], private_deps=["c", "third_party/x"]),
+            DepgTarget(name="b", type=TargetType.CPP_SOURCE,
+                       private_deps=["d"]),
+            DepgTarget(name="c", type=TargetType.CPP_SOURCE,
+                       private_deps=["d"]),
+            DepgTarget(name="d", type=TargetType.CPP_SOURCE),
+            DepgTarget(name="e", type=TargetType.CPP_SOURCE)])
+        weights = dict(a=1, b=2, c=5, d=3, e=4)
+        report = build_parallelism.analyzeParallelism(target_map, weights)
+        self.assertEqual(report.critical_path, [("d", 3), ("c", 5), ("a", 1)])
+        self.assertEqual(report.level_widths, [2, 2, 1])
+        self.assertAlmostEqual(report.getSpeedupLimit(), 15 / 9)
+
+    def test_cycle(self):
+        target_map = dict((x.name, x) for x in [
+            DepgTarget(name="a", type=TargetType.CPP_SOURCE,
+                       public_deps=["b"], private_deps=["third_party/x"]),
+            DepgTarget(name="b", type=TargetType.CPP_SOURCE,
+                       private_deps=["c"]),
+            DepgTarget(name="c", type=TargetType.CPP_SOURCE,
+                       private_deps=["b", "d"]),
+            DepgTarget(name="d", type=TargetType.CPP_SOURCE),
+            DepgTarget(name="e", type=TargetType.CPP_SOURCE,
+                       private_deps=["d"])])
+        weights = dict(a=1, b=2, c=5, d=3, e=4)
+        report = build_parallelism.analyzeParallelism(target_map, weights)
+        # "b" and "c" are weighed as one unit, of one level.
+        self.assertEqual([sorted(x) for x in report.cycles], [["b", "c"]])
+        self.assertEqual(report.critical_path_weight, 11)
+        self.assertEqual(report.critical_path[0], ("d", 3))
+        self.assertEqual(sorted(report.critical_path[1:3]),
+                         [("b", 2), ("c", 5)])
+        self.assertEqual(report.critical_path[3], ("a", 1))
+        self.assertEqual(report.level_widths, [1, 3, 1])
+        self.assertIn("Cycles, each weighed as one unit: 1",
+                      report.getLines())
+
+    def test_weights(self):
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                os.makedirs("src")
+                writeFile("src/a.hpp", "#pragma once\n")
+                writeFile("src/a.cpp", '#include "src/a.hpp"\n')
+                writeFile("src/b.cpp", '#include "src/a.hpp"\n' * 10)
+                writeFile("times.json", json.dumps({"src/a": 2.0}))
+                configs = depg.getDefaultConfigs()
+                configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+                configs.TOP_DIRECTORY_LIST = ["src"]
+                configs = depg.preprocessConfig(configs)
+                builder = target_graph_builder.TargetGraphBuilder(configs)
+                target_map = builder.depsCover(["src/b"])
+                self.assertEqual(
+                    build_parallelism.getTargetWeights(builder, target_map),
+                    (dict([("src/a", 13 + 21), ("src/b", 210)]), "bytes"))
+                # "src/b" is estimated at the seconds per byte of "src/a".
+                weights, unit = build_parallelism.getTargetWeights(
+                    builder, target_map,
+                    build_parallelism.loadCompileTimes("times.json"))
+                self.assertEqual(unit, "seconds")
+                self.assertAlmostEqual(weights["src/b"], 210 * 2.0 / 34)
+            finally:
+                os.chdir(old_cwd)
+
+    def test_cycle_from_sources(self):
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                os.makedirs("src")
+                writeFile("src/a.hpp", "#pragma once\n")
+                writeFile("src/b.hpp", "#pragma once\n")
+                writeFile("src/a.cpp", '#include "src/b.hpp"\n')
+                writeFile("src/b.cpp", '#include "src/a.hpp"\n')
+                configs = depg.getDefaultConfigs()
+                configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+                configs.TOP_DIRECTORY_LIST = ["src"]
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    self.assertEqual(build_parallelism.main(configs, ["src"]),
+                                     0)
+                lines = output.getvalue().splitlines()
+                self.assertIn("Critical path: 2 targets, 68 bytes (100.0% "
+                              "of total)", lines)
+                self.assertIn("Cycles, each weighed as one unit: 1", lines)
+            finally:
+                os.chdir(old_cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,300 @@
+#! /usr/bin/env python3
+
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from concurrent import futures
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import cache
+from depg import common
+from depg import source_deps_parser
+from depg import cache_tool
+from depg import target_graph_builder
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestDepgCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.tmp_dir.name, "a.hpp")
+        writeFile(self.file, '#include "b.hpp"\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def makeCache(self, keys, dump=None):
+        return cache.DepgCache(dump, keys)
+
+    def test_sections_survive_reload(self):
+        keys = dict(includes="k1", deps="k2")
+        c1 = self.makeCache(keys)
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c1.section("deps")[self.file] = [dict(name="b", type=1)]
+        c2 = self.makeCache(keys, c1.export())
+        self.assertEqual(c2.invalidated_sections, [])
+        self.assertEqual(c2.section("includes")[self.file], ["b.hpp"])
+        self.assertIn(self.file, c2.section("deps"))
+
+    def test_per_section_invalidation(self):
+        c1 = self.makeCache(dict(includes="k1", deps="k2"))
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c1.section("deps")[self.file] = [dict(name="b", type=1)]
+        c2 = self.makeCache(dict(includes="k1", deps="k3"), c1.export())
+        self.assertEqual(c2.invalidated_sections, ["deps"])
+        self.assertIn(self.file, c2.section("includes"))
+        self.assertNotIn(self.file, c2.section("deps"))
+
+    def test_schema_version_mismatch(self):
+        keys = dict(includes="k1")
+        c1 = self.makeCache(keys)
+        c1.section("includes")[self.file] = ["b.hpp"]
+        dump = c1.export()
+        dump[cache.DEPG_VERSION_KEY] = cache.CACHE_SCHEMA_VERSION - 1
+        c2 = self.makeCache(keys, dump)
+        self.assertNotIn(self.file, c2.section("includes"))
+
+    def test_touched_file_hashed_once(self):
+        keys = dict(includes="k1", deps="k2")
+        c1 = self.makeCache(keys)
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c1.section("deps")[self.file] = [dict(name="b", type=1)]
+        stat_result = os.stat(self.file)
+        os.utime(self.file, (stat_result.st_atime, stat_result.st_mtime + 10))
+        c2 = self.makeCache(keys, c1.export())
+        calls = []
+        policy_class = cache.FingerprintPolicy
+        old_checksum = policy_class.getFileChecksum
+        policy_class.getFileChecksum = \
+            lambda policy, f: calls.append(f) or old_checksum(policy, f)
+        try:
+            self.assertEqual(c2.section("deps")[self.file], [dict(name="b", type=1)])
+            self.assertEqual(c2.section("includes")[self.file], ["b.hpp"])
+        finally:
+            policy_class.getFileChecksum = old_checksum
+        self.assertEqual(calls, [self.file])
+        # Entries are refreshed with the new stat key.
+        c3 = self.makeCache(keys, c2.export())
+        policy = c3.section("includes").fingerprint_policy
+        self.assertEqual(c3.section("includes").data[self.file]['stat'],
+                         policy.getStatKey(os.stat(self.file)))
+
+    def test_fingerprint_policies(self):
+        for name in cache.FINGERPRINT_POLICIES:
+            policy = cache.getFingerprintPolicy(name)
+            c1 = cache.InMemoryFileValueCache(fingerprint_policy=policy)
+            c1[self.file] = 11
+            c2 = cache.InMemoryFileValueCache(
+                json.loads(json.dumps(c1.export())), fingerprint_policy=policy)
+            self.assertEqual(c2.get(self.file), 11)
+            stat_result = os.stat(self.file)
+            writeFile(self.file, '#include "c.hpp"\n')
+            # Same size, so make sure that the edit is visible in mtime.
+            os.utime(self.file, (stat_result.st_atime, stat_result.st_mtime + 1))
+            c3 = cache.InMemoryFileValueCache(c1.export(),
+                                              fingerprint_policy=policy)
+            self.assertNotIn(self.file, c3)
+            writeFile(self.file, '#include "b.hpp"\n')
+
+    def test_section_key_depends_on_configs(self):
+        spec = dict(code=["source_deps_parser.py"], configs=["INCLUDE_PATHS"])
+        key1 = cache.getSectionKey(spec, dict(INCLUDE_PATHS=["."]))
+        key2 = cache.getSectionKey(spec, dict(INCLUDE_PATHS=[".", "src"]))
+        self.assertNotEqual(key1, key2)
+        self.assertEqual(key1, cache.getSectionKey(
+            spec, dict(INCLUDE_PATHS=["."], OTHER=1)))
+
+    def test_concurrent_stores_merge(self):
+        keys = dict(includes="k1")
+        other_file = os.path.join(self.tmp_dir.name, "b.hpp")
+        writeFile(other_file, "")
+        cache_directory = os.path.join(self.tmp_dir.name, "cache")
+        c1 = self.makeCache(keys)
+        c2 = self.makeCache(keys)
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c2.section("includes")[other_file] = []
+        target_graph_builder.storeCache(cache_directory, c1)
+        target_graph_builder.storeCache(cache_directory, c2)
+        c3 = self.makeCache(keys, target_graph_builder.loadCacheData(
+            target_graph_builder.getCacheFile(cache_directory)))
+        self.assertEqual(c3.section("includes")[self.file], ["b.hpp"])
+        self.assertEqual(c3.section("includes")[other_file], [])
+
+    def test_stored_file_mode(self):
+        cache_directory = os.path.join(self.tmp_dir.name, "cache")
+        file = target_graph_builder.getCacheFile(cache_directory)
+        c1 = self.makeCache(dict(includes="k1"))
+        c1.section("includes")[self.file] = ["b.hpp"]
+        target_graph_builder.storeCache(cache_directory, c1)
+        # A regular file's mode, not mkstemp's 0600.
+        self.assertEqual(os.stat(file).st_mode & 0o777,
+                         0o666 & ~common._UMASK)
+        # The mode of the replaced file is kept.
+        os.chmod(file, 0o664)
+        c1.section("includes")[self.file] = []
+        target_graph_builder.storeCache(cache_directory, c1)
+        self.assertEqual(os.stat(file).st_mode & 0o777, 0o664)
+
+    def test_max_bytes(self):
+        files = []
+        for i in range(500):
+            files.append(os.path.join(self.tmp_dir.name, "f%d.hpp" % i))
+            writeFile(files[-1], "")
+        for backend in target_graph_builder.CACHE_BACKENDS:
+            configs = depg.getDefaultConfigs()
+            configs.CACHE_DIRECTORY = os.path.join(self.tmp_dir.name,
+                                                   "cache_" + backend)
+            configs.CACHE_BACKEND = backend
+            c1 = target_graph_builder.loadCache(configs)
+            for file in files:
+                c1.section("includes")[file] = ["src/x.hpp"] * 5
+            target_graph_builder.storeCache(configs.CACHE_DIRECTORY, c1)
+            target_graph_builder.storeRunStats(configs.CACHE_DIRECTORY, c1)
+            if backend == "sqlite":
+                c1.checkpoint()
+            configs.CACHE_MAX_BYTES = int(0.8 * target_graph_builder.
+                                          getCacheDiskSize(
+                                              configs.CACHE_DIRECTORY))
+            self.assertGreater(
+                target_graph_builder.enforceCacheLimits(configs, c1), 0)
+            # The stored cache is within the bound, so the next run doesn't
+            # evict again.
+            self.assertLessEqual(target_graph_builder.getCacheDiskSize(
+                configs.CACHE_DIRECTORY), configs.CACHE_MAX_BYTES)
+            self.assertEqual(
+                target_graph_builder.enforceCacheLimits(configs, c1), 0)
+            if backend == "sqlite":
+                c1.close()
+
+    def test_prune_and_evict(self):
+        keys = dict(includes="k1")
+        c1 = self.makeCache(keys)
+        files = []
+        for i in range(4):
+            files.append(os.path.join(self.tmp_dir.name, "f%d.hpp" % i))
+            writeFile(files[-1], "")
+            c1.section("includes")[files[-1]] = []
+        os.remove(files[0])
+        self.assertEqual(cache.pruneEntries(c1, cache.isEntryMissing),
+                         dict(includes=1))
+        c2 = self.makeCache(keys, c1.export())
+        self.assertEqual(c2.section("includes").getEntryCount(), 3)
+        # f1 is the least recently used.
+        c2.section("includes").data[files[1]]['accessed'] = 0
+        self.assertEqual(cache.evictLeastRecentlyUsed(c2, max_entries=2), 1)
+        self.assertNotIn(files[1], c2.section("includes"))
+        self.assertIn(files[2], c2.section("includes"))
+
+    def test_validate_entries(self):
+        keys = dict(includes="k1", deps="k2")
+        c1 = self.makeCache(keys)
+        files = []
+        for i in range(4):
+            files.append(os.path.join(self.tmp_dir.name, "f%d.hpp" % i))
+            writeFile(files[-1], "x")
+            c1.section("includes")[files[-1]] = []
+        c2 = self.makeCache(keys, c1.export())
+        os.utime(files[1], ns=(0, 0))  # Touched.
+        writeFile(files[2], "y")       # Changed.
+        os.remove(files[3])
+        with futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual(cache.validateEntries(c2, files, executor), (2, 1))
+        self.assertEqual(sorted(c2.section("includes").current_fingerprints),
+                         files[:3])
+        self.assertIn(files[1], c2.section("includes"))
+        self.assertNotIn(files[2], c2.section("includes"))
+
+
+class TestCacheCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n")
+        writeFile("src/b.cpp", '#include "src/a.hpp"\n#include "src/c.hpp"\n')
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_stored_on_error(self):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs = depg.preprocessConfig(configs)
+        builder = target_graph_builder.TargetGraphBuilder(configs)
+        with self.assertRaisesRegex(Exception, "Unrecognized Header"):
+            builder.depsCover(["src/b"])
+        self.assertEqual(builder.num_checkpoints, 1)
+        # The includes scanned before the failure survive.
+        c = target_graph_builder.loadCache(configs)
+        self.assertEqual(c.section("includes")["src/b.cpp"],
+                         ["src/a.hpp", "src/c.hpp"])
+        writeFile("src/c.hpp", "#pragma once\n")
+        builder = target_graph_builder.TargetGraphBuilder(configs)
+        builder.depsCover(["src/b"])
+        # Only the headers are scanned, src/b.cpp is found in cache.
+        self.assertEqual(
+            builder.source_deps_cache.section("includes").stats['misses'], 2)
+
+    def test_warm_resumes(self):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), \
+                contextlib.redirect_stderr(io.StringIO()):
+            self.assertEqual(
+                cache_tool.main(configs, ["warm", "--nice", "0"]), 0)
+        c = target_graph_builder.loadCache(configs)
+        self.assertEqual(c.section("includes")["src/a.hpp"], [])
+        self.assertEqual(sorted(c.section("includes").data),
+                         ["src/a.hpp", "src/b.cpp"])
+        writeFile("src/c.hpp", "#pragma once\n")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), \
+                contextlib.redirect_stderr(io.StringIO()):
+            cache_tool.main(configs, ["warm", "--nice", "0"])
+        # Only the new file is scanned.
+        self.assertTrue(output.getvalue().startswith(
+            "Warmed up: 3/3 files, 1 scanned"), output.getvalue())
+
+    def test_warm_protos(self):
+        writeFile("src/p.proto", 'import "src/q.proto";\n')
+        writeFile("src/q.proto", 'syntax = "proto3";\n')
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs.IO_MAX_IN_FLIGHT = 2
+        parser_class = source_deps_parser.SourceDepsParser
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(io.StringIO()), \
+                mock.patch.object(parser_class, "scanManyProtos", autospec=True,
+                                  side_effect=parser_class.scanManyProtos) \
+                as scan:
+            self.assertEqual(
+                cache_tool.main(configs, ["warm", "--nice", "0"]), 0)
+        # The protos are scanned as one batch.
+        self.assertEqual([sorted(x.args[1]) for x in scan.call_args_list],
+                         [["src/p.proto", "src/q.proto"]])
+        c = target_graph_builder.loadCache(configs)
+        self.assertEqual(c.section("includes")["src/p.proto"], ["src/q.proto"])
+
+
+if __name__ == '__main__':
+    unittest.main()
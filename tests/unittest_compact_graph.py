@@ -0,0 +1,195 @@
+#! /usr/bin/env python3
+
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import affected_targets
+from depg import algorithms
+from depg import compact_graph
+from depg.targets import TargetType, DepgTarget
+
+
+def randomTargetMap(num_targets, num_deps, seed=0):
+    rng = random.Random(seed)
+    names = ["dir/t%d" % i for i in range(num_targets)]
+    target_map = {}
+    for name in names:
+        target = DepgTarget(name=name, type=TargetType.CPP_SOURCE)
+        deps = list(dict.fromkeys(rng.choice(names) for _ in range(num_deps)))
+        if len(deps) > 1:
+            target.public_deps = deps[:len(deps) // 2]
+            target.private_deps = deps[len(deps) // 2:]
+        target_map[name] = target
+    return target_map
+
+
+def edgeFunc(target_map):
+    return lambda x: (target_map[x].get('public_deps', []) +
+                      target_map[x].get('private_deps', []))
+
+
+class TestCompactGraph(unittest.TestCase):
+    def test_round_trip(self):
+        target_map = randomTargetMap(100, 3)
+        target_map["dir/t0"].public_deps.append("third_party/x")
+        graph = compact_graph.fromTargetMap(target_map)
+        # The unknown dep is a node, but not a target.
+        self.assertEqual(graph.getNumNodes(), 101)
+        self.assertEqual(graph.toTargetMap(), target_map)
+
+    def test_same_as_algorithms(self):
+        for seed in range(5):
+            target_map = randomTargetMap(300, 3, seed)
+            graph = compact_graph.fromTargetMap(target_map)
+            roots = ["dir/t0", "dir/t7", "dir/t100"]
+            self.assertEqual(
+                graph.depsCover(roots),
+                algorithms.depsCover(roots, edgeFunc(target_map)))
+            self.assertEqual(
+                graph.stronglyConnectedComponents(roots),
+                algorithms.stronglyConnectedComponents(
+                    roots, edgeFunc(target_map)))
+
+    def test_topological_sort(self):
+        target_map = dict((x.name, x) for x in [
+            DepgTarget(name="a", type=TargetType.CPP_SOURCE,
+                       public_deps=["b"], private_deps=["c"]),
+            DepgTarget(name="b", type=TargetType.CPP_SOURCE,
+                       private_deps=["c"]),
+            DepgTarget(name="c", type=TargetType.CPP_SOURCE)])
+        graph = compact_graph.fromTargetMap(target_map)
+        self.assertEqual(graph.topologicalSortedDepsCover(["a"]),
+                         ["c", "b", "a"])
+        target_map["c"].public_deps = ["a"]
+        graph = compact_graph.fromTargetMap(target_map)
+        with self.assertRaisesRegex(AssertionError, "Cycle"):
+            graph.topologicalSortedDepsCover(["a"])
+
+    def test_reversed_and_serialized(self):
+        target_map = randomTargetMap(100, 4)
+        graph = compact_graph.fromTargetMap(target_map)
+        reverse, metadata = compact_graph.fromBytes(
+            graph.getReversed().toBytes(dict(key="k")))
+        self.assertEqual(metadata, dict(key="k"))
+        for name, target in target_map.items():
+            public_deps, private_deps = reverse.getDeps(name)
+            self.assertEqual(
+                sorted(public_deps),
+                sorted(x for x, y in target_map.items()
+                       if name in y.get('public_deps', [])))
+            self.assertEqual(
+                sorted(private_deps),
+                sorted(x for x, y in target_map.items()
+                       if name in y.get('private_deps', [])))
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+def getSortedDeps(reverse_index):
+    """Target -> (type, sorted public deps, sorted private deps)."""
+    target_map = reverse_index.getReversed().toTargetMap()
+    return dict((x, (y.type, sorted(y.get('public_deps', [])),
+                     sorted(y.get('private_deps', []))))
+                for x, y in target_map.items())
+
+
+class TestAffectedTargets(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n")
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+        writeFile("src/b_test.cpp", '#include "src/b.hpp"\n')
+        writeFile("src/c.hpp", "#pragma once\n")
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_affected(self):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs = depg.preprocessConfig(configs)
+        self.assertEqual(
+            affected_targets.affectedTargets(configs, ["src/a.hpp"]),
+            ["src/a", "src/b", "src/b_test"])
+        self.assertIsNotNone(affected_targets.loadReverseIndex(configs))
+        # Deleted file, new file.
+        os.remove("src/b.hpp")
+        writeFile("src/d.hpp", '#include "src/c.hpp"\n')
+        self.assertEqual(
+            affected_targets.affectedTargets(
+                configs, ["src/b.hpp", "src/d.hpp"], test_only=True),
+            ["src/b_test"])
+
+    def test_changed_tree(self):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs = depg.preprocessConfig(configs)
+        self.assertEqual(
+            affected_targets.affectedTargets(configs, ["src/c.hpp"]),
+            ["src/c"])
+        # Files not among the queried paths now depend on "src/c.hpp": a
+        # changed file, a new file of a target and a new target.
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n#include "src/c.hpp"\n')
+        writeFile("src/a.cpp", '#include "src/e.hpp"\n')
+        writeFile("src/e.hpp", '#include "src/c.hpp"\n')
+        reverse_index, fingerprints = affected_targets.loadReverseIndex(
+            configs)
+        self.assertEqual(sorted(affected_targets.getChangedFiles(
+            reverse_index, fingerprints, configs)), ["src/a.cpp", "src/b.hpp"])
+        self.assertEqual(
+            affected_targets.affectedTargets(configs, ["src/c.hpp"]),
+            ["src/a", "src/b", "src/b_test", "src/c", "src/e"])
+        # Same as the index built from scratch.
+        patched, fingerprints = affected_targets.loadReverseIndex(configs)
+        self.assertIn("src/e.hpp", fingerprints)
+        rebuilt = affected_targets.buildReverseIndex(configs)
+        self.assertEqual(getSortedDeps(patched), getSortedDeps(rebuilt))
+
+    def test_trust_paths(self):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache"
+        configs = depg.preprocessConfig(configs)
+        affected_targets.affectedTargets(configs, ["src/c.hpp"])
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n#include "src/c.hpp"\n')
+        writeFile("src/a.cpp", '#include "src/c.hpp"\n')
+        reverse_index, fingerprints = affected_targets.loadReverseIndex(
+            configs)
+        # Only the given paths are checked.
+        self.assertEqual(affected_targets.getChangedFilesIn(
+            reverse_index, fingerprints, ["src/a.cpp", "src/c.hpp"], configs),
+                         ["src/a.cpp"])
+        self.assertEqual(sorted(affected_targets.getChangedFilesIn(
+            reverse_index, fingerprints, ["src"], configs)),
+                         ["src/a.cpp", "src/b.hpp"])
+        self.assertEqual(
+            affected_targets.affectedTargets(configs, ["src/a.cpp"],
+                                             trust_paths=True),
+            ["src/a", "src/b", "src/b_test"])
+        # The change of "src/b.hpp" wasn't seen.
+        reverse_index, fingerprints = affected_targets.loadReverseIndex(
+            configs)
+        self.assertEqual(affected_targets.getChangedFiles(
+            reverse_index, fingerprints, configs), ["src/b.hpp"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import algorithms
+from depg import deps_reduction
+from depg.targets import TargetType, DepgTarget
+from depg.tests.unittest_compact_graph import randomTargetMap
+
+
+def visibleTargets(target_map, name):
+    """Return the tuple (targets visible to @name, targets it exports)."""
+    def publicCover(deps):
+        return algorithms.depsCover(deps, lambda x: target_map[x].get(
+            'public_deps', []) if x in target_map else [])
+    target = target_map[name]
+    exported = publicCover(target.get('public_deps', []))
+    return exported | publicCover(target.get('private_deps', [])), exported
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestDepsReduction(unittest.TestCase):
+    def test_visibility(self):
+        target_map = dict((x.name, x) for x in [
+            DepgTarget(name="a", type=TargetType.CPP_SOURCE,
+                       public_deps=["b", "c"], private_deps=["d", "e"]),
+            DepgTarget(name="b", type=TargetType.CPP_SOURCE,
+                       public_deps=["c"], private_deps=["e"]),
+            DepgTarget(name="c", type=TargetType.CPP_SOURCE,
+                       public_deps=["d"]),
+            DepgTarget(name="d", type=TargetType.CPP_SOURCE),
+            DepgTarget(name="e", type=TargetType.CPP_SOURCE)])
+        output, num_removed = deps_reduction.reduceDeps(target_map)
+        self.assertEqual(num_removed, 2)
+        # "c" comes from "b", "d" from "c" and "e" (private in "b") stays.
+        self.assertEqual(output["a"].public_deps, ["b"])
+        self.assertEqual(output["a"].private_deps, ["e"])
+        self.assertEqual(target_map["a"].public_deps, ["b", "c"])
+
+    def test_same_visible_targets(self):
+        for seed in range(5):
+            target_map = randomTargetMap(200, 4, seed)
+            output, num_removed = deps_reduction.reduceDeps(target_map)
+            self.assertGreater(num_removed, 0)
+            for name in target_map:
+                self.assertEqual(visibleTargets(output, name),
+                                 visibleTargets(target_map, name))
+
+    def test_same_output_for_any_paths(self):
+        old_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                os.makedirs("src")
+                writeFile("src/a.hpp", "#pragma once\n")
+                writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+                writeFile("src/c.cpp",
+                          '#include "src/a.hpp"\n#include "src/b.hpp"\n')
+                outputs = []
+                for paths in (["src/c.cpp"], ["src"]):
+                    configs = depg.getDefaultConfigs()
+                    configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+                    configs.TOP_DIRECTORY_LIST = ["src"]
+                    configs.TRANSITIVE_REDUCTION = True
+                    configs.PRINT_RUN_SUMMARY = False
+                    build_files_map = depg.Depg(
+                        tmp_dir, configs).autoGenBuildFileMap(paths)
+                    outputs.append(build_files_map["src/BUILD"])
+                # "src/a" is visible through "src/b".
+                self.assertEqual(outputs[0]["c"]["private_deps"], [":b"])
+                self.assertEqual(outputs[0]["c"], outputs[1]["c"])
+                # The deps are declarations only.
+                self.assertNotIn("public_deps", outputs[0]["b"])
+                self.assertEqual(outputs[1]["b"]["public_deps"], [":a"])
+            finally:
+                os.chdir(old_cwd)
+
+
+if __name__ == '__main__':
+    unittest.main()
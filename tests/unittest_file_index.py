@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg.file_index import FileIndex
+from depg import target_graph_builder
+
+
+class TestFileIndex(unittest.TestCase):
+    FILES = ["a/x.hpp", "a/x.cpp", "a/b/y.h", "a/exp/z.hpp", "a/forbidden/w.h",
+             "other/o.hpp", "top.hpp"]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.old_cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        for file in self.FILES:
+            os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+            open(file, "w").close()
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_same_as_isfile(self):
+        index = FileIndex(["a"], set(["a/forbidden"]), set(["a/exp"]))
+        queries = self.FILES + ["a/x.h", "a/b/none.h", "./a/x.hpp", "a/b",
+                                "a/b/../x.cpp", "../a/x.hpp", "missing/x.h"]
+        for query in queries:
+            self.assertEqual(index.isFile(query), os.path.isfile(query), query)
+        self.assertEqual(index.existingExtensions("a/x", (".h", ".hpp", ".cpp")),
+                         [".hpp", ".cpp"])
+
+    def test_lookups_served_from_index(self):
+        index = FileIndex(["a"], set(), set(["a/exp"]))
+        index.isFile("a/x.hpp")
+        index.isFile("a/missing.hpp")
+        self.assertEqual(index.stats['lookups'], 2)
+        self.assertEqual(index.stats['fallbacks'], 0)
+        index.isFile("a/exp/z.hpp")
+        index.isFile("top.hpp")
+        self.assertEqual(index.stats['fallbacks'], 2)
+
+    def test_list_directory_recursive(self):
+        os.symlink("b", "a/link")
+        forbidden, ignored = set(["a/forbidden", "a/x.cpp"]), set(["a/exp"])
+        expected = []
+        for root, _, files in os.walk("a"):
+            if root not in ["a/forbidden", "a/exp"]:
+                expected.extend(root + "/" + x for x in files
+                                if root + "/" + x != "a/x.cpp")
+        for workers in (1, 3):
+            self.assertEqual(target_graph_builder.listDirectoryRecursive(
+                "a", forbidden, ignored, workers), expected)
+        # Ignored, unless asked. Forbidden, even if asked.
+        self.assertEqual(target_graph_builder.listDirectoryRecursive(
+            "a/exp", forbidden, ignored), ["a/exp/z.hpp"])
+        self.assertEqual(target_graph_builder.listDirectoryRecursive(
+            "a/forbidden/w.h", forbidden, ignored), [])
+        self.assertEqual(sorted(target_graph_builder.listDirectoryRecursive(
+            ".", forbidden, set(["other"]), 2)),
+                         sorted(set(expected + ["top.hpp", "a/exp/z.hpp"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg.default_configs import getDefaultConfigs
+from depg.file_index import FileIndex
+from depg.header_resolver import HeaderResolver
+from depg import utils
+
+
+class TestHeaderResolver(unittest.TestCase):
+    FILES = ["a/common.hpp", "a/x.cpp", "b/common.hpp", "b/y.cpp",
+             "inc/lib.hpp", "c/z.cpp"]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.old_cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        for file in self.FILES:
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            open(file, "w").close()
+        configs = getDefaultConfigs()
+        configs.INCLUDE_PATHS = [".", "inc"]
+        self.resolver = HeaderResolver(
+            set(["vector"]), {"glog/": "third_party/glog"}, lambda x: None,
+            configs, FileIndex(["."], set(), set()))
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def resolveName(self, header, source_file):
+        target = self.resolver.resolve(header, source_file)
+        return None if target is None else target['name']
+
+    def test_relative_includes_depend_on_directory(self):
+        self.assertEqual(self.resolveName("common.hpp", "a/x.cpp"), "a/common")
+        self.assertEqual(self.resolveName("common.hpp", "b/y.cpp"), "b/common")
+        self.assertEqual(self.resolveName("../a/common.hpp", "b/y.cpp"),
+                         "a/common")
+
+    def test_include_paths_and_prefixes(self):
+        self.assertEqual(self.resolveName("lib.hpp", "a/x.cpp"), "inc/lib")
+        self.assertEqual(self.resolveName("a/common.hpp", "c/z.cpp"), "a/common")
+        self.assertEqual(self.resolveName("glog/logging.h", "a/x.cpp"),
+                         "third_party/glog")
+        self.assertIsNone(self.resolveName("vector", "a/x.cpp"))
+        with self.assertRaises(Exception):
+            self.resolver.resolve("common.hpp", "c/z.cpp")
+
+
+class TestPathTrie(unittest.TestCase):
+    def test_longest_prefix(self):
+        trie = utils.PathTrie([("a", 1), ("a/b", 2), ("x/y.h", 3)])
+        self.assertEqual(trie.longestPrefixValue("a/b/c.h"), 2)
+        self.assertEqual(trie.longestPrefixValue("a/bc.h"), 1)
+        self.assertEqual(trie.longestPrefixValue("x/y.h"), 3)
+        self.assertIsNone(trie.longestPrefixValue("ab/c.h"))
+
+    def test_walk(self):
+        trie = utils.PathTrie([("a/b", 2), ("a/b/c", 3)])
+        node = trie.getNode("a")
+        self.assertIsNone(utils.PathTrie.getValue(node))
+        node = utils.PathTrie.getChild(node, "b")
+        self.assertEqual(utils.PathTrie.getValue(node), 2)
+        self.assertIsNone(utils.PathTrie.getChild(node, "x"))
+        self.assertIsNone(utils.PathTrie.getChild(None, "x"))
+        self.assertIs(trie.getNode(""), trie.root)
+        self.assertIsNone(trie.getNode("a/x"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import prefetcher
+from depg import source_deps_parser
+from depg import target_graph_builder
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class GatedPrefetcher(prefetcher.ReadAheadPrefetcher):
+    """Reads a file only once `gate` is set."""
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def load(self, file):
+        self.started.set()
+        self.gate.wait()
+        return super().load(file)
+
+
+class TestReadAheadPrefetcher(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def test_read_mode(self):
+        writeFile("a.hpp", "a" * 10)
+        writeFile("b.hpp", "b" * 10)
+        writeFile("c.hpp", "c" * 10)
+        reader = prefetcher.ReadAheadPrefetcher("read", 25)
+        for file in ["a.hpp", "b.hpp", "c.hpp", "missing.hpp"]:
+            reader.prefetch(file)
+            future = reader.loading.get(file)
+            if future is not None:
+                future.result()
+        # "a.hpp" is evicted, to stay within 25 bytes.
+        self.assertEqual(list(reader.buffers), ["b.hpp", "c.hpp"])
+        self.assertIsNone(reader.take("a.hpp"))
+        stat_result, content = reader.take("b.hpp")
+        self.assertEqual((stat_result.st_size, content), (10, b"b" * 10))
+        self.assertIsNone(reader.take("x.hpp"))
+        self.assertEqual((reader.stats['hits'], reader.stats['misses'],
+                          reader.stats['evicted']), (1, 2, 1))
+        reader.close()
+
+    def test_take_in_flight(self):
+        writeFile("a.hpp", "a" * 10)
+        writeFile("b.hpp", "b" * 10)
+        with mock.patch.object(prefetcher, "NUM_THREADS", 1):
+            reader = GatedPrefetcher("read", 100)
+            reader.prefetch("a.hpp")
+            reader.prefetch("b.hpp")
+        reader.started.wait()
+        # "b.hpp" is still queued: cancelled, the scanner reads it.
+        self.assertIsNone(reader.take("b.hpp"))
+        # "a.hpp" is being read: waited for, and not read again.
+        threading.Timer(0.05, reader.gate.set).start()
+        stat_result, content = reader.take("a.hpp")
+        self.assertEqual((stat_result.st_size, content), (10, b"a" * 10))
+        self.assertEqual((reader.stats['waited'], reader.stats['late']),
+                         (1, 1))
+        self.assertEqual(len(reader.buffers), 0)
+        reader.close()
+
+    def test_same_deps(self):
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n#include <vector>\n")
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+        writeFile("src/b.cpp", '#include "src/b.hpp"\n')
+        writeFile("src/c.cpp", '#include "src/b.hpp"\n#include "src/a.hpp"\n')
+        outputs = []
+        for mode in (None, "read", "fadvise"):
+            configs = depg.getDefaultConfigs()
+            configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+            configs.TOP_DIRECTORY_LIST = ["src"]
+            configs.CACHE_DIRECTORY = "build/cache_%s" % mode
+            configs.SCAN_WORKERS = 1
+            configs.PREFETCH = mode
+            configs = depg.preprocessConfig(configs)
+            builder = target_graph_builder.TargetGraphBuilder(configs)
+            outputs.append(builder.depsCover(["src/c"]))
+            if mode is not None:
+                stats = builder.prefetcher.stats
+                # Every scanned file is accounted, "src/a.hpp" and
+                # "src/b.hpp" were queued when resolved.
+                self.assertEqual(stats['queued'], 2)
+                self.assertEqual(stats['hits'] + stats['waited'] +
+                                 stats['late'] + stats['misses'], 4)
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+    def test_scan_processes(self):
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n")
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+        writeFile("src/b.cpp", '#include "src/b.hpp"\n')
+        writeFile("src/c.cpp", '#include "src/b.hpp"\n#include "src/a.hpp"\n')
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = None
+        configs.SCAN_WORKERS = 2
+        configs.SCAN_POOL_MIN_FILES = 1
+        configs.SCAN_EXECUTOR = "process"
+        configs.PREFETCH = "read"
+        configs = depg.preprocessConfig(configs)
+        builder = target_graph_builder.TargetGraphBuilder(configs)
+        builder.prefetcher.prefetch("src/a.hpp")
+        with mock.patch.object(
+                source_deps_parser.futures, "ProcessPoolExecutor",
+                wraps=source_deps_parser.futures.ProcessPoolExecutor) as pool:
+            output = builder.depsCover(["src/c"])
+        self.assertEqual(sorted(output), ["src/a", "src/b", "src/c"])
+        # The workers aren't forked from a process running the prefetcher.
+        context = pool.call_args.kwargs['mp_context']
+        self.assertNotEqual(context.get_start_method(), "fork")
+
+
+if __name__ == '__main__':
+    unittest.main()
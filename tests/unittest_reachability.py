@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg import algorithms
+from depg import compact_graph
+from depg import reachability
+from depg.targets import TargetType, DepgTarget
+
+
+def randomTargetMap(num_targets, num_deps, seed=0):
+    rng = random.Random(seed)
+    names = ["t%d" % i for i in range(num_targets)]
+    target_map = {}
+    for name in names:
+        deps = [rng.choice(names) for _ in range(rng.randrange(num_deps))]
+        target_map[name] = DepgTarget(name=name, type=TargetType.CPP_SOURCE,
+                                      public_deps=list(dict.fromkeys(deps)))
+    return target_map
+
+
+class TestReachabilityIndex(unittest.TestCase):
+    def test_same_as_deps_cover(self):
+        for seed in range(3):
+            target_map = randomTargetMap(150, 3, seed)
+            index = reachability.ReachabilityIndex(
+                compact_graph.fromTargetMap(target_map))
+            edge_func = lambda x: target_map[x].public_deps
+            for a in target_map:
+                deps = set()
+                for x in edge_func(a):
+                    deps |= algorithms.depsCover([x], edge_func)
+                self.assertEqual(index.getTransitiveDeps(a), sorted(deps))
+                for b in ["t0", "t1", a]:
+                    self.assertEqual(index.dependsOn(a, b), b in deps)
+                    path = index.findPath(a, b)
+                    if b not in deps:
+                        self.assertIsNone(path)
+                        continue
+                    self.assertEqual((path[0], path[-1]), (a, b))
+                    for x, y in zip(path, path[1:]):
+                        self.assertIn(y, edge_func(x))
+
+    def test_set_bits(self):
+        self.assertEqual(reachability.getSetBits(0), [])
+        self.assertEqual(reachability.getSetBits(0b101001), [0, 3, 5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#! /usr/bin/env python3
+
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg import cache
+from depg import shared_cache
+from depg.source_deps_parser import SourceDepsParser
+from depg.default_configs import getDefaultConfigs
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestSharedScanCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.shared_dir = os.path.join(self.tmp_dir.name, "shared")
+        self.checksum = "ab" + "0" * 30
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_publish_and_read_only(self):
+        c1 = shared_cache.SharedScanCache(self.shared_dir, "ns")
+        c1.put("cpp", self.checksum, ["b.hpp"])
+        self.assertIsNone(c1.get("proto", self.checksum))
+        c1.flush()
+        self.assertEqual(c1.stats['published'], 1)
+        c2 = shared_cache.SharedScanCache(self.shared_dir, "ns", read_only=True)
+        self.assertEqual(c2.get("cpp", self.checksum), ["b.hpp"])
+        c2.put("cpp", "cd" + "0" * 30, ["c.hpp"])
+        c2.flush()
+        shard_files = os.listdir(os.path.join(self.shared_dir, "ns"))
+        self.assertEqual(sorted(shard_files), ["ab.json", "ab.json.lock"])
+
+    def test_http_store(self):
+        server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), shared_cache.makeRequestHandler(self.shared_dir))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            url = "http://127.0.0.1:%d" % server.server_address[1]
+            c1 = shared_cache.SharedScanCache(url, "0123")
+            self.assertIsNone(c1.get("cpp", self.checksum))
+            c1.put("cpp", self.checksum, ["b.hpp"])
+            c1.flush()
+            c2 = shared_cache.SharedScanCache(url, "0123")
+            self.assertEqual(c2.get("cpp", self.checksum), ["b.hpp"])
+            self.assertEqual(c2.stats['errors'], 0)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_parser_hits_moved_file(self):
+        configs = getDefaultConfigs()
+        configs.SCAN_WORKERS = 1
+        files = []
+        for name in ("a.hpp", "moved_a.hpp"):
+            files.append(os.path.join(self.tmp_dir.name, name))
+            writeFile(files[-1], '#include "b.hpp"\n')
+        for file in files:
+            shared = shared_cache.SharedScanCache(self.shared_dir, "ns")
+            parser = SourceDepsParser(
+                set(), {}, None, None, configs,
+                cache.InMemoryFileValueCache(), shared_cache=shared)
+            self.assertEqual(parser.cppSourceToIncludes(file), ["b.hpp"])
+            shared.flush()
+        # Scanned once, then found by content.
+        self.assertEqual(shared.stats['hits'], 1)
+
+    def test_parser_scan_many(self):
+        configs = getDefaultConfigs()
+        configs.SCAN_WORKERS = 2
+        configs.SCAN_POOL_MIN_FILES = 2
+        files = []
+        for i in range(40):
+            files.append(os.path.join(self.tmp_dir.name, "f%d.hpp" % i))
+            writeFile(files[-1], '#include "h%d.hpp"\n' % i)
+        proto_file = os.path.join(self.tmp_dir.name, "a.proto")
+        writeFile(proto_file, 'import "b.proto";\n')
+        outputs = []
+        for scanned in (files[:10], files):
+            shared = shared_cache.SharedScanCache(self.shared_dir, "ns")
+            parser = SourceDepsParser(
+                set(), {}, None, None, configs,
+                cache.InMemoryFileValueCache(), shared_cache=shared)
+            outputs.append(parser.scanMany(scanned))
+            self.assertEqual(parser.protoSourceToImports(proto_file),
+                             ["b.proto"])
+            parser.close()
+            shared.flush()
+        self.assertEqual(outputs[1], dict(
+            (x, ["h%d.hpp" % i]) for i, x in enumerate(files)))
+        # The files of the first run and the proto file are found.
+        self.assertEqual((shared.stats['hits'], shared.stats['misses']),
+                         (11, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
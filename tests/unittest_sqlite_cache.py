@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+from depg import cache
+from depg import sqlite_cache
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestSqliteDepgCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp_dir.name, "cache.sqlite")
+        self.json_file = os.path.join(self.tmp_dir.name, "cache.json")
+        self.file = os.path.join(self.tmp_dir.name, "a.hpp")
+        writeFile(self.file, '#include "b.hpp"\n')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def makeCache(self, keys):
+        return sqlite_cache.SqliteDepgCache(self.db_file, keys,
+                                            json_file=self.json_file)
+
+    def test_only_dirty_entries_written(self):
+        keys = dict(includes="k1", deps="k2")
+        c1 = self.makeCache(keys)
+        c1.section("includes")[self.file] = ["b.hpp"]
+        self.assertEqual(len(c1.section("includes").popDirtyRows()), 1)
+        c1.section("deps")[self.file] = [dict(name="b", type=1)]
+        c1.commit()
+        c1.close()
+        c2 = self.makeCache(keys)
+        self.assertEqual(c2.section("includes").data, {})
+        self.assertNotIn(self.file, c2.section("includes"))
+        self.assertEqual(c2.section("deps")[self.file], [dict(name="b", type=1)])
+        self.assertEqual(c2.section("deps").dirty, set())
+        c2.close()
+
+    def test_journal_mode(self):
+        keys = dict(includes="k1")
+        c1 = sqlite_cache.SqliteDepgCache(self.db_file, keys,
+                                          journal_mode="DELETE")
+        self.assertEqual(c1.journal_mode, "DELETE")
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c1.commit()
+        # No shared memory file, as required on network filesystems.
+        self.assertFalse(os.path.exists(self.db_file + "-shm"))
+        c1.close()
+        c2 = self.makeCache(keys)
+        self.assertEqual(c2.journal_mode, "WAL")
+        self.assertEqual(c2.section("includes")[self.file], ["b.hpp"])
+        c2.close()
+
+    def test_per_section_invalidation(self):
+        c1 = self.makeCache(dict(includes="k1", deps="k2"))
+        c1.section("includes")[self.file] = ["b.hpp"]
+        c1.section("deps")[self.file] = [dict(name="b", type=1)]
+        c1.commit()
+        c1.close()
+        c2 = self.makeCache(dict(includes="k1", deps="k3"))
+        self.assertEqual(c2.invalidated_sections, ["deps"])
+        self.assertIn(self.file, c2.section("includes"))
+        self.assertNotIn(self.file, c2.section("deps"))
+        c2.close()
+
+    def test_json_migration(self):
+        keys = dict(includes="k1", deps="k2")
+        json_cache = cache.DepgCache(None, keys)
+        json_cache.section("includes")[self.file] = ["b.hpp"]
+        writeFile(self.json_file, json.dumps(json_cache.export()))
+        c1 = self.makeCache(keys)
+        self.assertFalse(os.path.exists(self.json_file))
+        self.assertEqual(c1.export(), json_cache.export())
+        c1.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
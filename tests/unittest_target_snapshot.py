@@ -0,0 +1,77 @@
+#! /usr/bin/env python3
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.abspath(os.path.dirname(__file__) + "/../.."))
+
+import depg.depg_lib_main as depg
+from depg import target_graph_builder
+from depg.targets import DepgTarget
+
+
+def writeFile(fn, content):
+  with open(fn, 'w') as fd:
+    return fd.write(content)
+
+
+class TestTargetSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp_dir.name)
+        os.makedirs("src")
+        writeFile("src/a.hpp", "#pragma once\n")
+        writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+        writeFile("src/b.cpp", '#include "src/b.hpp"\n#include <vector>\n')
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp_dir.cleanup()
+
+    def build(self, backend):
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache_" + backend
+        configs.CACHE_BACKEND = backend
+        configs.TARGET_SNAPSHOT = True
+        configs = depg.preprocessConfig(configs)
+        builder = target_graph_builder.TargetGraphBuilder(configs)
+        target_map = builder.depsCover(["src/b"])
+        return target_map, builder.target_snapshot.stats
+
+    def test_restored_until_changed(self):
+        for backend in target_graph_builder.CACHE_BACKENDS:
+            writeFile("src/b.hpp", '#include "src/a.hpp"\n')
+            target_map, stats = self.build(backend)
+            self.assertEqual(stats, dict(hits=0, misses=2))
+            self.assertEqual(self.build(backend),
+                             (target_map, dict(hits=2, misses=0)))
+            self.assertEqual(target_map["src/b"].public_deps, ["src/a"])
+            writeFile("src/b.hpp", "#pragma once\n")
+            target_map, stats = self.build(backend)
+            self.assertEqual(stats, dict(hits=0, misses=1))
+            self.assertNotIn("public_deps", target_map["src/b"])
+            self.assertNotIn("src/a", target_map)
+
+    def test_files_order(self):
+        self.build("sqlite")
+        configs = depg.getDefaultConfigs()
+        configs.THIRD_PARTY_TARGET_BUILD_FILES = []
+        configs.TOP_DIRECTORY_LIST = ["src"]
+        configs.CACHE_DIRECTORY = "build/cache_sqlite"
+        configs.CACHE_BACKEND = "sqlite"
+        configs.TARGET_SNAPSHOT = True
+        configs = depg.preprocessConfig(configs)
+        builder = target_graph_builder.TargetGraphBuilder(configs)
+        target = DepgTarget(name="src/b", type=builder.getTargetType("src/b"))
+        files = builder.getTargetSourceFiles(target)
+        self.assertEqual(files, ["src/b.hpp", "src/b.cpp"])
+        self.assertTrue(builder.target_snapshot.isRestorable(target,
+                                                             files[::-1]))
+
+if __name__ == '__main__':
+    unittest.main()
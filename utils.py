@@ -125,3 +125,58 @@ class OrderedSet(collections.MutableSet):
         if isinstance(other, OrderedSet):
             return len(self) == len(other) and list(self) == list(other)
         return set(self) == set(other)
+
+
+class PathTrie:
+    """
+    Trie on the components of '/' separated paths. Maps a path to a value and
+    finds the value of the longest prefix (in terms of whole components) of a
+    given path. eg: after `trie.insert("a/b", 11)`,
+    `trie.longestPrefixValue("a/b/c.h") == 11` but
+    `trie.longestPrefixValue("a/bc.h") is None`.
+    """
+
+    _VALUE = object()  # Key of the value in a trie node.
+
+    def __init__(self, items=()):
+        self.root = {}
+        for path, value in items:
+            self.insert(path, value)
+
+    def insert(self, path, value=True):
+        node = self.root
+        for component in path.split("/"):
+            node = node.setdefault(component, {})
+        node[PathTrie._VALUE] = value
+
+    def longestPrefixValue(self, path, default=None):
+        node = self.root
+        output = node.get(PathTrie._VALUE, default)
+        for component in path.split("/"):
+            node = node.get(component)
+            if node is None:
+                break
+            output = node.get(PathTrie._VALUE, output)
+        return output
+
+    def getNode(self, path):
+        """
+        Return the node of @path ("" for the root), to be walked by getChild
+        and getValue. None if no path inserted starts with @path.
+        """
+        node = self.root
+        for component in (path.split("/") if path != "" else []):
+            node = node.get(component)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def getChild(node, component):
+        """Return the child node of @node (None allowed), None if absent."""
+        return None if node is None else node.get(component)
+
+    @staticmethod
+    def getValue(node, default=None):
+        """Return the value of @node (None allowed), @default if absent."""
+        return default if node is None else node.get(PathTrie._VALUE, default)